@@ -1,4 +1,5 @@
-from . import wizard_gui
+import sys
+from . import cli
 
 if __name__ == "__main__":
-    wizard_gui.runApp()
+    sys.exit(cli.main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Asyncio API to build the gfx, localisation and ideas files of many
+idea sets (e.g. one per country tag):
+
+    results = await build_many(jobs, concurrency=8)
+
+or, to handle each result as soon as its job is done:
+
+    async for result in iter_build_many(jobs, concurrency=8):
+        ...
+
+The code of a job is rendered in an executor (threads by default, a
+ProcessPoolExecutor may be passed), the files are written in a thread
+pool, so rendering and writing of different jobs overlap. A failing job
+is reported in its BuildResult, the other jobs go on.
+"""
+import unittest
+import io
+import os
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from .ideas import Idea, Modifier
+from . import output
+
+CONCURRENCY = 4
+
+
+class BuildJob:
+    """
+    The ideas written to the files prefix.gfx, prefix.yml and prefix.txt in path
+    """
+    def __init__(self, ideas, prefix, path='', lang='english'):
+        self.ideas = list(ideas)
+        self.prefix = prefix
+        self.path = path
+        self.lang = lang
+
+    def get_file_names(self):
+        return [os.path.join(self.path, self.prefix + suff)
+                for suff in (Idea.GFX_SUFF, Idea.LOC_SUFF, Idea.PDX_SUFF)]
+
+
+class BuildResult:
+    """
+    The files written by a job, or the error which stopped it
+    """
+    def __init__(self, job, files=None, error=None):
+        self.job = job
+        self.files = files
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def render_job(ideas, lang):
+    """
+    Returns the gfx, localisation and ideas code of the ideas (run in the executor)
+    """
+    fps = [io.StringIO() for _ in range(3)]
+    Idea.stream_idea_files(ideas, *fps, lang=lang)
+    return [fp.getvalue() for fp in fps]
+
+
+def write_job(files, codes):
+    with output.Transaction() as transaction:
+        for fname, code in zip(files, codes):
+            transaction.write(code, fname)
+    return files
+
+
+async def run_job(job, semaphore, executor, io_executor):
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        try:
+            codes = await loop.run_in_executor(executor, render_job, job.ideas, job.lang)
+            files = await loop.run_in_executor(io_executor, write_job, job.get_file_names(), codes)
+        except Exception as exc:
+            return BuildResult(job, error=exc)
+    return BuildResult(job, files=files)
+
+
+async def iter_build_many(jobs, concurrency=CONCURRENCY, executor=None):
+    """
+    Runs the jobs with at most concurrency of them at a time and
+    yields their BuildResult in the order they finish
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+    io_executor = ThreadPoolExecutor(max_workers=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.ensure_future(run_job(job, semaphore, executor, io_executor)) for job in jobs]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        io_executor.shutdown(wait=False)
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+async def build_many(jobs, concurrency=CONCURRENCY, executor=None):
+    """
+    Runs the jobs and returns their BuildResult in the order of the jobs
+    """
+    jobs = list(jobs)
+    results = {}
+    async for result in iter_build_many(jobs, concurrency=concurrency, executor=executor):
+        results[id(result.job)] = result
+    return [results[id(job)] for job in jobs]
+
+########################
+# Tests                #
+########################
+
+class BatchTests(unittest.TestCase):
+    NR_JOBS = 5
+
+    def make_ideas(self, tag, gfx=True):
+        idea = Idea(f"{tag}_idea")
+        idea.set_dict({Idea.FULL_NAME: f"{tag} Idea", Idea.DESC: "Desc"})
+        if gfx:
+            idea.set_dict({Idea.GFX_FNAME: "gfx/interface/ideas/a.dds"})
+        idea.set_category_objs(Modifier, [Modifier({"Key": "stability_factor", "Value": "0.1"})])
+        return [idea]
+
+    def test_build_many(self):
+        with tempfile.TemporaryDirectory() as path:
+            jobs = [BuildJob(self.make_ideas(f"T{nr:02}"), f"T{nr:02}", path=path)
+                    for nr in range(self.NR_JOBS)]
+            # a job without a gfx file name fails alone
+            jobs += [BuildJob(self.make_ideas("BAD", gfx=False), "BAD", path=path)]
+            results = asyncio.run(build_many(jobs, concurrency=2))
+            self.assertEqual([result.job for result in results], jobs)
+            self.assertTrue(all(result.ok for result in results[:-1]))
+            self.assertIsInstance(results[-1].error, ValueError)
+            for result in results[:-1]:
+                for fname in result.files:
+                    self.assertTrue(os.path.isfile(fname))
+            self.assertEqual(len(os.listdir(path)), 3*self.NR_JOBS)
+            with open(results[0].files[2], encoding="utf-8") as fp:
+                self.assertIn("T00_idea", fp.read())
+
+    def test_iter_build_many(self):
+        async def collect(jobs):
+            return [result async for result in iter_build_many(jobs, concurrency=3)]
+        with tempfile.TemporaryDirectory() as path:
+            jobs = [BuildJob(self.make_ideas(f"T{nr:02}"), f"T{nr:02}", path=path)
+                    for nr in range(self.NR_JOBS)]
+            results = asyncio.run(collect(jobs))
+        self.assertEqual(sorted(result.job.prefix for result in results),
+                         [job.prefix for job in jobs])
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Catalogue of the known keys of the idea categories: modifiers, rules,
+research categories, effects (on_add, on_remove) and triggers (cancel).
+The keys of each kind are kept in a sorted list, so a lookup and the
+completions of a prefix are a bisect away.
+
+The bundled keys are in the keys directory next to this module. They
+are a partial list of the common keys, the documentation files of a game
+install (documentation/*.md or the script_documentation/*.log of older
+versions) add the full list on top.
+"""
+import unittest
+import os
+import re
+import glob
+import bisect
+import difflib
+import tempfile
+from unittest import mock
+from .ideas import Idea, Modifier, ResearchBonus, Rule, OnAdd, OnRemove, Cancel
+
+KEYS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "keys")
+
+# kinds of keys
+MODIFIERS = "modifiers"
+RESEARCH = "research"
+RULES = "rules"
+EFFECTS = "effects"
+TRIGGERS = "triggers"
+KINDS = [MODIFIERS, RESEARCH, RULES, EFFECTS, TRIGGERS]
+
+CATEGORY_KINDS = {Modifier.get_name(): MODIFIERS, ResearchBonus.get_name(): RESEARCH,
+                  Rule.get_name(): RULES, OnAdd.get_name(): EFFECTS, OnRemove.get_name(): EFFECTS,
+                  Cancel.get_name(): TRIGGERS}
+# documentation files by the kind of keys they list
+DOC_KINDS = {"modifier": MODIFIERS, "effect": EFFECTS, "trigger": TRIGGERS}
+DOC_GLOBS = [os.path.join("documentation", "*.md"), os.path.join("script_documentation", "*.log")]
+# '## add_political_power' in the markdown files, 'add_political_power - ...' in the logs
+DOC_PATTERN = re.compile(r"^(?:#{1,4}\s+([a-z_][a-z0-9_]*)\s*$|([a-z_][a-z0-9_]*) - )")
+# country tags, state ids and scope keywords are valid keys in effects and triggers
+SCOPE_PATTERN = re.compile(r"^(?:[A-Z][A-Z0-9]{2}|\d+|ROOT|FROM|PREV|THIS|owner|controller|capital)$")
+UNKNOWN_KEY_MSG = "Error: unknown {} key {} of {}{}!"
+
+
+class Catalogue:
+    """
+    The sorted keys of each kind
+    """
+    LIMIT = 20
+
+    def __init__(self):
+        self.keys = {kind: [] for kind in KINDS}
+
+    @classmethod
+    def bundled(cls):
+        """
+        Returns a catalogue of the bundled keys
+        """
+        catalogue = cls()
+        for kind in KINDS:
+            catalogue.load_file(os.path.join(KEYS_DIR, kind + ".txt"), kind)
+        return catalogue
+
+    def __len__(self):
+        return sum(len(keys) for keys in self.keys.values())
+
+    def add(self, kind, new_keys):
+        self.keys[kind] = sorted(set(self.keys[kind]).union(new_keys))
+
+    def load_file(self, fname, kind):
+        """
+        Adds the keys of a text file with a key per line ('#' starts a comment)
+        """
+        with open(fname, encoding='utf-8') as fp:
+            lines = [line.split('#', 1)[0].strip() for line in fp]
+        self.add(kind, [line for line in lines if line])
+
+    def load_documentation(self, game_dir):
+        """
+        Adds the keys of the modifier, effect and trigger documentation
+        of a game install. Returns the number of keys found.
+        """
+        found = 0
+        for pattern in DOC_GLOBS:
+            for fname in glob.glob(os.path.join(game_dir, pattern)):
+                kinds = [kind for word, kind in DOC_KINDS.items()
+                         if word in os.path.basename(fname).lower()]
+                if len(kinds) == 0:
+                    continue
+                with open(fname, encoding='utf-8-sig', errors='replace') as fp:
+                    matches = [DOC_PATTERN.match(line) for line in fp]
+                new_keys = [match.group(1) or match.group(2) for match in matches if match]
+                self.add(kinds[0], new_keys)
+                found += len(new_keys)
+        return found
+
+    def is_known(self, key, kind):
+        keys = self.keys[kind]
+        pos = bisect.bisect_left(keys, key)
+        return pos < len(keys) and keys[pos] == key
+
+    def is_valid(self, key, kind):
+        if self.is_known(key, kind):
+            return True
+        return kind in (EFFECTS, TRIGGERS) and SCOPE_PATTERN.match(key) is not None
+
+    def complete(self, prefix, kind, limit=LIMIT):
+        """
+        Returns the first limit keys of kind starting with prefix
+        """
+        keys = self.keys[kind]
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\uffff', lo=start)
+        return keys[start:min(end, start + limit)]
+
+    def suggest(self, key, kind):
+        return difflib.get_close_matches(key, self.keys[kind], n=1)
+
+    def find_unknown(self, idea_list):
+        """
+        Returns the (idea name, category name, key) of all keys of the
+        ideas which are neither in the catalogue nor added to the keys
+        of their category class (see ideas.Modifier.set_keys)
+        """
+        unknown = []
+        for idea in idea_list:
+            for category_cls, rows in idea.get_category_rows():
+                kind = CATEGORY_KINDS.get(category_cls.get_name())
+                if kind is None:
+                    continue
+                for values in rows:
+                    if values[0] not in category_cls.get_keys() and not self.is_valid(values[0], kind):
+                        unknown += [(idea.name, category_cls.get_name(), values[0])]
+        return unknown
+
+    def get_messages(self, unknown):
+        messages = []
+        for name, cat_name, key in unknown:
+            suggestions = self.suggest(key, CATEGORY_KINDS[cat_name])
+            hint = f" (did you mean {suggestions[0]}?)" if suggestions else ''
+            messages += [UNKNOWN_KEY_MSG.format(cat_name, key, name, hint)]
+        return messages
+
+    def check(self, idea_list):
+        """
+        Raises a ValueError listing the unknown keys of the ideas
+        """
+        unknown = self.find_unknown(idea_list)
+        if unknown:
+            raise ValueError('\n'.join(self.get_messages(unknown)))
+
+########################
+# Tests                #
+########################
+
+class CatalogueTests(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = Catalogue.bundled()
+
+    def test_lookup(self):
+        self.assertTrue(self.catalogue.is_known("stability_factor", MODIFIERS))
+        self.assertFalse(self.catalogue.is_known("stability_facter", MODIFIERS))
+        self.assertFalse(self.catalogue.is_known("stability_factor", RULES))
+        self.assertTrue(self.catalogue.is_valid("GER", TRIGGERS))
+        self.assertFalse(self.catalogue.is_valid("GER", MODIFIERS))
+
+    def test_complete(self):
+        completions = self.catalogue.complete("production_speed_", MODIFIERS)
+        self.assertIn("production_speed_buildings_factor", completions)
+        self.assertTrue(all(key.startswith("production_speed_") for key in completions))
+        self.assertEqual(completions, sorted(completions))
+        self.assertEqual(len(self.catalogue.complete("", MODIFIERS, limit=3)), 3)
+        self.assertEqual(self.catalogue.complete("zzz", MODIFIERS), [])
+
+    def test_check(self):
+        idea = Idea("my_idea")
+        idea.set_category_objs(Modifier, [Modifier({"Key": "stability_factor", "Value": "0.1"}),
+                                          Modifier({"Key": "stability_facter", "Value": "0.1"})])
+        idea.set_category_objs(Cancel, [Cancel({"Key": "has_war", "Relation": "=", "Value": "yes"})])
+        self.assertEqual(self.catalogue.find_unknown([idea]),
+                         [("my_idea", "modifier", "stability_facter")])
+        with self.assertRaisesRegex(ValueError, "did you mean stability_factor"):
+            self.catalogue.check([idea])
+        # keys added to a category class are known to the check, of that category only
+        with mock.patch.object(Modifier, "keys", Modifier.keys), mock.patch.object(Cancel, "keys", Cancel.keys):
+            Cancel.set_keys(["stability_facter"])
+            self.assertEqual(len(self.catalogue.find_unknown([idea])), 1)
+            Modifier.set_keys(["stability_facter"])
+            self.assertEqual(self.catalogue.find_unknown([idea]), [])
+            self.assertNotIn("stability_facter", OnAdd.get_keys())
+        self.assertNotIn("stability_facter", Modifier.get_keys())
+        self.assertNotIn("stability_facter", Cancel.get_keys())
+
+    def test_load_documentation(self):
+        with tempfile.TemporaryDirectory() as game_dir:
+            os.makedirs(os.path.join(game_dir, "documentation"))
+            with open(os.path.join(game_dir, "documentation", "modifiers_documentation.md"), 'w') as fp:
+                fp.write("# Modifiers\n## new_modifier_factor\nDescription\n")
+            with open(os.path.join(game_dir, "documentation", "readme.md"), 'w') as fp:
+                fp.write("## not_a_key\n")
+            self.assertEqual(self.catalogue.load_documentation(game_dir), 1)
+        self.assertTrue(self.catalogue.is_known("new_modifier_factor", MODIFIERS))
+        self.assertFalse(self.catalogue.is_known("not_a_key", MODIFIERS))
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Command line interface. Without a subcommand the GUI is started,
+the build subcommand writes the files of idea specs without tkinter,
+the watch subcommand rebuilds them whenever the specs change and the
+validate subcommand checks generated ideas and gfx files.
+"""
+import unittest
+from unittest import mock
+import os
+import sys
+import io
+import json
+import argparse
+import contextlib
+import subprocess
+import zipfile
+import tempfile
+from .ideas import Idea
+from .incremental import Manifest
+from . import specs
+from . import instrument
+from . import output
+from . import validate
+from .catalogue import Catalogue
+from .symbols import SymbolIndex
+from . import importer
+from .watch import Watcher, INTERVAL, DEBOUNCE, MAX_WAIT
+
+PROG = "python -m Hoi4SpiritWizard"
+INVALID_ERROR_MSG = "Error: the generated files have {} problems!\n{}"
+
+
+def get_file_names(prefix, path=''):
+    return [os.path.join(path, prefix + suff)
+            for suff in (Idea.GFX_SUFF, Idea.LOC_SUFF, Idea.PDX_SUFF)]
+
+
+def build(args):
+    """
+    Streams the ideas of the spec files into the gfx, loc and ideas files
+    """
+    # a recording started by HOI4SW_PROFILE goes on and also takes this build
+    own_recorder = args.profile and not instrument.is_enabled()
+    recorder = instrument.enable() if own_recorder else instrument.get_recorder()
+    try:
+        return build_files(args)
+    finally:
+        if own_recorder:
+            instrument.disable()
+        if args.profile:
+            recorder.save(args.profile)
+
+
+def build_files(args):
+    ideas = specs.load_ideas(args.specs, fmt=args.format)
+    if args.check_keys or args.mod_dir:
+        ideas = list(ideas)
+    if args.check_keys:
+        get_catalogue(args.game_dir).check(ideas)
+    if args.mod_dir:
+        check_symbols(ideas, args)
+    if args.incremental:
+        return build_incremental(ideas, args)
+    file_names = get_file_names(args.prefix, args.out_dir)
+    gfx_file, loc_file, pdx_file = file_names
+    with instrument.stage(instrument.STREAM):
+        # the three files are replaced together once all are written
+        with get_sink(args) as sink:
+            with sink.open(gfx_file) as gfx_fp, sink.open(loc_file) as loc_fp, \
+                 sink.open(pdx_file) as pdx_fp:
+                nr_ideas = Idea.stream_idea_files(ideas, gfx_fp, loc_fp, pdx_fp, lang=args.lang)
+            sizes = [sink.get_size(fname) for fname in file_names]
+            if args.validate:
+                # invalid files are rolled back and never replace the old ones
+                check_output([gfx_file, pdx_file], sink.read)
+    instrument.count("ideas", nr_ideas)
+    for fname, size in zip(file_names, sizes):
+        instrument.add_file(fname, size)
+    if not args.quiet:
+        archive = f" in {args.zip}" if args.zip else ''
+        print(f"Wrote {nr_ideas} ideas to {gfx_file}, {loc_file}, {pdx_file}{archive}")
+    return 0
+
+
+def get_sink(args):
+    """
+    The zip archive of --zip (the output directory is the path in it),
+    or a Transaction writing the files
+    """
+    if args.zip:
+        return output.ZipSink(args.zip)
+    return output.Transaction()
+
+
+def build_incremental(ideas, args):
+    """
+    Writes only the files which changed since the last build
+    """
+    ideas = list(ideas)
+    gfx_file, loc_file, pdx_file = get_file_names(args.prefix)
+    manifest = Manifest(args.out_dir)
+    Idea.write_idea_files(ideas, gfx_file, loc_file, pdx_file, path=args.out_dir, lang=args.lang,
+                          manifest=manifest)
+    manifest.save()
+    if not args.quiet:
+        print(manifest.get_report())
+    if args.validate:
+        check_output([os.path.join(args.out_dir, fname) for fname in (gfx_file, pdx_file)], read_file)
+    return 0
+
+
+def read_file(fname):
+    with open(fname, 'rb') as fp:
+        return fp.read()
+
+
+def check_output(file_names, read):
+    """
+    Raises a ValueError with the diagnostics of the generated files,
+    read(fname) returns the bytes of a file
+    """
+    diagnostics = [diagnostic for fname in file_names
+                   for diagnostic in validate.validate_data(read(fname), kind=validate.get_kind(fname),
+                                                            source=fname)]
+    if diagnostics:
+        raise ValueError(INVALID_ERROR_MSG.format(len(diagnostics), "\n".join(map(str, diagnostics))))
+
+
+def check_symbols(ideas, args):
+    """
+    Raises a ValueError if names of the ideas are already defined in the
+    mod of --mod-dir or the game of --game-dir, apart from the output files
+    """
+    roots = [args.mod_dir] + ([args.game_dir] if args.game_dir else [])
+    index = SymbolIndex(roots)
+    index.refresh()
+    ignore = [] if args.zip else get_file_names(args.prefix, args.out_dir)
+    collisions = index.find_collisions(ideas, ignore=ignore)
+    if collisions:
+        raise ValueError('\n'.join(index.get_messages(collisions)))
+
+
+def get_catalogue(game_dir=None):
+    """
+    The bundled key catalogue, extended by the documentation of a game install
+    """
+    catalogue = Catalogue.bundled()
+    if game_dir:
+        catalogue.load_documentation(game_dir)
+    return catalogue
+
+
+def watch(args):
+    """
+    Rebuilds the spec files of a directory when they change, until interrupted
+    """
+    watcher = Watcher(args.spec_dir, args.out_dir, lang=args.lang, fmt=args.format,
+                      interval=args.interval, debounce=args.debounce, max_wait=args.max_wait)
+    report = (lambda result: None) if args.quiet else print
+    if not args.quiet:
+        print(f"Watching {args.spec_dir} (Ctrl+C to stop)")
+    try:
+        watcher.run(report=report)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def validate_files(args):
+    """
+    Prints the diagnostics of generated ideas and gfx files
+    """
+    diagnostics = [diagnostic for fname in args.files for diagnostic in validate.validate_file(fname)]
+    for diagnostic in diagnostics:
+        print(diagnostic)
+    if not args.quiet:
+        print(f"Checked {len(args.files)} files, {len(diagnostics)} problems")
+    return 1 if diagnostics else 0
+
+
+def gui(args):
+    from . import wizard_gui
+    wizard_gui.runApp()
+    return 0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog=PROG, description="HOI4 Idea Wizard")
+    parser.set_defaults(func=gui)
+    commands = parser.add_subparsers(title="commands")
+
+    build_parser = commands.add_parser("build", help="write the idea files of JSON Lines/CSV specs")
+    build_parser.add_argument("specs", nargs="+", help="spec files (.jsonl, .json or .csv)")
+    build_parser.add_argument("-p", "--prefix", required=True, help="file prefix of the output files")
+    build_parser.add_argument("-o", "--out-dir", default='', help="output directory")
+    build_parser.add_argument("-f", "--format", choices=sorted(specs.READERS),
+                              help="spec format (default: from the file extension)")
+    build_parser.add_argument("-l", "--lang", default='english', help="localisation language")
+    mode = build_parser.add_mutually_exclusive_group()
+    mode.add_argument("-i", "--incremental", action="store_true",
+                      help="only rewrite files which changed since the last build")
+    mode.add_argument("-z", "--zip", metavar="ARCHIVE",
+                      help="write the files into the zip archive ARCHIVE, e.g. a mod release")
+    build_parser.add_argument("-k", "--check-keys", action="store_true",
+                              help="fail on modifier, rule and effect keys missing in the key catalogue "
+                                   "(the bundled one is partial, see --game-dir)")
+    build_parser.add_argument("--mod-dir", help="fail on idea, sprite and localisation names already defined "
+                                                "in the mod MOD_DIR (and the game of --game-dir)")
+    build_parser.add_argument("--game-dir", help="a game install: the keys of its documentation are added "
+                                                 "to the catalogue, its names are checked with --mod-dir")
+    build_parser.add_argument("-V", "--validate", action="store_true",
+                              help="fail if the generated ideas or gfx file is invalid")
+    build_parser.add_argument("--profile", metavar="REPORT",
+                              help="write stage timings and counters as JSON to REPORT")
+    build_parser.add_argument("-q", "--quiet", action="store_true")
+    build_parser.set_defaults(func=build)
+
+    watch_parser = commands.add_parser("watch", help="rebuild the idea files of a spec directory on changes")
+    watch_parser.add_argument("spec_dir", help="directory of the spec files, each is built into its own files")
+    watch_parser.add_argument("-o", "--out-dir", default='', help="output directory")
+    watch_parser.add_argument("-f", "--format", choices=sorted(specs.READERS),
+                              help="spec format (default: from the file extension)")
+    watch_parser.add_argument("-l", "--lang", default='english', help="localisation language")
+    watch_parser.add_argument("--interval", type=float, default=INTERVAL, help="poll interval in seconds")
+    watch_parser.add_argument("--debounce", type=float, default=DEBOUNCE,
+                              help="seconds the specs must be unchanged before a rebuild")
+    watch_parser.add_argument("--max-wait", type=float, default=MAX_WAIT,
+                              help="seconds after a change by which the specs are rebuilt anyway")
+    watch_parser.add_argument("-q", "--quiet", action="store_true")
+    watch_parser.set_defaults(func=watch)
+
+    validate_parser = commands.add_parser("validate", help="check generated ideas (.txt) and gfx (.gfx) files")
+    validate_parser.add_argument("files", nargs="+", help="ideas and gfx files")
+    validate_parser.add_argument("-q", "--quiet", action="store_true")
+    validate_parser.set_defaults(func=validate_files)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, KeyError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+
+########################
+# Tests                #
+########################
+
+class CliTests(unittest.TestCase):
+    def test_check_keys(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spec_file = os.path.join(tmp, "spirits.csv")
+            with open(spec_file, 'w') as fp:
+                fp.write(specs.SpecTests.CSV_CODE)
+            self.assertEqual(main(["build", spec_file, "-p", "spirits", "-o", tmp, "-q", "-k"]), 0)
+            with open(spec_file, 'w') as fp:
+                fp.write(specs.SpecTests.CSV_CODE.replace("stability_factor", "stability_facter"))
+            self.assertEqual(main(["build", spec_file, "-p", "typo", "-o", tmp, "-q", "-k"]), 1)
+            self.assertFalse(os.path.exists(get_file_names("typo", tmp)[2]))
+
+    def test_check_symbols(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spec_file = os.path.join(tmp, "spirits.csv")
+            with open(spec_file, 'w') as fp:
+                fp.write(specs.SpecTests.CSV_CODE)
+            mod_dir, game_dir = os.path.join(tmp, "mod"), os.path.join(tmp, "game")
+            os.makedirs(os.path.join(game_dir, "common", "ideas"))
+            with open(os.path.join(game_dir, "common", "ideas", "vanilla.txt"), 'w') as fp:
+                fp.write("ideas = { country = { my_idea_1 = {} } }")
+            os.makedirs(mod_dir)
+            argv = ["build", spec_file, "-p", "spirits", "-o", mod_dir, "-q", "--mod-dir", mod_dir]
+            with mock.patch.dict(os.environ, {importer.CACHE_ENV: os.path.join(tmp, "cache")}):
+                self.assertEqual(main(argv), 0)
+                # the files written before are replaced, they do not collide
+                self.assertEqual(main(argv), 0)
+                self.assertEqual(main(argv + ["--game-dir", game_dir]), 1)
+
+    def test_build(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spec_file = os.path.join(tmp, "spirits.csv")
+            with open(spec_file, 'w') as fp:
+                fp.write(specs.SpecTests.CSV_CODE)
+            result = main(["build", spec_file, "-p", "spirits", "-o", tmp, "-q"])
+            self.assertEqual(result, 0)
+            for fname in get_file_names("spirits", tmp):
+                self.assertTrue(os.path.isfile(fname))
+            with open(get_file_names("spirits", tmp)[1], 'rb') as fp:
+                self.assertTrue(fp.read().startswith(b"\xef\xbb\xbfl_english:\n"))
+
+    def test_build_zip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spec_file = os.path.join(tmp, "spirits.csv")
+            with open(spec_file, 'w') as fp:
+                fp.write(specs.SpecTests.CSV_CODE)
+            archive = os.path.join(tmp, "mod.zip")
+            argv = ["build", spec_file, "-p", "spirits", "-o", "common", "-q", "-z", archive]
+            self.assertEqual(main(argv), 0)
+            self.assertEqual(sorted(os.listdir(tmp)), ["mod.zip", "spirits.csv"])
+            with zipfile.ZipFile(archive) as zip_file:
+                self.assertEqual(sorted(zip_file.namelist()),
+                                 sorted(name.replace(os.sep, '/') for name in get_file_names("spirits", "common")))
+
+    def test_validate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spec_file = os.path.join(tmp, "spirits.csv")
+            with open(spec_file, 'w') as fp:
+                fp.write(specs.SpecTests.CSV_CODE)
+            for extra in [["-o", "common", "-z", os.path.join(tmp, "mod.zip")], ["-o", tmp, "-i"], ["-o", tmp]]:
+                self.assertEqual(main(["build", spec_file, "-p", "spirits", "-q", "-V"] + extra), 0)
+            gfx_file, _, pdx_file = get_file_names("spirits", tmp)
+            self.assertEqual(main(["validate", gfx_file, pdx_file, "-q"]), 0)
+            with open(pdx_file, 'a') as fp:
+                fp.write("}\n")
+            self.assertEqual(main(["validate", gfx_file, pdx_file, "-q"]), 1)
+            # duplicate names fail the build and keep the old files
+            self.assertEqual(main(["build", spec_file, spec_file, "-p", "spirits", "-o", tmp, "-q", "-V"]), 1)
+            with open(pdx_file) as fp:
+                self.assertTrue(fp.read().endswith("}\n}\n"))
+
+    def test_build_incremental(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spec_file = os.path.join(tmp, "spirits.csv")
+            with open(spec_file, 'w') as fp:
+                fp.write(specs.SpecTests.CSV_CODE)
+            argv = ["build", spec_file, "-p", "spirits", "-o", tmp, "-q", "-i"]
+            self.assertEqual(main(argv), 0)
+            stats = [os.stat(fname).st_mtime_ns for fname in get_file_names("spirits", tmp)]
+            self.assertEqual(main(argv), 0)
+            manifest = Manifest(tmp)
+            self.assertEqual(sorted(manifest.files), sorted(get_file_names("spirits")))
+            self.assertEqual(stats, [os.stat(fname).st_mtime_ns
+                                     for fname in get_file_names("spirits", tmp)])
+
+    def test_build_profile(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spec_file = os.path.join(tmp, "spirits.csv")
+            with open(spec_file, 'w') as fp:
+                fp.write(specs.SpecTests.CSV_CODE)
+            report_file = os.path.join(tmp, "report.json")
+            for extra in [[], ["-i"]]:
+                argv = ["build", spec_file, "-p", "spirits", "-o", tmp, "-q", "--profile", report_file]
+                self.assertEqual(main(argv + extra), 0)
+                with open(report_file) as fp:
+                    report = json.load(fp)
+                self.assertEqual(report["counters"]["ideas"], 2)
+                self.assertEqual(len(report["files"]), 3)
+                # the streaming build is broken down into the stages of the ideas too
+                self.assertLessEqual({instrument.BUILD_LISTS, instrument.SERIALIZE, instrument.WRITE},
+                                     set(report["stages"]))
+                self.assertIn("modifiers", report["counters"])
+                # the rows were interned while loading the specs
+                self.assertIn("intern_hit_rate", report["gauges"])
+            self.assertFalse(instrument.is_enabled())
+            # an enabled recording is kept
+            recorder = instrument.enable()
+            try:
+                self.assertEqual(main(argv), 0)
+                self.assertIs(instrument.get_recorder(), recorder)
+                self.assertEqual(recorder.counters["ideas"], 2)
+            finally:
+                instrument.disable()
+
+    def test_build_missing_field(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spec_file = os.path.join(tmp, "spirits.jsonl")
+            with open(spec_file, 'w') as fp:
+                fp.write('{"name": "my_idea_1"}\n')
+            result = main(["build", spec_file, "-p", "spirits", "-o", tmp, "-q"])
+            self.assertEqual(result, 1)
+            # a row without a field is reported, not raised
+            with open(spec_file, 'w') as fp:
+                fp.write('{"name": "my_idea_1", "FullName": "Idea", "Description": "Desc", '
+                         '"modifier": [{"Key": "stability_factor"}]}\n')
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                result = main(["build", spec_file, "-p", "spirits", "-o", tmp, "-q"])
+            self.assertEqual(result, 1)
+            self.assertEqual(stderr.getvalue(), specs.FIELD_ERROR_MSG.format("my_idea_1", "Value", "modifier") + "\n")
+
+    def test_no_tkinter(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = f"import sys; import {__package__}.cli; sys.exit('tkinter' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], cwd=root)
+        self.assertEqual(result.returncode, 0)
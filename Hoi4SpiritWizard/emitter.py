@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Direct Paradox emitter: writes the gfx and ideas code straight into a
+text buffer (io.StringIO or an open file) instead of building nested
+lists and serializing them with list2paradox afterwards.
+The indentation and separators are measured once from the output of
+the installed list2paradox (see Layout), so both write the same bytes.
+"""
+import unittest
+from unittest import mock
+import io
+import itertools
+from Hoi4Converter.converter import list2paradox
+from .ideas import Idea, Modifier, Rule, Cancel, ModifierTable
+from . import flyweight
+from . import output
+from . import instrument
+
+
+PROBE_KEY = "hoi4sw_key"
+PROBE_VAL = "hoi4sw_val"
+PROBE_REL = "<"
+LAYOUT_ERROR_MSG = "Error: the list2paradox code is not one entry per line, the emitter cannot be used!"
+# the Layout of the installed list2paradox
+LAYOUTS = []
+
+
+class Layout:
+    """
+    The indentation and the separators around keys, relations and values
+    of list2paradox, measured by rendering probe entries. Every entry is
+    expected on a line of its own and blocks to end with a line.
+    """
+    def __init__(self):
+        key, rel, val = PROBE_KEY, PROBE_REL, PROBE_VAL
+        atom = list2paradox([[key, [val]]])
+        self.atom = self.split(atom, key, val)
+        self.rel_atom = self.split(list2paradox([[key, rel, [val]]]), key, rel, val)
+        block = list2paradox([[key, [[key, [val]]]]]).splitlines(keepends=True)
+        rel_block = list2paradox([[key, rel, [[key, [val]]]]]).splitlines(keepends=True)
+        if len(block) != 3 or len(rel_block) != 3 or not block[1].endswith(atom):
+            raise ValueError(LAYOUT_ERROR_MSG)
+        self.indent = block[1][:len(block[1]) - len(atom)]
+        self.open = self.split(block[0], key)
+        self.rel_open = self.split(rel_block[0], key, rel)
+        self.close = block[2]
+        # nested and empty blocks have to come out the same
+        nested = [[key, [[key, rel, [[key, [[key, [val]]]]]], [key, []]]]]
+        fp = io.StringIO()
+        PdxEmitter(fp, layout=self).write_list(nested)
+        if fp.getvalue() != list2paradox(nested):
+            raise ValueError(LAYOUT_ERROR_MSG)
+
+    @staticmethod
+    def split(code, *tokens):
+        """
+        The parts of code before, between and after tokens
+        """
+        parts = []
+        for token in tokens:
+            head, sep, code = code.partition(token)
+            if sep == '':
+                raise ValueError(LAYOUT_ERROR_MSG)
+            parts += [head]
+        return parts + [code]
+
+    @staticmethod
+    def join(parts, *tokens):
+        return ''.join(itertools.chain.from_iterable(zip(parts, tokens))) + parts[-1]
+
+
+def get_layout():
+    if len(LAYOUTS) == 0:
+        LAYOUTS.append(Layout())
+    return LAYOUTS[0]
+
+
+class PdxEmitter:
+    """
+    Writes Paradox code into the buffer fp, a rel of None
+    is the assignment of list entries without a relation
+    """
+    def __init__(self, fp, depth=0, layout=None):
+        self.fp = fp
+        self.depth = depth
+        self.layout = get_layout() if layout is None else layout
+        self.interner = None
+
+    def write_atom(self, key, val, rel=None):
+        layout = self.layout
+        code = layout.join(layout.atom, key, val) if rel is None else layout.join(layout.rel_atom, key, rel, val)
+        self.fp.write(layout.indent*self.depth + code)
+
+    def open_block(self, key, rel=None):
+        layout = self.layout
+        code = layout.join(layout.open, key) if rel is None else layout.join(layout.rel_open, key, rel)
+        self.fp.write(layout.indent*self.depth + code)
+        self.depth += 1
+
+    def close_block(self):
+        self.depth -= 1
+        self.fp.write(self.layout.indent*self.depth + self.layout.close)
+
+    def write_value(self, key, val, rel=None):
+        if len(val) == 1 and not isinstance(val[0], list):
+            self.write_atom(key, val[0], rel=rel)
+        else:
+            self.open_block(key, rel=rel)
+            self.write_list(val)
+            self.close_block()
+
+    def write_list(self, code_list):
+        """
+        Writes a nested list as list2paradox does, for structures
+        without a direct writer
+        """
+        for entry in code_list:
+            pos = 0
+            while pos < len(entry):
+                if pos + 2 < len(entry) and isinstance(entry[pos + 1], str):
+                    self.write_value(entry[pos], entry[pos + 2], rel=entry[pos + 1])
+                    pos += 3
+                else:
+                    self.write_value(entry[pos], entry[pos + 1])
+                    pos += 2
+
+    def write_row(self, category_cls, values):
+        """
+        Writes a category row, equal rows of a file are rendered once (see flyweight)
+        """
+        if self.interner is None:
+            category_cls.emit_values(self, values)
+        else:
+            self.fp.write(self.interner.get_text(category_cls, values, self.depth, self.render_row))
+
+    def render_row(self, category_cls, values, depth):
+        fp = io.StringIO()
+        category_cls.emit_values(type(self)(fp, depth, layout=self.layout), values)
+        return fp.getvalue()
+
+    def write_gfx_idea(self, idea):
+        fname, gfx_name = idea.get_gfx_fields()
+        self.open_block(idea.SPRITE_TYPE)
+        self.write_atom(idea.NAME_KEY, gfx_name)
+        self.write_atom(idea.TEXTURE_FILE_KEY, fname)
+        self.close_block()
+
+    def write_paradox_idea(self, idea):
+        self.open_block(idea.name)
+        for category_cls, rows in idea.get_category_rows():
+            self.open_block(category_cls.get_name())
+            for values in rows:
+                self.write_row(category_cls, values)
+            self.close_block()
+        self.close_block()
+
+    def write_gfx_file(self, idea_list, idea_cls=Idea):
+        """
+        Writes the gfx file of idea_list, returns the number of ideas
+        """
+        return self.write_file(idea_cls.wrap_gfx, [idea_cls.SPRITE_TYPES],
+                               idea_list, self.write_gfx_idea)
+
+    def write_paradox_file(self, idea_list, idea_cls=Idea):
+        """
+        Writes the ideas file of idea_list, returns the number of ideas
+        """
+        return self.write_file(idea_cls.wrap_paradox, [idea_cls.IDEAS_KEY, idea_cls.COUNTRY_KEY],
+                               idea_list, self.write_paradox_idea)
+
+    def write_file(self, wrap, keys, idea_list, write_idea):
+        with flyweight.scope() as self.interner:
+            return self.write_ideas(wrap, keys, idea_list, write_idea)
+
+    def write_ideas(self, wrap, keys, idea_list, write_idea):
+        ideas = iter(idea_list)
+        first = next(ideas, None)
+        if first is None:
+            self.write_list(wrap([]))
+            return 0
+        for key in keys:
+            self.open_block(key)
+        write_idea(first)
+        nr_ideas = 1
+        for idea in ideas:
+            write_idea(idea)
+            nr_ideas += 1
+        for _ in keys:
+            self.close_block()
+        return nr_ideas
+
+
+def render_gfx(idea_list, idea_cls=Idea):
+    fp = io.StringIO()
+    PdxEmitter(fp).write_gfx_file(idea_list, idea_cls=idea_cls)
+    return fp.getvalue()
+
+
+def render_paradox(idea_list, idea_cls=Idea):
+    fp = io.StringIO()
+    PdxEmitter(fp).write_paradox_file(idea_list, idea_cls=idea_cls)
+    return fp.getvalue()
+
+########################
+# Tests                #
+########################
+
+class EmitterTests(unittest.TestCase):
+    GFX_FILE = "gfx/interface/ideas/filename.dds"
+    def setUp(self):
+        self.ideas = []
+        for i in range(3):
+            idea = Idea(f'my_idea_{i}')
+            idea.set_dict({Idea.GFX_FNAME: self.GFX_FILE})
+            idea.set_category_objs(Modifier, [Modifier({"Key": "stability_factor", "Value": "0.05"}),
+                                              Modifier({"Key": "war_support_factor", "Value": "-0.1"})])
+            idea.set_category_objs(Rule, ModifierTable(Rule, [{"Key": "can_join_factions", "Value": "no"}]))
+            idea.set_category_objs(Cancel, [Cancel({"Key": "num_of_factories", "Relation": ">", "Value": "10"})])
+            self.ideas += [idea]
+        self.ideas[2].set_dict({Idea.PIC_NAME: "other_picture"})
+        self.ideas += [Idea('my_idea_empty')]
+        self.ideas[3].set_dict({Idea.GFX_FNAME: self.GFX_FILE})
+
+    def test_gfx(self):
+        obj_list = []
+        for idea in self.ideas:
+            obj_list += idea.write_gfx_obj()
+        expected = list2paradox(Idea.wrap_gfx(obj_list))
+        self.assertEqual(render_gfx(self.ideas), expected)
+
+    def test_paradox(self):
+        idea_obj = []
+        for idea in self.ideas:
+            idea_obj += idea.write_idea_paradox()
+        expected = list2paradox(Idea.wrap_paradox(idea_obj))
+        self.assertEqual(render_paradox(self.ideas), expected)
+
+    def test_empty(self):
+        self.assertEqual(render_gfx([]), list2paradox(Idea.wrap_gfx([])))
+        self.assertEqual(render_paradox([]), list2paradox(Idea.wrap_paradox([])))
+
+    def test_write_list(self):
+        obj = self.ideas[0].write_idea_paradox()
+        fp = io.StringIO()
+        PdxEmitter(fp).write_list([obj])
+        self.assertEqual(fp.getvalue(), list2paradox([obj]))
+
+    @staticmethod
+    def compact_list2paradox(code_list, depth=0):
+        """
+        A list2paradox with tabs and without blanks around the relations
+        """
+        lines = []
+        for entry in code_list:
+            key, rel, val = entry if len(entry) == 3 else (entry[0], "=", entry[1])
+            if len(val) == 1 and not isinstance(val[0], list):
+                lines += ["\t"*depth + f"{key}{rel}{val[0]}\n"]
+            else:
+                lines += ["\t"*depth + f"{key}{rel}{{\n",
+                          EmitterTests.compact_list2paradox(val, depth + 1), "\t"*depth + "}\n"]
+        return ''.join(lines)
+
+    def test_layout(self):
+        obj = Idea.wrap_paradox(self.ideas[0].write_idea_paradox())
+        with mock.patch(f"{__name__}.list2paradox", self.compact_list2paradox):
+            layout = Layout()
+        self.assertEqual(layout.indent, "\t")
+        fp = io.StringIO()
+        PdxEmitter(fp, layout=layout).write_list(obj)
+        self.assertEqual(fp.getvalue(), self.compact_list2paradox(obj))
+        # code without a line per entry cannot be emitted
+        with mock.patch(f"{__name__}.list2paradox", lambda code_list: str(code_list)):
+            self.assertRaises(ValueError, Layout)
+
+    def test_writers(self):
+        for write, stream in [(Idea.write_gfx_file, Idea.stream_gfx_file),
+                              (Idea.write_paradox_file, Idea.stream_paradox_file)]:
+            fname = "emitter_test.txt"
+            recorder = instrument.enable()
+            try:
+                with output.MemorySink() as sink:
+                    self.assertIsNone(write(self.ideas, fname, native=True, sink=sink))
+            finally:
+                instrument.disable()
+            # no object lists are built for the emitter
+            self.assertNotIn(instrument.BUILD_LISTS, recorder.stages)
+            native = sink.get_text(fname)
+            with output.MemorySink() as sink:
+                write(self.ideas, fname, sink=sink)
+            self.assertEqual(sink.get_text(fname), native)
+            fp = io.StringIO()
+            stream(self.ideas, fp, native=True)
+            self.assertEqual(fp.getvalue(), native)
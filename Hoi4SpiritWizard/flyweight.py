@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Interning of category objects (flyweights): equal rows of a category,
+e.g. the same stability_factor modifier in hundreds of generated ideas,
+share one frozen object with its code list, and the text the emitter
+renders for a row is kept once per indentation.
+
+The rows are interned where they are made: by spec loading (and the
+templates expanded by it) and by the importer. The shared objects are
+frozen, an idea is edited by setting new objects (e.g. Workspace.store,
+or the copy of an object). Every build or import gets a new Interner
+(see scope), so nothing is kept between builds:
+
+    with flyweight.scope() as interner:
+        cobj = interner.intern_entries(Modifier, {"Key": "stability_factor", "Value": "0.05"})
+
+The emitter also renders the text of equal rows once per written file.
+
+Rows with parsed blocks as values (lists) are not hashable and get an
+object of their own. The hits, misses and the bytes not allocated are
+added to the counters of the build statistics (see instrument).
+"""
+import unittest
+import sys
+import threading
+import contextlib
+from . import instrument
+
+# the table is dropped when it grows beyond this many entries
+MAX_ENTRIES = 1 << 20
+COUNTERS = ["intern_hits", "intern_misses", "intern_saved_bytes", "intern_text_hits"]
+
+
+def get_key(category_cls, values):
+    """
+    The table key of a row, with the types of the values, as 1, 1.0 and
+    True are equal but render differently
+    """
+    return (category_cls, tuple((type(val), val) for val in values))
+
+
+class Interner:
+    """
+    Shared category objects by (category class, field values),
+    safe to use from several threads
+    """
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.table = {}
+        self.texts = {}
+        self.hits = 0
+        self.misses = 0
+        self.text_hits = 0
+        self.saved = 0
+
+    @staticmethod
+    def get_size(cobj):
+        """
+        The bytes of a category object and its code list
+        """
+        pdx = cobj.get_pdx()
+        return sys.getsizeof(cobj) + sys.getsizeof(pdx) + sum(sys.getsizeof(item) for item in pdx
+                                                              if isinstance(item, list))
+
+    def intern(self, category_cls, values):
+        """
+        Returns the shared object of category_cls with the field values
+        """
+        key = get_key(category_cls, values)
+        try:
+            with self.lock:
+                entry = self.table.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    self.saved += entry[1]
+                    return entry[0]
+        except TypeError:
+            # parsed blocks can not be shared
+            return category_cls(dict(zip(category_cls.get_fields(), values)))
+        cobj = category_cls(dict(zip(category_cls.get_fields(), values)))
+        cobj.freeze()
+        size = self.get_size(cobj)
+        with self.lock:
+            if len(self.table) >= self.max_entries:
+                self.table.clear()
+            # another thread may have been faster
+            cobj = self.table.setdefault(key, (cobj, size))[0]
+            self.misses += 1
+        return cobj
+
+    def intern_entries(self, category_cls, entries):
+        """
+        intern with the fields given as dict
+        """
+        if any(key not in entries for key in category_cls.get_fields()):
+            # raises the error of the missing field
+            return category_cls(entries)
+        return self.intern(category_cls, tuple(entries[key] for key in category_cls.get_fields()))
+
+    def get_text(self, category_cls, values, depth, render):
+        """
+        Returns the code of a row at the indentation depth, render(category_cls,
+        values, depth) renders it the first time
+        """
+        key = (get_key(category_cls, values), depth)
+        try:
+            with self.lock:
+                text = self.texts.get(key)
+                if text is not None:
+                    self.text_hits += 1
+                    self.saved += sys.getsizeof(text)
+                    return text
+        except TypeError:
+            return render(category_cls, values, depth)
+        text = render(category_cls, values, depth)
+        with self.lock:
+            if len(self.texts) >= self.max_entries:
+                self.texts.clear()
+            return self.texts.setdefault(key, text)
+
+    def get_hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits/lookups if lookups > 0 else 0.
+
+    def get_stats(self):
+        return dict(zip(COUNTERS, [self.hits, self.misses, self.saved, self.text_hits]))
+
+
+@contextlib.contextmanager
+def scope():
+    """
+    A new Interner for one build, its statistics are added to the
+    counters of the build (see instrument) at the end
+    """
+    interner = Interner()
+    try:
+        yield interner
+    finally:
+        if instrument.is_enabled():
+            for name, value in interner.get_stats().items():
+                instrument.count(name, value)
+
+
+def collect(recorder):
+    """
+    Adds the hit rate of the interning to a build report
+    """
+    hits, misses = [recorder.counters.get(name, 0) for name in COUNTERS[:2]]
+    if hits + misses > 0:
+        recorder.gauge("intern_hit_rate", hits/(hits + misses))
+
+
+instrument.add_collector(collect)
+
+########################
+# Tests                #
+########################
+
+class InternerTests(unittest.TestCase):
+    def setUp(self):
+        from .ideas import Modifier, Cancel
+        self.modifier_cls, self.cancel_cls = Modifier, Cancel
+        self.interner = Interner()
+
+    def test_intern(self):
+        entries = {"Key": "stability_factor", "Value": "0.05"}
+        first = self.interner.intern_entries(self.modifier_cls, entries)
+        second = self.interner.intern_entries(self.modifier_cls, dict(entries))
+        self.assertIs(first, second)
+        self.assertIs(first.get_pdx(), second.get_pdx())
+        self.assertEqual(first.entries, entries)
+        # the same values in another category are another object
+        cancel = self.interner.intern(self.cancel_cls, ("has_war", "=", "yes"))
+        self.assertIsNot(self.interner.intern(self.cancel_cls, ("has_war", "=", "no")), cancel)
+        self.assertEqual((self.interner.hits, self.interner.misses), (1, 3))
+        self.assertEqual(self.interner.get_hit_rate(), 0.25)
+        self.assertEqual(self.interner.saved, self.interner.get_size(first))
+        with self.assertRaises(AttributeError):
+            first.set_fields(Key="stability_factor", Value="0.1")
+        with self.assertRaises(ValueError):
+            self.interner.intern_entries(self.modifier_cls, {"Key": "stability_factor"})
+
+    def test_unhashable(self):
+        values = ("add_ideas", [["my_idea"]])
+        cobj = self.interner.intern(self.modifier_cls, values)
+        self.assertIsNot(self.interner.intern(self.modifier_cls, values), cobj)
+        self.assertEqual(cobj.get_values(), values)
+        self.assertEqual(len(self.interner.table), 0)
+
+    def test_limit(self):
+        interner = Interner(max_entries=2)
+        for nr in range(5):
+            interner.intern(self.modifier_cls, ("stability_factor", str(nr)))
+        self.assertLessEqual(len(interner.table), 2)
+
+    def test_get_text(self):
+        calls = []
+        render = lambda cls, values, depth: calls.append(values) or f"{depth}{values}"
+        for _ in range(3):
+            text = self.interner.get_text(self.modifier_cls, ("a", "b"), 2, render)
+        self.assertEqual((text, len(calls), self.interner.text_hits), ("2('a', 'b')", 1, 2))
+
+    def test_typed_keys(self):
+        values = [self.interner.intern(self.modifier_cls, ("a", val)).Value for val in [1, 1.0, True]]
+        self.assertEqual([type(val) for val in values], [int, float, bool])
+        render = lambda cls, values, depth: str(values[1])
+        texts = [self.interner.get_text(self.modifier_cls, ("a", val), 0, render) for val in [1, True]]
+        self.assertEqual(texts, ["1", "True"])
+
+    def test_threads(self):
+        def work():
+            return [self.interner.intern(self.modifier_cls, ("stability_factor", str(nr % 10)))
+                    for nr in range(1000)]
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.interner.hits + self.interner.misses, 4000)
+        self.assertEqual(len(self.interner.table), 10)
+
+    def test_report(self):
+        recorder = instrument.enable()
+        try:
+            with scope() as interner:
+                interner.intern(self.modifier_cls, ("stability_factor", "0.05"))
+                interner.intern(self.modifier_cls, ("stability_factor", "0.05"))
+            report = recorder.get_report()
+        finally:
+            instrument.disable()
+        self.assertEqual(report["counters"]["intern_hits"], 1)
+        self.assertGreater(report["counters"]["intern_saved_bytes"], 0)
+        self.assertEqual(report["gauges"]["intern_hit_rate"], 0.5)
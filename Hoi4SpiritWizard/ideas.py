@@ -2,34 +2,117 @@
 # -*- coding: utf-8 -*-
 import unittest
 import os
+import io
 import shutil
+import zipfile
+import tempfile
+import itertools
+import contextlib
+import concurrent.futures
 from Hoi4Converter.converter import list2paradox
 from Hoi4Converter.parser import parse_grammar as code2list
+from . import instrument
+from . import output
+
+# increasing stamps of modifier changes, used to validate cached ideas
+STAMPS = itertools.count(1)
+# stamp of frozen (shared) category objects, which never change
+FROZEN_STAMP = 0
+# file frames (head, tail) of the idea classes
+FRAMES = {}
 
 class Modifier:
     """
     This class represents modifiers.
+    The fields are stored in slots, so instances carry no __dict__.
+    Subclasses with new FIELDS have to add them to __slots__.
     """
     MISSING_ERROR_MSG = "Error: Field {} missing!"
+    FROZEN_ERROR_MSG = "Error: shared {} {} cannot be changed!"
     FIELDS = ["Key", "Value"]
     NAME = "modifier"
+    __slots__ = ("Key", "Value", "pdx", "stamp")
+    # known keys, shared by all instances
+    keys = frozenset()
+
     def __init__(self, entries):
-        self.keys = {}
-        self.entries = entries
+        self.stamp = None
         self.set_fields(**entries)
+
+    def freeze(self):
+        """
+        Makes the object immutable, so it can be shared (see flyweight)
+        """
+        self.get_pdx()
+        self.stamp = FROZEN_STAMP
+
+    def copy(self):
+        """
+        An editable copy, e.g. of a shared object
+        """
+        return type(self)(self.entries)
+
+    @property
+    def entries(self):
+        return dict(zip(self.FIELDS, self.get_values()))
+
+    def get_pdx(self):
+        """
+        Cached to_pdx, reset by set_fields. The returned list
+        is shared and must not be altered.
+        """
+        if self.pdx is None:
+            self.pdx = self.to_pdx()
+        return self.pdx
+
+    def get_values(self):
+        return tuple(getattr(self, key) for key in self.FIELDS)
         
-    def set_keys(self):
-        new_keys = {"political_power_cost",
-                    "stability_factor"}
-        self.keys.update(new_keys)
+    @classmethod
+    def get_keys(cls):
+        """
+        Returns the known keys added to the category itself, not the inherited ones
+        """
+        return cls.__dict__.get("keys", frozenset())
+
+    @classmethod
+    def set_keys(cls, new_keys):
+        """
+        Adds known keys of the category, e.g. the custom modifiers of a mod,
+        which the key check accepts (see catalogue.Catalogue.find_unknown)
+        """
+        cls.keys = cls.get_keys() | frozenset(new_keys)
 
     def to_pdx(self):
         """
         Key method to adapt
         """
-        key = getattr(self, self.FIELDS[0])
-        val = getattr(self, self.FIELDS[1])
-        return [key, [val]]
+        return self.values2pdx(self.get_values())
+
+    @classmethod
+    def emit_values(cls, emitter, values):
+        """
+        Writes the field values of a row with a PdxEmitter,
+        the direct counterpart of values2pdx
+        """
+        key, val = values
+        emitter.write_value(key, cls.wrap_value(val))
+
+    @classmethod
+    def values2pdx(cls, values):
+        """
+        Turns the field values of a row into code,
+        key method to adapt
+        """
+        key, val = values
+        return [key, cls.wrap_value(val)]
+
+    @staticmethod
+    def wrap_value(val):
+        """
+        Values are single tokens or already parsed blocks (lists)
+        """
+        return val if isinstance(val, list) else [val]
     
     @classmethod
     def get_name(cls):
@@ -40,44 +123,104 @@ class Modifier:
         return cls.FIELDS
 
     def set_fields(self, **kwargs):
+        if self.stamp == FROZEN_STAMP:
+            raise AttributeError(self.FROZEN_ERROR_MSG.format(self.get_name(), self.get_values()))
         for key in self.FIELDS:
             if key in kwargs.keys():
                 setattr(self, key, kwargs[key])
             else:
-                raise Exception(self.MISSING_ERROR_MSG.format(key))
+                raise ValueError(self.MISSING_ERROR_MSG.format(key))
+        self.pdx = None
+        self.stamp = next(STAMPS)
 
 class ResearchBonus(Modifier):
     NAME = "research_bonus"
+    __slots__ = ()
 
 class Rule(Modifier):
     NAME = "rule"
+    __slots__ = ()
 
 class OnAdd(Modifier):
     NAME = "on_add"
+    __slots__ = ()
 
 class OnRemove(Modifier):
     NAME = "on_remove"
+    __slots__ = ()
 
 class TargetedModifier(Modifier):
     NAME = "targeted_modifier"
+    __slots__ = ()
 
 class Cancel(Modifier):
     NAME = 'cancel'
     FIELDS = ["Key", "Relation", "Value"]
-    def to_pdx(self):
+    __slots__ = ("Relation",)
+
+    @classmethod
+    def values2pdx(cls, values):
         """
         Key method to adapt
         """
-        key = getattr(self, self.FIELDS[0])
-        rel = getattr(self, self.FIELDS[1])
-        val = getattr(self, self.FIELDS[2])
-        return [key, rel, [val]]
+        key, rel, val = values
+        return [key, rel, cls.wrap_value(val)]
+
+    @classmethod
+    def emit_values(cls, emitter, values):
+        key, rel, val = values
+        emitter.write_value(key, cls.wrap_value(val), rel=rel)
+
+
+class ModifierTable:
+    """
+    The rows of one category stored column-wise in parallel lists,
+    a compact alternative to a list of category objects which can be
+    passed to Idea.set_category_objs directly.
+    """
+    def __init__(self, category_cls, rows=()):
+        self.category_cls = category_cls
+        self.columns = [[] for _ in category_cls.get_fields()]
+        for row in rows:
+            self.append(row)
+        self.stamp = next(STAMPS)
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def append(self, entries):
+        """
+        Adds a row given as dict of the category fields
+        """
+        fields = self.category_cls.get_fields()
+        for key in fields:
+            if key not in entries:
+                raise ValueError(self.category_cls.MISSING_ERROR_MSG.format(key))
+        for column, key in zip(self.columns, fields):
+            column.append(entries[key])
+        self.stamp = next(STAMPS)
+
+    def get_rows(self):
+        return list(zip(*self.columns))
+
+    def get_row_objs(self):
+        """
+        The rows as category objects
+        """
+        fields = self.category_cls.get_fields()
+        return [self.category_cls(dict(zip(fields, row))) for row in self.get_rows()]
+
+    def to_pdx(self):
+        return [self.category_cls.values2pdx(row) for row in zip(*self.columns)]
     
         
 class Idea:
     """
     A class which represents an HOI4 idea 
-    and is turned into code
+    and is turned into code.
+    The renderings are cached: change the fields with set_dict and the
+    categories with set_category_objs (or set_fields of their objects),
+    fields set directly as attributes after rendering are not seen.
     """
     GFX_PREFIX = "GFX_idea_"
     IDEAS_KEY = 'ideas'
@@ -89,6 +232,10 @@ class Idea:
     LOC_SUFF = ".yml"
     GFX_SUFF = ".gfx"
     PDX_SUFF = ".txt"
+    LOC_DESC_SUFF = "_desc"
+    LOC_DIR = "localisation"
+    LANGUAGES = ["english", "braz_por", "french", "german", "japanese", "korean", "polish",
+                 "russian", "simp_chinese", "spanish"]
 
     NAME_KEY = "name"
     
@@ -106,10 +253,63 @@ class Idea:
     TARGETED_MODIFIER = "targeted_modifier"
 
     CATEGORIES = [Modifier, OnAdd, OnRemove, ResearchBonus, Rule, Cancel]
+
+    # dummy identifier used to locate the item blocks in a rendered file
+    PROBE_NAME = "hoi4sw_probe"
+    FRAME_ERROR_MSG = "Error: can not split the {} code into item blocks!"
+
+    # kinds of cached renderings and the fields they depend on
+    GFX = "gfx"
+    LOC = "loc"
+    PDX = "paradox"
+    FIELD_CACHES = {GFX_FNAME: [GFX], PIC_NAME: [GFX], FULL_NAME: [LOC], DESC: [LOC]}
     
     def __init__(self, name):
         self.name = name
         self.category_objs = {}
+        # the rows of the categories when they were set, to tell changes
+        # of lists altered in place
+        self.category_rows = {}
+        self.cache = {}
+        self.cache_stamp = 0
+
+    def cached(self, key, render):
+        """
+        Returns the rendering key from the cache, render() fills it.
+        The result is shared and must not be altered.
+        """
+        if key not in self.cache:
+            self.cache[key] = render()
+        return self.cache[key]
+
+    def clear_cache(self, kinds=None):
+        """
+        Drops the cached renderings of kinds (default: all)
+        """
+        if kinds is None:
+            self.cache.clear()
+            return
+        for key in [key for key in self.cache if key[0] in kinds]:
+            del self.cache[key]
+
+    @staticmethod
+    def get_cobjs_stamp(cobjs):
+        if isinstance(cobjs, ModifierTable):
+            return cobjs.stamp
+        return max((cobj.stamp for cobj in cobjs), default=0)
+
+    def get_category_stamp(self):
+        return max((self.get_cobjs_stamp(cobjs) for cobjs in self.category_objs.values()),
+                   default=0)
+
+    def check_category_stamp(self):
+        """
+        Drops the cached ideas code if a category object changed by set_fields
+        """
+        stamp = self.get_category_stamp()
+        if stamp > self.cache_stamp:
+            self.clear_cache([self.PDX])
+            self.cache_stamp = stamp
 
     def create_gfx_object(self, fname, picture_name=None):
         """
@@ -118,29 +318,55 @@ class Idea:
         """
 
         gfx_name = self.GFX_PREFIX + (self.name if picture_name is None else picture_name)
-        inner_list = [[self.NAME_KEY, [gfx_name]],[self.TEXTURE_FILE_KEY, [fname]]]
-        outer_list = [[self.SPRITE_TYPE, inner_list]]
+        return self.fields2gfx(fname, gfx_name)
+
+    @classmethod
+    def fields2gfx(cls, fname, gfx_name):
+        """
+        The gfx code of the texture file and sprite name (see get_gfx_fields)
+        """
+        inner_list = [[cls.NAME_KEY, [gfx_name]],[cls.TEXTURE_FILE_KEY, [fname]]]
+        outer_list = [[cls.SPRITE_TYPE, inner_list]]
         return outer_list
 
     def create_localisation(self, full_name, description):
         """
-        Writes out the localisation text
+        Writes out the localisation text, one line per entry
         """
         text = ''
         text += self.INDENT + self.name + f':0 "{full_name}"\n'
-        text += self.INDENT + self.name + f'_desc:0 "{description}"'
+        text += self.INDENT + self.name + self.LOC_DESC_SUFF + f':0 "{description}"\n'
         return text
 
     def write_localisation(self):
+        return self.cached((self.LOC, "text"), self.render_localisation)
+
+    def render_localisation(self):
         if hasattr(self, self.FULL_NAME):
             fname = getattr(self, self.FULL_NAME)
         else:
-            raise AttributeError(self.MISSING_ERROR_MSG.format(self.FULL_NAME))
+            raise ValueError(self.MISSING_ERROR_MSG.format(self.FULL_NAME))
         if hasattr(self, self.DESC):
             description = getattr(self, self.DESC)
         else:
-            raise AttributeError(self.MISSING_ERROR_MSG.format(self.DESC))
+            raise ValueError(self.MISSING_ERROR_MSG.format(self.DESC))
         return self.create_localisation(fname, description)
+
+    def get_localisation(self, table=None):
+        """
+        Returns the localisation text with the name and description of
+        table (a dict of the fields by idea name), the fields of the
+        idea where table has none
+        """
+        entry = None if table is None else table.get(self.name)
+        if not entry:
+            return self.write_localisation()
+        fields = {key: entry.get(key) or getattr(self, key, None)
+                  for key in (self.FULL_NAME, self.DESC)}
+        for key, val in fields.items():
+            if val is None:
+                raise ValueError(self.MISSING_ERROR_MSG.format(key))
+        return self.create_localisation(fields[self.FULL_NAME], fields[self.DESC])
         
     def write_obj(self, obj):
         """
@@ -156,10 +382,49 @@ class Idea:
         return obj
 
     def write_gfx_obj(self):
+        return self.cached((self.GFX, "obj"), self.render_gfx_obj)
+
+    def get_gfx_fields(self):
+        """
+        Returns the texture file and sprite name of the idea
+        """
+        if not hasattr(self, self.GFX_FNAME):
+            raise ValueError(self.MISSING_ERROR_MSG.format(self.GFX_FNAME))
+        picture_name = getattr(self, self.PIC_NAME, None)
+        gfx_name = self.GFX_PREFIX + (self.name if picture_name is None else picture_name)
+        return getattr(self, self.GFX_FNAME), gfx_name
+
+    def get_symbols(self, kind):
+        """
+        Returns the names the idea defines in the files of kind
+        (PDX: idea name, GFX: sprite name, LOC: localisation keys)
+        """
+        if kind == self.PDX:
+            return [self.name]
+        if kind == self.GFX:
+            picture_name = getattr(self, self.PIC_NAME, None)
+            return [self.GFX_PREFIX + (self.name if picture_name is None else picture_name)]
+        return [self.name, self.name + self.LOC_DESC_SUFF]
+
+    def get_category_rows(self):
+        """
+        Yields the category class and the field values of the rows
+        of all categories with entries
+        """
+        for cat in self.CATEGORIES:
+            cobjs = self.category_objs.get(cat.get_name(), [])
+            if len(cobjs) == 0:
+                continue
+            if isinstance(cobjs, ModifierTable):
+                yield cat, cobjs.get_rows()
+            else:
+                yield cat, [cobj.get_values() for cobj in cobjs]
+
+    def render_gfx_obj(self):
         if hasattr(self, self.GFX_FNAME):
             fname = getattr(self, self.GFX_FNAME)
         else:
-            raise AttributeError(f"Error: {self.GFX_FNAME} missing!")
+            raise ValueError(self.MISSING_ERROR_MSG.format(self.GFX_FNAME))
         if hasattr(self, self.PIC_NAME):
             picture_name = getattr(self, self.PIC_NAME)
         else:
@@ -168,63 +433,510 @@ class Idea:
         
     
     def set_dict(self, dic):
+        """
+        Sets the fields in dic, only the renderings depending
+        on changed fields are dropped from the cache.
+        """
         for key, val in dic.items():
+            if hasattr(self, key) and getattr(self, key) == val:
+                continue
             setattr(self, key, val)
+            self.clear_cache(self.FIELD_CACHES.get(key))
+
+    @staticmethod
+    def get_cobjs_rows(cobjs):
+        """
+        The (category class, values) pairs of a list of category objects or a table
+        """
+        if isinstance(cobjs, ModifierTable):
+            return [(cobjs.category_cls, row) for row in cobjs.get_rows()]
+        return [(type(cobj), cobj.get_values()) for cobj in cobjs]
 
     def set_category_objs(self, category_cls, cobjs):
         cat_name = category_cls.get_name()
+        self.check_category_stamp()
+        rows = self.get_cobjs_rows(cobjs)
+        old_rows = self.category_rows.get(cat_name)
         self.category_objs[cat_name] = cobjs
+        self.category_rows[cat_name] = rows
+        if old_rows == rows:
+            # same code as before, the new objects take over the cache
+            self.cache_stamp = max(self.cache_stamp, self.get_category_stamp())
+        else:
+            self.clear_cache([self.PDX])
             
     def write_idea_paradox(self):
+        self.check_category_stamp()
+        return self.cached((self.PDX, "obj"), self.render_idea_paradox)
+
+    def render_idea_paradox(self):
         idea_val = []
         for cat in self.CATEGORIES:
             cat_name = cat.get_name()
-            cobjs = self.category_objs[cat_name]
+            cobjs = self.category_objs.get(cat_name, [])
             if len(cobjs) == 0:
                 continue
-            cpdx = [cobj.to_pdx() for cobj in cobjs]
+            if isinstance(cobjs, ModifierTable):
+                cpdx = cobjs.to_pdx()
+            else:
+                cpdx = [cobj.get_pdx() for cobj in cobjs]
             idea_val += [[cat_name, cpdx]]
             
         idea_obj = [self.name, idea_val]
         return idea_obj
+
+    @classmethod
+    def rows2paradox(cls, name, category_rows):
+        """
+        The ideas code of an idea from its name and the pairs of
+        get_category_rows, without Idea objects (see parallel)
+        """
+        return [name, [[cat.get_name(), [cat.values2pdx(values) for values in rows]]
+                       for cat, rows in category_rows]]
     
     def write_idea(self, path=''):
         self.write_gfx_file(path=path)
 
     @staticmethod
-    def write_file(code, outfile, path=''):
+    def write_file(code, outfile, path='', sink=None):
+        """
+        Writes code atomically into outfile, with a sink (see output)
+        into the sink, e.g. the temp file of an output.Transaction until
+        its commit or an entry of an output.ZipSink.
+        Returns the written file (None if the sink keeps no file).
+        """
         if path != '':
             outfile = os.path.join(path, outfile)
-        with open(outfile, 'w') as fp:
-            fp.write(code)
+        with instrument.stage(instrument.WRITE):
+            if sink is None:
+                output.write_atomic(code, outfile)
+                written = outfile
+            else:
+                written = sink.write(code, outfile)
+        if instrument.is_enabled():
+            instrument.add_file(outfile, os.path.getsize(written) if sink is None else sink.get_size(outfile))
+        return written
     
+    @staticmethod
+    def get_sink(sink=None):
+        """
+        A context for writing several files into sink: a new Transaction
+        committed at its end, or sink itself which its owner commits
+        """
+        return output.Transaction() if sink is None else contextlib.nullcontext(sink)
+
     @classmethod
-    def write_gfx_file(cls,idea_list, outfile, path=''):
-        obj_list = []
-        for idea in idea_list:
-            obj_list += idea.write_gfx_obj() 
-        outer_obj = [[cls.SPRITE_TYPES, obj_list]]
-        code = list2paradox(outer_obj)
-        cls.write_file(code, outfile, path=path)
+    def check_symbols(cls, idea_list, symbols, kind, outfiles, path=''):
+        """
+        Raises a ValueError if a symbol of kind of the ideas is already
+        defined in the symbol index (see symbols.SymbolIndex), apart from
+        the outfiles about to be overwritten
+        """
+        if symbols is None:
+            return
+        collisions = symbols.find_collisions(idea_list, kinds=[kind],
+                                             ignore=[os.path.join(path, outfile) for outfile in outfiles])
+        if collisions:
+            raise ValueError('\n'.join(symbols.get_messages(collisions)))
+
+    @classmethod
+    def output_file(cls, code, outfile, path='', manifest=None, blocks=None, sink=None):
+        """
+        Writes code to outfile, with a manifest (see incremental.Manifest)
+        only if it changed. blocks are the (name, code) pairs of the ideas.
+        """
+        if manifest is None:
+            cls.write_file(code, outfile, path=path, sink=sink)
+            return True
+        return manifest.write_file(code, outfile, path=path, blocks=blocks,
+                                   write=lambda code, target: cls.write_file(code, target, sink=sink),
+                                   get_size=None if sink is None else sink.get_size)
+
+    @classmethod
+    def write_gfx_file(cls,idea_list, outfile, path='', workers=None, manifest=None, native=False,
+                       symbols=None, sink=None):
+        """
+        Writes the gfx file of the ideas. If workers is given the code
+        is rendered in parallel by that many processes (0: all cpus).
+        With a manifest the file is only written if it changed.
+        With native the code is written by the direct emitter.
+        With a symbol index, sprite names defined elsewhere raise a ValueError.
+        With a sink (see output) the file goes into the sink.
+        Returns the object list of the file (None with workers or native,
+        these render the code without it).
+        """
+        idea_list = list(idea_list)
+        cls.check_symbols(idea_list, symbols, cls.GFX, [outfile], path=path)
+        outer_obj = None
+        if workers is None and not native:
+            with instrument.stage(instrument.BUILD_LISTS):
+                obj_list = []
+                for idea in idea_list:
+                    obj_list += idea.write_gfx_obj() 
+                outer_obj = [[cls.SPRITE_TYPES, obj_list]]
+        with instrument.stage(instrument.SERIALIZE):
+            blocks, code = cls.render_gfx_code(idea_list, outer_obj, workers, native)
+        cls.output_file(code, outfile, path=path, manifest=manifest, blocks=blocks, sink=sink)
         return outer_obj
 
     @classmethod
-    def write_localisation_file(cls, idea_list, outfile, path='', lang='english'):
-        text = f"l_{lang}:\n"
-        for idea in idea_list:
-            text += idea.write_localisation()
-        cls.write_file(text, outfile, path=path)
+    def render_gfx_code(cls, idea_list, outer_obj, workers=None, native=False):
+        """
+        Returns the (name, code) blocks of the ideas (None if not
+        rendered per idea) and the code of the file
+        """
+        if native:
+            blocks = None
+            code = cls.get_emitter().render_gfx(idea_list, idea_cls=cls)
+        elif workers is None:
+            blocks = [(idea.name, idea.get_gfx_block()) for idea in idea_list]
+            code = cls.join_blocks(outer_obj, [block for _, block in blocks], cls.gfx_frame)
+        else:
+            blocks = None
+            code = cls.render_parallel(idea_list, "gfx", workers)
+        return blocks, code
+
+    @classmethod
+    def write_localisation_file(cls, idea_list, outfile, path='', lang='english', manifest=None,
+                                symbols=None, sink=None):
+        idea_list = list(idea_list)
+        cls.check_symbols(idea_list, symbols, cls.LOC, [outfile], path=path)
+        with instrument.stage(instrument.SERIALIZE):
+            blocks = [(idea.name, idea.write_localisation()) for idea in idea_list]
+            text = f"l_{lang}:\n" + ''.join(block for _, block in blocks)
+        cls.output_file(text, outfile, path=path, manifest=manifest, blocks=blocks, sink=sink)
         return text
 
     @classmethod
-    def write_paradox_file(cls, idea_list, outfile, path=''):
-        idea_obj = []
-        for idea in idea_list:
-            idea_obj += idea.write_idea_paradox()
-        paradox_obj = [[cls.IDEAS_KEY, [[cls.COUNTRY_KEY, [idea_obj]]]]]
-        code = list2paradox(paradox_obj)
-        cls.write_file(code, outfile, path=path)
+    def get_localisation_file_name(cls, prefix, lang):
+        return os.path.join(cls.LOC_DIR, lang, f"{prefix}_l_{lang}{cls.LOC_SUFF}")
+
+    @classmethod
+    def write_localisation_files(cls, idea_list, prefix, path='', languages=None, translations=None,
+                                 manifest=None, symbols=None, sink=None):
+        """
+        Writes localisation/<lang>/<prefix>_l_<lang>.yml for all languages
+        (default: LANGUAGES) in a single pass over the ideas.
+        translations maps a language to a dict of the FullName and
+        Description by idea name, missing entries are taken from the ideas.
+        The files are written concurrently and replaced together,
+        or go into sink (see output).
+        Returns the written files by language.
+        """
+        languages = cls.LANGUAGES if languages is None else list(languages)
+        translations = {} if translations is None else translations
+        idea_list = list(idea_list)
+        outfiles = {lang: cls.get_localisation_file_name(prefix, lang) for lang in languages}
+        cls.check_symbols(idea_list, symbols, cls.LOC, outfiles.values(), path=path)
+        with instrument.stage(instrument.SERIALIZE):
+            blocks = {lang: [] for lang in languages}
+            for idea in idea_list:
+                for lang in languages:
+                    blocks[lang] += [(idea.name, idea.get_localisation(translations.get(lang)))]
+            texts = {lang: f"l_{lang}:\n" + ''.join(block for _, block in blocks[lang])
+                     for lang in languages}
+        with cls.get_sink(sink) as sink:
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                futures = [executor.submit(cls.output_file, texts[lang], outfiles[lang], path=path,
+                                           manifest=manifest, blocks=blocks[lang], sink=sink)
+                           for lang in languages]
+                for future in futures:
+                    future.result()
+        return {lang: os.path.join(path, outfile) for lang, outfile in outfiles.items()}
+
+    @classmethod
+    def write_paradox_file(cls, idea_list, outfile, path='', workers=None, manifest=None,
+                           native=False, symbols=None, sink=None, catalogue=None):
+        """
+        Writes the ideas file. If workers is given the code
+        is rendered in parallel by that many processes (0: all cpus).
+        With a manifest the file is only written if it changed.
+        With native the code is written by the direct emitter.
+        With a symbol index, idea names defined elsewhere raise a ValueError.
+        With a sink (see output) the file goes into the sink.
+        With a key catalogue (see catalogue.Catalogue), unknown keys raise a ValueError.
+        Returns the object list of the file (None with workers or native,
+        these render the code without it).
+        """
+        idea_list = list(idea_list)
+        cls.check_symbols(idea_list, symbols, cls.PDX, [outfile], path=path)
+        if catalogue is not None:
+            catalogue.check(idea_list)
+        paradox_obj = None
+        if workers is None and not native:
+            with instrument.stage(instrument.BUILD_LISTS):
+                idea_obj = []
+                for idea in idea_list:
+                    idea_obj += idea.write_idea_paradox()
+                paradox_obj = [[cls.IDEAS_KEY, [[cls.COUNTRY_KEY, [idea_obj]]]]]
+        if instrument.is_enabled():
+            instrument.count("ideas", len(idea_list))
+            instrument.count("modifiers", sum(len(cobjs) for idea in idea_list
+                                              for cobjs in idea.category_objs.values()))
+        with instrument.stage(instrument.SERIALIZE):
+            blocks, code = cls.render_paradox_code(idea_list, paradox_obj, workers, native)
+        cls.output_file(code, outfile, path=path, manifest=manifest, blocks=blocks, sink=sink)
         return paradox_obj
+
+    @classmethod
+    def merge_paradox_file(cls, idea_list, outfile, path='', catalogue=None):
+        """
+        Merges the ideas into an existing ideas file: changed ideas are
+        replaced, new ones added, the rest of the file is left as it is
+        (see splice.splice_ideas). A missing file is written as a whole.
+        Returns the names of the replaced and of the added ideas.
+        """
+        idea_list = list(idea_list)
+        if catalogue is not None:
+            catalogue.check(idea_list)
+        target = os.path.join(path, outfile)
+        if not os.path.isfile(target):
+            cls.write_paradox_file(idea_list, outfile, path=path)
+            return [], [idea.name for idea in idea_list]
+        from .splice import splice_ideas
+        return splice_ideas(idea_list, target)
+
+    @classmethod
+    def write_idea_files(cls, idea_list, gfx_file, loc_file, pdx_file, path='', lang='english',
+                         sink=None, **kwargs):
+        """
+        Writes the gfx, localisation and ideas files of the ideas concurrently.
+        The three files are replaced together once all of them are written,
+        on an error none is, or go into sink (see output).
+        kwargs go to the write_*_file methods.
+        """
+        idea_list = list(idea_list)
+        # the threads must not drop cached code of the same ideas
+        for idea in idea_list:
+            idea.check_category_stamp()
+        loc_kwargs = {key: val for key, val in kwargs.items() if key in ("manifest", "symbols")}
+        gfx_kwargs = {key: val for key, val in kwargs.items() if key != "catalogue"}
+        with cls.get_sink(sink) as sink:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+                futures = [executor.submit(cls.write_gfx_file, idea_list, gfx_file, path=path,
+                                           sink=sink, **gfx_kwargs),
+                           executor.submit(cls.write_localisation_file, idea_list, loc_file,
+                                           path=path, lang=lang, sink=sink, **loc_kwargs),
+                           executor.submit(cls.write_paradox_file, idea_list, pdx_file, path=path,
+                                           sink=sink, **kwargs)]
+                for future in futures:
+                    future.result()
+
+    @classmethod
+    def render_paradox_code(cls, idea_list, paradox_obj, workers=None, native=False):
+        """
+        Returns the (name, code) blocks of the ideas (None if not
+        rendered per idea) and the code of the file
+        """
+        if native:
+            blocks = None
+            code = cls.get_emitter().render_paradox(idea_list, idea_cls=cls)
+        elif workers is None:
+            blocks = [(idea.name, idea.get_paradox_block()) for idea in idea_list]
+            code = cls.join_blocks(paradox_obj, [block for _, block in blocks], cls.paradox_frame)
+        else:
+            blocks = None
+            code = cls.render_parallel(idea_list, "paradox", workers)
+        return blocks, code
+
+    @staticmethod
+    def get_emitter():
+        from . import emitter
+        return emitter
+
+    @staticmethod
+    def render_parallel(idea_list, kind, workers):
+        from . import parallel
+        return parallel.render_code(idea_list, kind, workers=workers or None)
+
+    @classmethod
+    def wrap_gfx(cls, obj_list):
+        return [[cls.SPRITE_TYPES, obj_list]]
+
+    @classmethod
+    def wrap_paradox(cls, idea_obj):
+        return [[cls.IDEAS_KEY, [[cls.COUNTRY_KEY, [idea_obj]]]]]
+
+    @classmethod
+    def get_frame(cls, wrap, probe):
+        """
+        Splits the code of the file wrap(items) into the head and tail
+        which surround the blocks of the items. The blocks are measured
+        by rendering the probe item once and twice.
+        """
+        one = list2paradox(wrap(probe))
+        two = list2paradox(wrap(probe + probe))
+        size = len(two) - len(one)
+        # the block starts at the beginning of a line before the probe
+        start = one.index(cls.PROBE_NAME)
+        while start > 0:
+            start = one.rfind("\n", 0, start) + 1
+            head, block, tail = one[:start], one[start:start + size], one[start + size:]
+            if two == head + 2*block + tail:
+                return head, tail
+            start -= 1
+        raise ValueError(cls.FRAME_ERROR_MSG.format(wrap.__name__))
+
+    @classmethod
+    def get_block(cls, wrap, item, frame):
+        """
+        Renders the code of a single item inside the file frame
+        """
+        head, tail = frame
+        code = list2paradox(wrap(item))
+        if not (code.startswith(head) and code.endswith(tail)):
+            raise ValueError(cls.FRAME_ERROR_MSG.format(wrap.__name__))
+        return code[len(head):len(code)-len(tail)]
+
+    @classmethod
+    def gfx_frame(cls):
+        if (cls, cls.GFX) not in FRAMES:
+            probe = cls(cls.PROBE_NAME).create_gfx_object(cls.PROBE_NAME)
+            FRAMES[cls, cls.GFX] = cls.get_frame(cls.wrap_gfx, probe)
+        return FRAMES[cls, cls.GFX]
+
+    @classmethod
+    def paradox_frame(cls):
+        if (cls, cls.PDX) not in FRAMES:
+            probe = cls(cls.PROBE_NAME).render_idea_paradox()
+            FRAMES[cls, cls.PDX] = cls.get_frame(cls.wrap_paradox, probe)
+        return FRAMES[cls, cls.PDX]
+
+    def get_gfx_block(self):
+        """
+        Cached code of the idea inside the gfx file
+        """
+        return self.cached((self.GFX, "block"), lambda: self.get_block(
+            self.wrap_gfx, self.write_gfx_obj(), self.gfx_frame()))
+
+    def get_paradox_block(self):
+        """
+        Cached code of the idea inside the ideas file
+        """
+        self.check_category_stamp()
+        return self.cached((self.PDX, "block"), lambda: self.get_block(
+            self.wrap_paradox, self.write_idea_paradox(), self.paradox_frame()))
+
+    @classmethod
+    def join_blocks(cls, obj, blocks, frame):
+        """
+        Joins the blocks of the ideas into the code of the file obj
+        """
+        if len(blocks) == 0:
+            return list2paradox(obj)
+        head, tail = frame()
+        return head + ''.join(blocks) + tail
+
+    @classmethod
+    def stream_blocks(cls, idea_list, fp, wrap, frame, block):
+        """
+        Writes the file wrap(items) into fp, one idea block at a time
+        """
+        ideas = iter(idea_list)
+        first = next(ideas, None)
+        if first is None:
+            fp.write(list2paradox(wrap([])))
+            return 0
+        head, tail = frame()
+        fp.write(head)
+        nr_ideas = 0
+        for idea in itertools.chain([first], ideas):
+            fp.write(block(idea))
+            nr_ideas += 1
+        fp.write(tail)
+        return nr_ideas
+
+    @classmethod
+    def stream_gfx_file(cls, idea_list, fp, native=False):
+        """
+        Streaming variant of write_gfx_file: takes any iterable of ideas
+        and writes the code of each one directly into the open file fp.
+        Returns the number of ideas written.
+        """
+        if native:
+            return cls.get_emitter().PdxEmitter(fp).write_gfx_file(idea_list, idea_cls=cls)
+        return cls.stream_blocks(idea_list, fp, cls.wrap_gfx, cls.gfx_frame,
+                                 lambda idea: idea.get_gfx_block())
+
+    @classmethod
+    def stream_localisation_file(cls, idea_list, fp, lang='english'):
+        """
+        Streaming variant of write_localisation_file
+        """
+        fp.write(f"l_{lang}:\n")
+        nr_ideas = 0
+        for idea in idea_list:
+            fp.write(idea.write_localisation())
+            nr_ideas += 1
+        return nr_ideas
+
+    @classmethod
+    def stream_idea_files(cls, idea_list, gfx_fp, loc_fp, pdx_fp, lang='english'):
+        """
+        Streams the gfx, localisation and ideas files in a single pass
+        over idea_list, so a generator of ideas is only consumed once.
+        Returns the number of ideas written.
+        """
+        ideas = iter(idea_list)
+        first = next(ideas, None)
+        if first is None:
+            cls.stream_gfx_file([], gfx_fp)
+            cls.stream_localisation_file([], loc_fp, lang=lang)
+            cls.stream_paradox_file([], pdx_fp)
+            return 0
+        gfx_head, gfx_tail = cls.gfx_frame()
+        pdx_head, pdx_tail = cls.paradox_frame()
+        gfx_fp.write(gfx_head)
+        loc_fp.write(f"l_{lang}:\n")
+        pdx_fp.write(pdx_head)
+        if instrument.is_enabled():
+            return cls.stream_profiled(itertools.chain([first], ideas), gfx_fp, loc_fp, pdx_fp,
+                                       gfx_tail, pdx_tail)
+        nr_ideas = 0
+        for idea in itertools.chain([first], ideas):
+            gfx_fp.write(idea.get_gfx_block())
+            loc_fp.write(idea.write_localisation())
+            pdx_fp.write(idea.get_paradox_block())
+            nr_ideas += 1
+        gfx_fp.write(gfx_tail)
+        pdx_fp.write(pdx_tail)
+        return nr_ideas
+
+    @classmethod
+    def stream_profiled(cls, ideas, gfx_fp, loc_fp, pdx_fp, gfx_tail, pdx_tail):
+        """
+        The loop of stream_idea_files timing the stages of each idea
+        """
+        times = instrument.StageTimes()
+        nr_ideas = 0
+        nr_modifiers = 0
+        for idea in ideas:
+            with times.stage(instrument.BUILD_LISTS):
+                idea.write_gfx_obj()
+                idea.write_idea_paradox()
+            with times.stage(instrument.SERIALIZE):
+                codes = idea.get_gfx_block(), idea.write_localisation(), idea.get_paradox_block()
+            with times.stage(instrument.WRITE):
+                for fp, code in zip((gfx_fp, loc_fp, pdx_fp), codes):
+                    fp.write(code)
+            nr_ideas += 1
+            nr_modifiers += sum(len(cobjs) for cobjs in idea.category_objs.values())
+        with times.stage(instrument.WRITE):
+            gfx_fp.write(gfx_tail)
+            pdx_fp.write(pdx_tail)
+        times.add()
+        instrument.count("modifiers", nr_modifiers)
+        return nr_ideas
+
+    @classmethod
+    def stream_paradox_file(cls, idea_list, fp, native=False):
+        """
+        Streaming variant of write_paradox_file
+        """
+        if native:
+            return cls.get_emitter().PdxEmitter(fp).write_paradox_file(idea_list, idea_cls=cls)
+        return cls.stream_blocks(idea_list, fp, cls.wrap_paradox, cls.paradox_frame,
+                                 lambda idea: idea.get_paradox_block())
         
         
 ########################
@@ -267,14 +979,15 @@ class IdeaTests(unittest.TestCase):
         #self.assertEqual(result[0].strip(), "l_english:")
         self.assertIn(self.idea.INDENT + f'{self.idea.name}:0', result[0])
         self.assertIn(self.idea.INDENT + f'{self.idea.name}_desc:0', result[1])
+        self.assertTrue(self.idea.create_localisation(name, desc).endswith('"\n'))
 
     def test_write_localisation_file(self):
         self.idea.set_dict(self.loc_data)
         out_file = self.idea.name + Idea.LOC_SUFF
 
-        result = Idea.write_localisation_file([self.idea],out_file).splitlines()
-        self.assertTrue(os.path.isfile(out_file))
-        os.remove(out_file)
+        with output.MemorySink() as sink:
+            result = Idea.write_localisation_file([self.idea], out_file, sink=sink).splitlines()
+        self.assertEqual(sink.get_text(out_file).splitlines(), result)
 
         self.assertEqual(result[0].strip(), "l_english:")
         self.assertIn(self.idea.INDENT + f'{self.idea.name}:0', result[1])
@@ -304,7 +1017,8 @@ class IdeaTests(unittest.TestCase):
     def test_write_gfx_file(self):
         fname = self.idea.name + self.idea.GFX_SUFF
         self.idea.set_dict(self.GFX_data)
-        obj = Idea.write_gfx_file([self.idea], fname)
+        with output.MemorySink() as sink:
+            obj = Idea.write_gfx_file([self.idea], fname, sink=sink)
         expected_code = """spriteTypes = {
         spriteType = {
             name = GFX_idea_my_idea_1
@@ -312,12 +1026,12 @@ class IdeaTests(unittest.TestCase):
             }}"""
         expected_obj = code2list(expected_code)
         self.assertEqual(obj, expected_obj)
-        self.assertTrue(os.path.isfile(fname))
-        os.remove(fname)
+        self.assertEqual(code2list(sink.get_text(fname)), expected_obj)
 
     def test_write_paradox_file(self):
         fname = self.idea.name + self.idea.PDX_SUFF
-        obj = Idea.write_paradox_file([self.idea], fname)
+        with output.MemorySink() as sink:
+            obj = Idea.write_paradox_file([self.idea], fname, sink=sink)
         
         expected_code = """ideas = {
         country = {
@@ -326,7 +1040,221 @@ class IdeaTests(unittest.TestCase):
         expected_obj = code2list(expected_code)
 
         self.assertEqual(obj, expected_obj)
-        self.assertTrue(os.path.isfile(fname))
-        os.remove(fname)
+        self.assertEqual(list(sink.files), [fname])
+
+
+
+
+class ModifierTests(unittest.TestCase):
+    def test_slots(self):
+        for category_cls in Idea.CATEGORIES:
+            cobj = category_cls({key: key.lower() for key in category_cls.get_fields()})
+            self.assertFalse(hasattr(cobj, '__dict__'))
+            self.assertEqual(cobj.entries, {key: key.lower() for key in category_cls.get_fields()})
+
+    def test_to_pdx(self):
+        self.assertEqual(Modifier({"Key": "stability_factor", "Value": "0.05"}).to_pdx(),
+                         ["stability_factor", ["0.05"]])
+        self.assertEqual(Cancel({"Key": "has_war", "Relation": "=", "Value": "yes"}).to_pdx(),
+                         ["has_war", "=", ["yes"]])
+
+    def test_missing_field(self):
+        with self.assertRaises(ValueError):
+            Cancel({"Key": "has_war", "Value": "yes"})
+        with self.assertRaises(ValueError):
+            ModifierTable(Cancel, [{"Key": "has_war", "Value": "yes"}])
+
+    def test_modifier_table(self):
+        rows = [{"Key": "has_war", "Relation": "=", "Value": "yes"},
+                {"Key": "num_of_factories", "Relation": ">", "Value": "10"}]
+        table = ModifierTable(Cancel, rows)
+        cobjs = [Cancel(row) for row in rows]
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.to_pdx(), [cobj.to_pdx() for cobj in cobjs])
+        self.assertEqual([cobj.entries for cobj in table.get_row_objs()], rows)
+
+        idea, table_idea = Idea('my_idea_1'), Idea('my_idea_1')
+        idea.set_category_objs(Cancel, cobjs)
+        table_idea.set_category_objs(Cancel, table)
+        self.assertEqual(idea.write_idea_paradox(), table_idea.write_idea_paradox())
+        pdx = table_idea.write_idea_paradox()
+        table.append({"Key": "has_government", "Relation": "=", "Value": "fascism"})
+        self.assertNotEqual(table_idea.write_idea_paradox(), pdx)
+
+
+class CacheTests(unittest.TestCase):
+    def setUp(self):
+        self.idea = Idea('my_idea_1')
+        self.idea.set_dict({Idea.GFX_FNAME: "gfx/interface/ideas/filename.dds",
+                            Idea.FULL_NAME: "Idea's Name", Idea.DESC: "Idea's Description"})
+        self.modifier = Modifier({"Key": "stability_factor", "Value": "0.05"})
+        self.idea.set_category_objs(Modifier, [self.modifier])
+
+    def test_cached(self):
+        self.assertIs(self.idea.write_gfx_obj(), self.idea.write_gfx_obj())
+        self.assertIs(self.idea.write_localisation(), self.idea.write_localisation())
+        self.assertIs(self.idea.write_idea_paradox(), self.idea.write_idea_paradox())
+        self.assertIs(self.modifier.get_pdx(), self.modifier.get_pdx())
+
+    def test_set_dict(self):
+        gfx, loc = self.idea.write_gfx_obj(), self.idea.write_localisation()
+        self.idea.set_dict({Idea.DESC: "Idea's Description"})
+        self.assertIs(self.idea.write_localisation(), loc)
+        self.idea.set_dict({Idea.DESC: "New Description"})
+        self.assertIn("New Description", self.idea.write_localisation())
+        self.assertIs(self.idea.write_gfx_obj(), gfx)
+        self.idea.set_dict({Idea.NAME_KEY: "my_idea_2"})
+        self.assertIn("my_idea_2", self.idea.get_gfx_block())
+
+    def test_set_fields(self):
+        block = self.idea.get_paradox_block()
+        self.modifier.set_fields(Key="stability_factor", Value="0.25")
+        self.assertNotEqual(self.idea.get_paradox_block(), block)
+        self.assertIn("0.25", self.idea.get_paradox_block())
+
+    def test_set_category_objs(self):
+        pdx = self.idea.write_idea_paradox()
+        same = Modifier({"Key": "stability_factor", "Value": "0.05"})
+        self.idea.set_category_objs(Modifier, [same])
+        self.assertIs(self.idea.write_idea_paradox(), pdx)
+        same.set_fields(Key="stability_factor", Value="0.1")
+        self.assertIsNot(self.idea.write_idea_paradox(), pdx)
+        self.idea.set_category_objs(Rule, [Rule({"Key": "can_join_factions", "Value": "no"})])
+        self.assertEqual(len(self.idea.write_idea_paradox()[1]), 2)
+
+    def test_set_same_list(self):
+        cobjs = [Modifier({"Key": "stability_factor", "Value": "0.05"}),
+                 Modifier({"Key": "war_support_factor", "Value": "0.1"})]
+        self.idea.set_category_objs(Modifier, cobjs)
+        self.assertIn("war_support_factor", self.idea.get_paradox_block())
+        # the list altered in place and set again
+        cobjs.pop()
+        self.idea.set_category_objs(Modifier, cobjs)
+        self.assertNotIn("war_support_factor", self.idea.get_paradox_block())
+        self.assertIn("stability_factor", self.idea.get_paradox_block())
+
+
+class StreamTests(unittest.TestCase):
+    GFX_FILE = "gfx/interface/ideas/filename.dds"
+    NR_IDEAS = 3
+    def setUp(self):
+        self.ideas = []
+        for i in range(self.NR_IDEAS):
+            idea = Idea(f'my_idea_{i}')
+            idea.set_dict({Idea.GFX_FNAME: self.GFX_FILE,
+                           Idea.FULL_NAME: f"Idea {i}", Idea.DESC: f"Description {i}"})
+            idea.set_category_objs(Modifier, [Modifier({"Key": "stability_factor", "Value": "0.05"})])
+            idea.set_category_objs(Cancel, [Cancel({"Key": "has_war", "Relation": "=", "Value": "yes"})])
+            self.ideas += [idea]
+
+    def test_stream_gfx_file(self):
+        fp = io.StringIO()
+        nr_ideas = Idea.stream_gfx_file(iter(self.ideas), fp)
+        obj_list = []
+        for idea in self.ideas:
+            obj_list += idea.write_gfx_obj()
+        self.assertEqual(nr_ideas, self.NR_IDEAS)
+        self.assertEqual(fp.getvalue(), list2paradox(Idea.wrap_gfx(obj_list)))
+
+    def test_stream_localisation_file(self):
+        fp = io.StringIO()
+        Idea.stream_localisation_file(iter(self.ideas), fp, lang='german')
+        expected = "l_german:\n" + "".join(idea.write_localisation() for idea in self.ideas)
+        self.assertEqual(fp.getvalue(), expected)
+        # every entry on a line of its own
+        lines = fp.getvalue().splitlines()
+        self.assertEqual(len(lines), 1 + 2*len(self.ideas))
+        self.assertEqual(lines[-1], f' {self.ideas[-1].name}_desc:0 "{getattr(self.ideas[-1], Idea.DESC)}"')
+
+    def test_stream_paradox_file(self):
+        fp = io.StringIO()
+        Idea.stream_paradox_file((idea for idea in self.ideas), fp)
+        idea_obj = []
+        for idea in self.ideas:
+            idea_obj += idea.write_idea_paradox()
+        self.assertEqual(fp.getvalue(), list2paradox(Idea.wrap_paradox(idea_obj)))
+
+    def test_stream_idea_files(self):
+        fps = [io.StringIO() for _ in range(3)]
+        nr_ideas = Idea.stream_idea_files((idea for idea in self.ideas), *fps)
+        expected = [io.StringIO() for _ in range(3)]
+        Idea.stream_gfx_file(self.ideas, expected[0])
+        Idea.stream_localisation_file(self.ideas, expected[1])
+        Idea.stream_paradox_file(self.ideas, expected[2])
+        self.assertEqual(nr_ideas, self.NR_IDEAS)
+        self.assertEqual([fp.getvalue() for fp in fps], [fp.getvalue() for fp in expected])
+
+    def test_stream_empty(self):
+        fp = io.StringIO()
+        self.assertEqual(Idea.stream_paradox_file([], fp), 0)
+        self.assertEqual(fp.getvalue(), list2paradox(Idea.wrap_paradox([])))
+
+    def test_write_idea_files(self):
+        files = ["out.gfx", "out.yml", "out.txt"]
+        with tempfile.TemporaryDirectory() as path:
+            Idea.write_idea_files(self.ideas, *files, path=path)
+            self.assertEqual(sorted(os.listdir(path)), sorted(files))
+            with open(os.path.join(path, "out.yml"), encoding="utf-8-sig") as fp:
+                self.assertEqual(fp.read(), "l_english:\n" + "".join(idea.write_localisation()
+                                                                     for idea in self.ideas))
+            with open(os.path.join(path, "out.txt"), encoding="utf-8") as fp:
+                code = fp.read()
+            for idea in self.ideas:
+                del idea.GFXFileName
+                idea.clear_cache()
+            # a failing gfx file writes none of the files
+            with self.assertRaises(ValueError):
+                Idea.write_idea_files(self.ideas, "new.gfx", "new.yml", "new.txt", path=path)
+            self.assertEqual(sorted(os.listdir(path)), sorted(files))
+            with open(os.path.join(path, "out.txt"), encoding="utf-8") as fp:
+                self.assertEqual(fp.read(), code)
 
+    def test_write_idea_files_sinks(self):
+        files = ["out.gfx", "out.yml", "out.txt"]
+        with output.MemorySink() as memory:
+            Idea.write_idea_files(self.ideas, *files, path="mod", sink=memory)
+        archive = io.BytesIO()
+        with output.ZipSink(archive) as zip_sink:
+            Idea.write_idea_files(self.ideas, *files, path="mod", sink=zip_sink)
+            Idea.write_localisation_files(self.ideas, "out", path="mod", languages=["german"],
+                                          sink=zip_sink)
+        with zipfile.ZipFile(archive) as zip_file:
+            self.assertEqual(sorted(zip_file.namelist()),
+                             sorted(["mod/" + fname for fname in files] +
+                                    ["mod/localisation/german/out_l_german.yml"]))
+            for fname in files:
+                self.assertEqual(zip_file.read("mod/" + fname), memory.files[os.path.join("mod", fname)])
+        # a manifest of files kept in a sink only holds their sizes
+        from .incremental import Manifest
+        with tempfile.TemporaryDirectory() as path:
+            manifest = Manifest(path)
+            for _ in range(2):
+                with output.MemorySink() as sink:
+                    Idea.write_idea_files(self.ideas, *files, path=path, sink=sink, manifest=manifest)
+                self.assertEqual(sorted(sink.files), sorted(os.path.join(path, fname) for fname in files))
+            self.assertEqual(manifest.files["out.txt"]["stat"], [len(sink.files[os.path.join(path, "out.txt")]),
+                                                                 None])
 
+    def test_write_localisation_files(self):
+        translations = {"german": {"my_idea_0": {Idea.FULL_NAME: "Idee 0", Idea.DESC: "Beschreibung 0"},
+                                   "my_idea_1": {Idea.FULL_NAME: "Idee 1"}}}
+        with tempfile.TemporaryDirectory() as path:
+            files = Idea.write_localisation_files(self.ideas, "spirits", path=path,
+                                                  languages=["english", "german"],
+                                                  translations=translations)
+            self.assertEqual(files["german"],
+                             os.path.join(path, "localisation", "german", "spirits_l_german.yml"))
+            texts = {}
+            for lang, fname in files.items():
+                with open(fname, encoding="utf-8-sig") as fp:
+                    texts[lang] = fp.read()
+        self.assertEqual(texts["english"], "l_english:\n" + "".join(idea.write_localisation()
+                                                                    for idea in self.ideas))
+        self.assertTrue(texts["german"].startswith("l_german:\n"))
+        self.assertIn('my_idea_0:0 "Idee 0"', texts["german"])
+        self.assertIn('my_idea_0_desc:0 "Beschreibung 0"', texts["german"])
+        self.assertIn('my_idea_1_desc:0 "Description 1"', texts["german"])
+        self.assertIn('my_idea_2:0 "Idea 2"', texts["german"])
+        for text in texts.values():
+            self.assertEqual(len(text.splitlines()), 1 + 2*len(self.ideas))
+            self.assertTrue(text.endswith('"\n'))
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Import of existing ideas: loads common/ideas/*.txt, interface/*.gfx and
+localisation/**/*.yml files of a mod back into Idea/Modifier objects.
+Parse results are kept as JSON in the cache directory of the user, keyed
+by path, mtime and size, so only files which changed since the last
+import are parsed again. Keys of an idea without a counterpart in Idea
+(allowed, cost, ...) are not imported, with a warning.
+"""
+import unittest
+from unittest import mock
+import os
+import re
+import glob
+import json
+import hashlib
+import tempfile
+import warnings
+from Hoi4Converter.parser import parse_grammar as code2list
+from .ideas import Idea, Modifier, Cancel
+from . import flyweight
+
+# the cache of the user is taken from this environment variable if it is set
+CACHE_ENV = "HOI4SW_CACHE"
+CACHE_NAME = "hoi4sw"
+CACHE_VERSION = 2
+ENCODING = 'utf-8-sig'
+DROPPED_WARNING_MSG = "Warning: the keys {} of idea {} in {} are not imported!"
+
+IDEAS_GLOB = os.path.join("common", "ideas", "*.txt")
+GFX_GLOB = os.path.join("interface", "*.gfx")
+LOC_GLOB = os.path.join("localisation", "**", "*.yml")
+
+# key:0 "text", several entries may share a line
+LOC_PATTERN = re.compile(r'([\w.\-]+):\d*[ \t]*"(.*?)"(?=[ \t]*(?:[\w.\-]+:\d*[ \t]*"|#|$))',
+                         re.MULTILINE)
+DESC_SUFF = Idea.LOC_DESC_SUFF
+
+CATEGORY_MAP = {cat.get_name(): cat for cat in Idea.CATEGORIES}
+
+
+def get_user_cache_dir(*names):
+    """
+    The directory names in the cache of the user: $HOI4SW_CACHE, else
+    hoi4sw in %LOCALAPPDATA% on Windows, in $XDG_CACHE_HOME or ~/.cache
+    """
+    root = os.environ.get(CACHE_ENV)
+    if not root:
+        base = os.environ.get("LOCALAPPDATA" if os.name == 'nt' else "XDG_CACHE_HOME")
+        root = os.path.join(base or os.path.join(os.path.expanduser("~"), ".cache"), CACHE_NAME)
+    return os.path.join(root, *names)
+
+
+def parse_localisation(code):
+    """
+    Returns a dict of the localisation keys and texts
+    """
+    return {match.group(1): match.group(2) for match in LOC_PATTERN.finditer(code)}
+
+
+class ParseCache:
+    """
+    On-disk cache of parse results (default: in the cache of the user).
+    An entry is valid as long as the path, modification time and size
+    of the file are unchanged.
+    """
+    def __init__(self, cache_dir=None):
+        self.cache_dir = get_user_cache_dir("import") if cache_dir is None else cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def get_cache_file(self, path, kind):
+        key = hashlib.sha1(f"{kind}:{os.path.abspath(path)}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + ".json")
+
+    @staticmethod
+    def get_stamp(path):
+        stat = os.stat(path)
+        return [CACHE_VERSION, os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+
+    def load(self, path, kind, parser):
+        """
+        Returns parser(code of path), from the cache if the file is unchanged
+        """
+        stamp = self.get_stamp(path)
+        cache_file = self.get_cache_file(path, kind)
+        if os.path.isfile(cache_file):
+            try:
+                with open(cache_file, encoding='utf-8') as fp:
+                    cached_stamp, data = json.load(fp)
+                if cached_stamp == stamp:
+                    self.hits += 1
+                    return data
+            except (OSError, ValueError, TypeError):
+                pass
+        self.misses += 1
+        with open(path, encoding=ENCODING, errors='replace') as fp:
+            data = parser(fp.read())
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as fp:
+            json.dump([stamp, data], fp, separators=(',', ':'))
+        os.replace(tmp_file, cache_file)
+        return data
+
+
+class IdeaImporter:
+    """
+    Turns parsed ideas, gfx and localisation files into Idea objects
+    """
+    IDEAS = "ideas"
+    GFX = "gfx"
+    LOC = "loc"
+
+    def __init__(self, cache_dir=None):
+        self.cache = ParseCache(cache_dir)
+        # equal rows of the imported ideas share one frozen object
+        self.interner = flyweight.Interner()
+        self.ideas = {}
+        self.sprites = {}
+        # keys not imported by idea name
+        self.dropped = {}
+
+    def get_idea(self, name):
+        if name not in self.ideas:
+            idea = Idea(name)
+            for cat in Idea.CATEGORIES:
+                idea.set_category_objs(cat, [])
+            self.ideas[name] = idea
+        return self.ideas[name]
+
+    def to_cobj(self, category_cls, row):
+        if len(category_cls.get_fields()) == 3:
+            key, rel, val = row if len(row) == 3 else (row[0], "=", row[1])
+            values = [key, rel, val]
+        else:
+            key, val = row[0], row[-1]
+            values = [key, val]
+        values[-1] = val[0] if len(val) == 1 and not isinstance(val[0], list) else val
+        return self.interner.intern(category_cls, tuple(values))
+
+    def add_idea(self, name, idea_val, path=''):
+        idea = self.get_idea(name)
+        dropped = []
+        for entry in idea_val:
+            cat = CATEGORY_MAP.get(entry[0])
+            # other keys of the idea (allowed, picture, ...) are not represented
+            if cat is None or not isinstance(entry[-1], list):
+                dropped += [entry[0]]
+                continue
+            idea.set_category_objs(cat, [self.to_cobj(cat, row) for row in entry[-1]])
+        if len(dropped) > 0:
+            self.dropped.setdefault(name, []).extend(dropped)
+            warnings.warn(DROPPED_WARNING_MSG.format(", ".join(dropped), name, path))
+
+    def load_ideas_file(self, path):
+        for top in self.cache.load(path, self.IDEAS, code2list):
+            if top[0] != Idea.IDEAS_KEY:
+                continue
+            # group (country, ...) = { idea = { ... } ... }
+            for group in top[-1]:
+                for entry in group[-1]:
+                    self.add_idea(entry[0], entry[-1], path=path)
+
+    def load_gfx_file(self, path):
+        for top in self.cache.load(path, self.GFX, code2list):
+            for sprite in top[-1]:
+                if sprite[0] != Idea.SPRITE_TYPE:
+                    continue
+                fields = {entry[0]: entry[-1][0] for entry in sprite[-1]}
+                if Idea.NAME_KEY in fields and Idea.TEXTURE_FILE_KEY in fields:
+                    self.sprites[fields[Idea.NAME_KEY]] = fields[Idea.TEXTURE_FILE_KEY]
+
+    def load_loc_file(self, path):
+        for key, text in self.cache.load(path, self.LOC, parse_localisation).items():
+            if key.endswith(DESC_SUFF) and key[:-len(DESC_SUFF)] in self.ideas:
+                self.ideas[key[:-len(DESC_SUFF)]].set_dict({Idea.DESC: text})
+            elif key in self.ideas:
+                self.ideas[key].set_dict({Idea.FULL_NAME: text})
+
+    def set_sprites(self):
+        """
+        Sets the gfx fields of the ideas from the loaded sprites
+        """
+        for name, idea in self.ideas.items():
+            gfx_name = Idea.GFX_PREFIX + name
+            if gfx_name in self.sprites:
+                idea.set_dict({Idea.GFX_FNAME: self.sprites[gfx_name]})
+
+    def load(self, idea_files, gfx_files=(), loc_files=()):
+        """
+        Loads the files and returns a dict of the imported ideas by name.
+        Localisation is only assigned to ideas of the idea files.
+        """
+        for path in idea_files:
+            self.load_ideas_file(path)
+        for path in gfx_files:
+            self.load_gfx_file(path)
+        self.set_sprites()
+        for path in loc_files:
+            self.load_loc_file(path)
+        return self.ideas
+
+    def load_mod(self, mod_dir):
+        """
+        Loads all ideas of the mod directory mod_dir
+        """
+        get_files = lambda pattern: sorted(glob.glob(os.path.join(mod_dir, pattern), recursive=True))
+        return self.load(get_files(IDEAS_GLOB), get_files(GFX_GLOB), get_files(LOC_GLOB))
+
+########################
+# Tests                #
+########################
+
+class ImporterTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mod_dir = self.tmp.name
+        for sub_dir in ["common/ideas", "interface", "localisation/english"]:
+            os.makedirs(os.path.join(self.mod_dir, sub_dir))
+        self.ideas = []
+        for i in range(2):
+            idea = Idea(f'my_idea_{i}')
+            idea.set_dict({Idea.GFX_FNAME: f"gfx/interface/ideas/idea_{i}.dds",
+                           Idea.FULL_NAME: f"Idea {i}", Idea.DESC: f"Description {i}"})
+            idea.set_category_objs(Modifier, [Modifier({"Key": "stability_factor", "Value": "0.05"})])
+            idea.set_category_objs(Cancel, [Cancel({"Key": "has_war", "Relation": "=", "Value": "yes"})])
+            self.ideas += [idea]
+        Idea.write_paradox_file(self.ideas, "my_ideas.txt", path=os.path.join(self.mod_dir, "common/ideas"))
+        Idea.write_gfx_file(self.ideas, "my_ideas.gfx", path=os.path.join(self.mod_dir, "interface"))
+        Idea.write_localisation_file(self.ideas, "my_ideas_l_english.yml",
+                                     path=os.path.join(self.mod_dir, "localisation/english"))
+        self.cache_dir = os.path.join(self.mod_dir, "cache")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_localisation(self):
+        code = 'l_english:\n a:0 "A "quoted" name" a_desc:0 "Desc"\n b: "B" # comment\n'
+        self.assertEqual(parse_localisation(code), {"a": 'A "quoted" name', "a_desc": "Desc", "b": "B"})
+
+    def test_load_mod(self):
+        ideas = IdeaImporter(self.cache_dir).load_mod(self.mod_dir)
+        self.assertEqual(sorted(ideas), ["my_idea_0", "my_idea_1"])
+        for idea in self.ideas:
+            imported = ideas[idea.name]
+            for key in [Idea.GFX_FNAME, Idea.FULL_NAME, Idea.DESC]:
+                self.assertEqual(getattr(imported, key), getattr(idea, key))
+            self.assertEqual(imported.write_idea_paradox(), idea.write_idea_paradox())
+        # the equal rows of the ideas are shared
+        self.assertIs(ideas["my_idea_0"].category_objs[Modifier.get_name()][0],
+                      ideas["my_idea_1"].category_objs[Modifier.get_name()][0])
+
+    def test_cache(self):
+        importer = IdeaImporter(self.cache_dir)
+        importer.load_mod(self.mod_dir)
+        self.assertEqual((importer.cache.hits, importer.cache.misses), (0, 3))
+        importer = IdeaImporter(self.cache_dir)
+        importer.load_mod(self.mod_dir)
+        self.assertEqual((importer.cache.hits, importer.cache.misses), (3, 0))
+        # a changed file is parsed again
+        self.ideas[0].set_dict({Idea.FULL_NAME: "Renamed Idea"})
+        Idea.write_localisation_file(self.ideas, "my_ideas_l_english.yml",
+                                     path=os.path.join(self.mod_dir, "localisation/english"))
+        importer = IdeaImporter(self.cache_dir)
+        ideas = importer.load_mod(self.mod_dir)
+        self.assertEqual((importer.cache.hits, importer.cache.misses), (2, 1))
+        self.assertEqual(getattr(ideas["my_idea_0"], Idea.FULL_NAME), "Renamed Idea")
+        # the entries are JSON
+        cache_file = next(name for name in os.listdir(self.cache_dir) if name.endswith(".json"))
+        with open(os.path.join(self.cache_dir, cache_file), encoding='utf-8') as fp:
+            self.assertEqual(json.load(fp)[0][0], CACHE_VERSION)
+
+    def test_user_cache_dir(self):
+        with mock.patch.dict(os.environ, {CACHE_ENV: self.cache_dir}):
+            self.assertEqual(IdeaImporter().cache.cache_dir, os.path.join(self.cache_dir, "import"))
+        with mock.patch.dict(os.environ, {CACHE_ENV: "", "XDG_CACHE_HOME": self.mod_dir, "LOCALAPPDATA": self.mod_dir}):
+            self.assertEqual(get_user_cache_dir(), os.path.join(self.mod_dir, CACHE_NAME))
+
+    def test_dropped_keys(self):
+        path = os.path.join(self.mod_dir, "common/ideas/other_ideas.txt")
+        with open(path, 'w') as fp:
+            fp.write("ideas = {\n country = {\n  my_idea_9 = {\n   allowed = { always = no }\n"
+                     "   cost = 150\n   modifier = { stability_factor = 0.1 }\n  }\n }\n}\n")
+        importer = IdeaImporter(self.cache_dir)
+        with self.assertWarns(UserWarning):
+            ideas = importer.load([path])
+        self.assertEqual(importer.dropped, {"my_idea_9": ["allowed", "cost"]})
+        self.assertEqual(ideas["my_idea_9"].category_objs[Modifier.get_name()][0].get_values(),
+                         ("stability_factor", "0.1"))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Incremental output: a manifest next to the output files stores the
+content hash of each file and of each idea block inside it. A file is
+only rewritten if its content changed (or it was altered on disk).
+"""
+import unittest
+import os
+import json
+import hashlib
+import tempfile
+from . import output
+
+MANIFEST_NAME = ".hoi4sw_manifest.json"
+VERSION = 1
+
+
+def get_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class Manifest:
+    """
+    Content hashes of the output files in the directory path
+    """
+    def __init__(self, path=''):
+        self.path = path
+        self.files = {}
+        self.changed_ideas = {}
+        self.written = []
+        self.skipped = []
+        self.load()
+
+    def get_manifest_file(self):
+        return os.path.join(self.path, MANIFEST_NAME)
+
+    def load(self):
+        fname = self.get_manifest_file()
+        if not os.path.isfile(fname):
+            return
+        with open(fname) as fp:
+            data = json.load(fp)
+        if data.get("version") == VERSION:
+            self.files = data["files"]
+
+    def save(self):
+        """
+        Replaces the manifest atomically, an aborted save keeps the old one
+        """
+        code = json.dumps({"version": VERSION, "files": self.files}, indent=1, sort_keys=True)
+        output.write_atomic(code, self.get_manifest_file())
+
+    def get_key(self, outfile, path=''):
+        target = os.path.join(path, outfile)
+        return os.path.relpath(target, self.path or '.'), target
+
+    @staticmethod
+    def get_stat(target):
+        stat = os.stat(target)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def is_current(self, entry, target, code_hash):
+        """
+        Checks if target on disk still holds the code with code_hash
+        """
+        if entry is None or entry["hash"] != code_hash or not os.path.isfile(target):
+            return False
+        return entry["stat"] == self.get_stat(target)
+
+    def get_changed_ideas(self, entry, idea_hashes):
+        old_hashes = {} if entry is None else entry.get("ideas", {})
+        names = set(old_hashes) | set(idea_hashes)
+        return sorted(name for name in names if old_hashes.get(name) != idea_hashes.get(name))
+
+    def write_file(self, code, outfile, path='', blocks=None, write=None, get_size=None):
+        """
+        Writes code to outfile if it differs from the last build.
+        blocks are (idea name, code) pairs of the ideas in the file,
+        write(code, target) does the actual writing and may return the
+        file to stat instead of target, e.g. a temp file which is moved
+        onto target later, or None if it keeps no file on disk (e.g. an
+        output.MemorySink), then get_size(target) gives the written bytes.
+        Without blocks (the workers and native paths render the file without
+        blocks per idea) no changed ideas are reported and the idea hashes
+        of the file are dropped, so the build after it reports all ideas.
+        Returns True if the file was written.
+        """
+        key, target = self.get_key(outfile, path)
+        entry = self.files.get(key)
+        code_hash = get_hash(code)
+        idea_hashes = {} if blocks is None else {name: get_hash(block) for name, block in blocks}
+        if blocks is not None:
+            self.changed_ideas[key] = self.get_changed_ideas(entry, idea_hashes)
+        if self.is_current(entry, target, code_hash):
+            self.skipped += [key]
+            return False
+        if write is None:
+            output.write_atomic(code, target)
+            stat = self.get_stat(target)
+        else:
+            written = write(code, target)
+            # without a file on disk the file is never current
+            stat = self.get_stat(written) if written is not None else [get_size(target), None]
+        self.files[key] = {"hash": code_hash, "stat": stat, "ideas": idea_hashes}
+        self.written += [key]
+        return True
+
+    def get_report(self):
+        """
+        Returns a short text about written files and changed ideas
+        """
+        lines = []
+        for key in sorted(set(self.written) | set(self.skipped)):
+            state = "written" if key in self.written else "unchanged"
+            changed = self.changed_ideas.get(key)
+            lines += [f"{key}: {state}" + (f", changed ideas: {', '.join(changed)}" if changed else '')]
+        return '\n'.join(lines)
+
+########################
+# Tests                #
+########################
+
+class ManifestTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_skip_unchanged(self):
+        blocks = [("idea_a", "a = 1\n"), ("idea_b", "b = 2\n")]
+        code = ''.join(block for _, block in blocks)
+        manifest = Manifest(self.path)
+        self.assertTrue(manifest.write_file(code, "out.txt", path=self.path, blocks=blocks))
+        self.assertEqual(manifest.changed_ideas["out.txt"], ["idea_a", "idea_b"])
+        manifest.save()
+
+        manifest = Manifest(self.path)
+        self.assertFalse(manifest.write_file(code, "out.txt", path=self.path, blocks=blocks))
+        self.assertEqual(manifest.changed_ideas["out.txt"], [])
+
+        blocks = [("idea_a", "a = 1\n"), ("idea_c", "c = 3\n")]
+        code = ''.join(block for _, block in blocks)
+        self.assertTrue(manifest.write_file(code, "out.txt", path=self.path, blocks=blocks))
+        self.assertEqual(manifest.changed_ideas["out.txt"], ["idea_b", "idea_c"])
+        with open(os.path.join(self.path, "out.txt")) as fp:
+            self.assertEqual(fp.read(), code)
+
+    def test_rewrite_altered(self):
+        manifest = Manifest(self.path)
+        manifest.write_file("a = 1\n", "out.txt", path=self.path)
+        with open(os.path.join(self.path, "out.txt"), 'w') as fp:
+            fp.write("altered by hand\n")
+        self.assertTrue(manifest.write_file("a = 1\n", "out.txt", path=self.path))
+        self.assertIn("out.txt: written", manifest.get_report())
+
+    def test_save(self):
+        manifest = Manifest(self.path)
+        manifest.write_file("a = 1\n", "out.txt", path=self.path, blocks=[("idea_a", "a = 1\n")])
+        manifest.save()
+        self.assertEqual(sorted(os.listdir(self.path)), sorted([MANIFEST_NAME, "out.txt"]))
+        # without blocks no changed ideas are reported
+        manifest = Manifest(self.path)
+        self.assertTrue(manifest.write_file("a = 2\n", "out.txt", path=self.path))
+        self.assertEqual(manifest.get_report(), "out.txt: written")
+        self.assertEqual(manifest.files["out.txt"]["ideas"], {})
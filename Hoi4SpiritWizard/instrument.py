@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Opt-in instrumentation of builds: wall and cpu time per stage
+(the cpu time of the thread running it, files are written concurrently)
+(build_lists, serialize, write), idea and modifier counts, the
+bytes written per output file and gauges of other modules (e.g. the
+hit rate of the flyweight interning), taken by their collectors.
+
+Enabled by the environment variable HOI4SW_PROFILE=<report.json>
+(the report is written at exit) or by the --profile flag of the CLI.
+Hooks registered with add_hook receive every measurement, e.g. to
+forward them to a metrics collector:
+
+    add_hook(lambda kind, name, values: collector.send(kind, name, values))
+"""
+import unittest
+import os
+import json
+import time
+import atexit
+import tempfile
+import contextlib
+import threading
+
+ENV_VAR = "HOI4SW_PROFILE"
+
+# stages of a build
+BUILD_LISTS = "build_lists"
+SERIALIZE = "serialize"
+WRITE = "write"
+STREAM = "stream"
+
+# kinds of measurements passed to the hooks
+STAGE = "stage"
+COUNT = "count"
+FILE = "file"
+GAUGE = "gauge"
+
+HOOKS = []
+# functions adding gauges to a recorder when its report is made
+COLLECTORS = []
+RECORDER = None
+
+
+class Recorder:
+    """
+    Collects the measurements of a build, from several threads
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.files = {}
+        self.gauges = {}
+
+    @staticmethod
+    def notify(kind, name, values):
+        for hook in HOOKS:
+            hook(kind, name, values)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name, {"wall": time.perf_counter() - wall, "cpu": time.thread_time() - cpu})
+
+    def add_stage(self, name, values, calls=1):
+        """
+        Adds the wall and cpu time of calls runs of the stage name
+        """
+        with self.lock:
+            total = self.stages.setdefault(name, {"calls": 0, "wall": 0., "cpu": 0.})
+            total["calls"] += calls
+            total["wall"] += values["wall"]
+            total["cpu"] += values["cpu"]
+        self.notify(STAGE, name, values)
+
+    def count(self, name, number=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + number
+        self.notify(COUNT, name, {"count": number})
+
+    def add_file(self, path, nr_bytes):
+        with self.lock:
+            self.files[path] = self.files.get(path, 0) + nr_bytes
+        self.notify(FILE, path, {"bytes": nr_bytes})
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+        self.notify(GAUGE, name, {"value": value})
+
+    def get_report(self):
+        for collector in COLLECTORS:
+            collector(self)
+        return {"stages": self.stages, "counters": self.counters, "files": self.files,
+                "gauges": self.gauges}
+
+    def save(self, report_file):
+        with open(report_file, 'w') as fp:
+            json.dump(self.get_report(), fp, indent=1, sort_keys=True)
+
+
+class StageTimes:
+    """
+    Sums the times of stages run many times (e.g. once per idea) in
+    one thread, they are added to the recording at once by add
+    """
+    def __init__(self):
+        self.totals = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            total = self.totals.setdefault(name, [0, 0., 0.])
+            total[0] += 1
+            total[1] += time.perf_counter() - wall
+            total[2] += time.thread_time() - cpu
+
+    def add(self):
+        if RECORDER is None:
+            return
+        for name, (calls, wall, cpu) in self.totals.items():
+            RECORDER.add_stage(name, {"wall": wall, "cpu": cpu}, calls=calls)
+        self.totals = {}
+
+
+def enable():
+    """
+    Starts a new recording and returns its Recorder
+    """
+    global RECORDER
+    RECORDER = Recorder()
+    return RECORDER
+
+
+def disable():
+    """
+    Stops recording and returns the Recorder of the last recording
+    """
+    global RECORDER
+    recorder, RECORDER = RECORDER, None
+    return recorder
+
+
+def is_enabled():
+    return RECORDER is not None
+
+
+def get_recorder():
+    return RECORDER
+
+
+def add_hook(hook):
+    HOOKS.append(hook)
+
+
+def remove_hook(hook):
+    HOOKS.remove(hook)
+
+
+def add_collector(collector):
+    COLLECTORS.append(collector)
+
+
+def stage(name):
+    """
+    Context manager timing the stage name (does nothing if disabled)
+    """
+    if RECORDER is None:
+        return contextlib.nullcontext()
+    return RECORDER.stage(name)
+
+
+def count(name, number=1):
+    if RECORDER is not None:
+        RECORDER.count(name, number)
+
+
+def add_file(path, nr_bytes=None):
+    """
+    Records the size of the written file path
+    """
+    if RECORDER is not None:
+        RECORDER.add_file(path, os.path.getsize(path) if nr_bytes is None else nr_bytes)
+
+
+def enable_from_env():
+    report_file = os.environ.get(ENV_VAR)
+    if not report_file:
+        return
+    recorder = enable()
+    atexit.register(recorder.save, report_file)
+
+
+enable_from_env()
+
+########################
+# Tests                #
+########################
+
+class InstrumentTests(unittest.TestCase):
+    def tearDown(self):
+        disable()
+
+    def test_stage_times(self):
+        recorder = enable()
+        times = StageTimes()
+        for _ in range(3):
+            with times.stage(SERIALIZE):
+                pass
+        self.assertEqual(recorder.stages, {})
+        times.add()
+        self.assertEqual(recorder.stages[SERIALIZE]["calls"], 3)
+
+    def test_disabled(self):
+        disable()
+        with stage(SERIALIZE):
+            count("ideas")
+        self.assertFalse(is_enabled())
+
+    def test_build(self):
+        from .ideas import Idea, Modifier
+        events = []
+        hook = lambda kind, name, values: events.append((kind, name))
+        add_hook(hook)
+        recorder = enable()
+        idea = Idea("my_idea_1")
+        idea.set_dict({Idea.GFX_FNAME: "a.dds", Idea.FULL_NAME: "A", Idea.DESC: "B"})
+        idea.set_category_objs(Modifier, [Modifier({"Key": "stability_factor", "Value": "0.1"})])
+        with tempfile.TemporaryDirectory() as path:
+            Idea.write_gfx_file([idea], "out.gfx", path=path)
+            Idea.write_localisation_file([idea], "out.yml", path=path)
+            Idea.write_paradox_file([idea], "out.txt", path=path)
+            report_file = os.path.join(path, "report.json")
+            recorder.save(report_file)
+            with open(report_file) as fp:
+                report = json.load(fp)
+        remove_hook(hook)
+        self.assertEqual(set(report["stages"]), {BUILD_LISTS, SERIALIZE, WRITE})
+        self.assertEqual(report["stages"][WRITE]["calls"], 3)
+        self.assertEqual(report["counters"]["ideas"], 1)
+        self.assertEqual(report["counters"]["modifiers"], 1)
+        self.assertEqual(len(report["files"]), 3)
+        self.assertTrue(all(nr_bytes > 0 for nr_bytes in report["files"].values()))
+        self.assertIn((STAGE, WRITE), events)
+        self.assertIn((COUNT, "ideas"), events)
+
+    def test_threads(self):
+        recorder = enable()
+        def work():
+            for _ in range(1000):
+                with stage(WRITE):
+                    count("ideas")
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(recorder.counters["ideas"], 4000)
+        self.assertEqual(recorder.stages[WRITE]["calls"], 4000)
+        # a sleeping thread takes no cpu time
+        with stage(SERIALIZE):
+            time.sleep(0.05)
+        self.assertLess(recorder.stages[SERIALIZE]["cpu"], recorder.stages[SERIALIZE]["wall"])
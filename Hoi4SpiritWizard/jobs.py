@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Background jobs for the GUI. A job runs its steps on a worker thread and
+reports progress, completion and errors through a queue, which the GUI
+thread polls (e.g. with after()), so no tk call happens off the GUI thread.
+"""
+import unittest
+import os
+import queue
+import tempfile
+import threading
+from . import output
+
+PROGRESS = "progress"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+
+class Job(threading.Thread):
+    """
+    Runs the steps, a list of (label, function), one after another.
+    A cancel takes effect between two steps. With a sink (see output)
+    the steps write into, it is committed after the last step and
+    rolled back on an error or a cancel.
+    """
+    def __init__(self, steps, sink=None):
+        super().__init__(daemon=True)
+        self.steps = list(steps)
+        self.sink = sink
+        self.messages = queue.Queue()
+        self.cancelled = threading.Event()
+
+    def __len__(self):
+        return len(self.steps)
+
+    def run(self):
+        for nr, (label, func) in enumerate(self.steps):
+            if self.cancelled.is_set():
+                self.rollback()
+                self.messages.put((CANCELLED, nr, label))
+                return
+            try:
+                func()
+            except Exception as exc:
+                self.rollback()
+                self.messages.put((ERROR, nr, exc))
+                return
+            self.messages.put((PROGRESS, nr + 1, label))
+        if self.sink is not None:
+            try:
+                self.sink.commit()
+            except Exception as exc:
+                self.rollback()
+                self.messages.put((ERROR, len(self.steps), exc))
+                return
+        self.messages.put((DONE, len(self.steps), None))
+
+    def rollback(self):
+        if self.sink is not None:
+            self.sink.rollback()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def get_messages(self):
+        """
+        Returns the messages so far without blocking
+        """
+        messages = []
+        while True:
+            try:
+                messages += [self.messages.get_nowait()]
+            except queue.Empty:
+                return messages
+
+########################
+# Tests                #
+########################
+
+class JobTests(unittest.TestCase):
+    def test_done(self):
+        results = []
+        job = Job([("a", lambda: results.append(1)), ("b", lambda: results.append(2))])
+        job.start()
+        job.join()
+        self.assertEqual(results, [1, 2])
+        self.assertEqual(job.get_messages(), [(PROGRESS, 1, "a"), (PROGRESS, 2, "b"), (DONE, 2, None)])
+
+    def test_error(self):
+        def fail():
+            raise ValueError("broken")
+        job = Job([("a", fail), ("b", lambda: None)])
+        job.start()
+        job.join()
+        kind, nr, exc = job.get_messages()[-1]
+        self.assertEqual((kind, nr), (ERROR, 0))
+        self.assertIsInstance(exc, ValueError)
+
+    def test_cancel(self):
+        started, release = threading.Event(), threading.Event()
+        def block():
+            started.set()
+            release.wait(5)
+        job = Job([("a", block), ("b", lambda: None)])
+        job.start()
+        started.wait(5)
+        job.cancel()
+        release.set()
+        job.join()
+        self.assertEqual(job.get_messages(), [(PROGRESS, 1, "a"), (CANCELLED, 1, "b")])
+
+    def test_sink(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            def fail():
+                raise ValueError("broken")
+            for last, files in [(lambda: None, ["a.txt", "b.txt"]), (fail, [])]:
+                sink = output.DirectorySink(tmp)
+                job = Job([("a", lambda: sink.write("a", "a.txt")), ("b", lambda: sink.write("b", "b.txt")),
+                           ("c", last)], sink=sink)
+                job.start()
+                job.join()
+                # the files are replaced together after the last step, or not at all
+                self.assertEqual(sorted(os.listdir(tmp)), files)
+                for fname in files:
+                    os.remove(os.path.join(tmp, fname))
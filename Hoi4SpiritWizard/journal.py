@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Crash-safe autosave of a workspace. Changes are appended as JSON lines
+to a journal by a writer thread, which waits a short delay to merge
+repeated stores of the same idea. After COMPACT_EVERY records the state
+is written into a snapshot and the journal starts anew. load() replays
+the journal on top of the snapshot; a line cut off by a crash is skipped.
+"""
+import unittest
+import os
+import json
+import time
+import queue
+import tempfile
+import threading
+
+# journal operations
+STORE = "store"
+REMOVE = "remove"
+RENAME = "rename"
+PREFIX = "prefix"
+
+SNAPSHOT_SUFF = ".snapshot"
+ENCODING = "utf-8"
+
+
+def new_state():
+    return {"file_prefix": None, "ideas": {}}
+
+
+def apply(state, record):
+    """
+    Applies a journal record to the state, replaying a record twice does no harm
+    """
+    op, ideas = record["op"], state["ideas"]
+    if op == STORE:
+        ideas[record["name"]] = {"fields": record["fields"], "rows": record["rows"]}
+    elif op == REMOVE:
+        ideas.pop(record["name"], None)
+    elif op == RENAME:
+        if record["name"] in ideas and record["new"] not in ideas:
+            state["ideas"] = {record["new"] if key == record["name"] else key: val
+                              for key, val in ideas.items()}
+    elif op == PREFIX:
+        state["file_prefix"] = record["value"]
+    return state
+
+
+class Journal:
+    """
+    The journal file path and its snapshot path + SNAPSHOT_SUFF
+    """
+    DELAY = 0.5
+    COMPACT_EVERY = 500
+
+    def __init__(self, path, delay=DELAY, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.snapshot_path = path + SNAPSHOT_SUFF
+        self.delay = delay
+        self.compact_every = compact_every
+        self.records = queue.Queue()
+        self.state = None
+        self.nr_records = 0
+        self.writer = None
+
+    def load(self):
+        """
+        Returns the saved state and starts the writer thread
+        """
+        state = new_state()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding=ENCODING) as fp:
+                state = json.load(fp)
+        self.nr_records = 0
+        cut = False
+        if os.path.exists(self.path):
+            with open(self.path, encoding=ENCODING) as fp:
+                for line in fp:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # last line of a crash
+                        cut = True
+                        continue
+                    apply(state, record)
+                    self.nr_records += 1
+        self.state = state
+        if cut:
+            # new lines must not be appended to the cut one
+            self.compact()
+        self.start()
+        return json.loads(json.dumps(state))
+
+    def start(self):
+        if self.writer is None:
+            if self.state is None:
+                self.state = new_state()
+            self.writer = threading.Thread(target=self.write_loop, daemon=True)
+            self.writer.start()
+
+    def record(self, op, **kwargs):
+        """
+        Queues a record, the caller never waits for the disk
+        """
+        self.start()
+        self.records.put(dict(op=op, **kwargs))
+
+    def store(self, name, fields, rows):
+        self.record(STORE, name=name, fields=fields, rows=rows)
+
+    def remove(self, name):
+        self.record(REMOVE, name=name)
+
+    def rename(self, name, new_name):
+        self.record(RENAME, name=name, new=new_name)
+
+    def set_prefix(self, file_prefix):
+        self.record(PREFIX, value=file_prefix)
+
+    def get_batch(self):
+        """
+        Waits for a record and collects the following ones until delay
+        seconds after it, so steady edits are still written regularly.
+        A store replaces an older store of the same idea in the batch.
+        """
+        batch = [self.records.get()]
+        deadline = time.monotonic() + self.delay
+        while batch[-1] is not None:
+            try:
+                batch += [self.records.get(timeout=max(deadline - time.monotonic(), 0))]
+            except queue.Empty:
+                break
+        self.nr_taken = len(batch)
+        stop = batch[-1] is None
+        merged = []
+        # names stored later on, without a rename in between
+        stored = set()
+        for record in reversed(batch):
+            if record is None:
+                continue
+            if record["op"] == STORE:
+                if record["name"] in stored:
+                    continue
+                stored.add(record["name"])
+            elif record["op"] == RENAME:
+                stored.discard(record["name"])
+                stored.discard(record["new"])
+            merged += [record]
+        return merged[::-1], stop
+
+    def write_loop(self):
+        while True:
+            batch, stop = self.get_batch()
+            if len(batch) > 0:
+                self.append(batch)
+            if stop or self.nr_records >= self.compact_every:
+                self.compact()
+            for _ in range(self.nr_taken):
+                self.records.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """
+        Waits until the queued records are written
+        """
+        if self.writer is not None:
+            self.records.join()
+
+    def append(self, batch):
+        lines = ''.join(json.dumps(record) + '\n' for record in batch)
+        with open(self.path, 'a', encoding=ENCODING) as fp:
+            fp.write(lines)
+            fp.flush()
+            os.fsync(fp.fileno())
+        for record in batch:
+            apply(self.state, record)
+        self.nr_records += len(batch)
+
+    def compact(self):
+        """
+        Writes the state into the snapshot and empties the journal
+        """
+        folder = os.path.dirname(os.path.abspath(self.snapshot_path))
+        with tempfile.NamedTemporaryFile('w', encoding=ENCODING, dir=folder, delete=False) as fp:
+            json.dump(self.state, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(fp.name, self.snapshot_path)
+        # a crash before this point replays the journal once more, which does no harm
+        open(self.path, 'w').close()
+        self.nr_records = 0
+
+    def close(self):
+        """
+        Writes the queued records and the snapshot and stops the writer thread
+        """
+        if self.writer is None:
+            return
+        self.records.put(None)
+        self.writer.join()
+        self.writer = None
+
+    def clear(self):
+        self.close()
+        for path in (self.path, self.snapshot_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.state = None
+
+########################
+# Tests                #
+########################
+
+class JournalTests(unittest.TestCase):
+    ROWS = {"modifier": [{"Key": "stability_factor", "Value": "0.1"}]}
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "journal")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_replay(self):
+        journal = Journal(self.path, delay=0.01)
+        self.assertEqual(journal.load(), new_state())
+        journal.set_prefix("my_ideas")
+        for nr in range(3):
+            journal.store("idea_a", {"FullName": f"A{nr}"}, self.ROWS)
+        journal.store("idea_b", {"FullName": "B"}, {})
+        journal.rename("idea_b", "idea_c")
+        journal.store("idea_b", {"FullName": "B2"}, {})
+        journal.store("idea_d", {}, {})
+        journal.remove("idea_d")
+        journal.flush()
+        # no close: the state has to come from the journal lines
+        state = Journal(self.path).load()
+        self.assertEqual(state["file_prefix"], "my_ideas")
+        self.assertEqual(list(state["ideas"]), ["idea_a", "idea_c", "idea_b"])
+        self.assertEqual(state["ideas"]["idea_c"]["fields"], {"FullName": "B"})
+        self.assertEqual(state["ideas"]["idea_a"], {"fields": {"FullName": "A2"}, "rows": self.ROWS})
+        journal.close()
+
+    def test_compact(self):
+        journal = Journal(self.path, delay=0.001, compact_every=2)
+        journal.load()
+        for nr in range(5):
+            journal.store(f"idea_{nr}", {}, {})
+        journal.close()
+        self.assertTrue(os.path.exists(self.path + SNAPSHOT_SUFF))
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.assertEqual(len(Journal(self.path).load()["ideas"]), 5)
+
+    def test_batch_deadline(self):
+        journal = Journal(self.path, delay=0.05)
+        stop = threading.Event()
+        def edit():
+            while not stop.is_set():
+                journal.records.put({"op": STORE, "name": "idea_a", "fields": {}, "rows": {}})
+                time.sleep(0.005)
+        editor = threading.Thread(target=edit)
+        editor.start()
+        try:
+            start = time.monotonic()
+            batch, _ = journal.get_batch()
+            elapsed = time.monotonic() - start
+        finally:
+            stop.set()
+            editor.join()
+        # steady edits do not hold the batch back
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(len(batch), 1)
+
+    def test_cut_line(self):
+        with open(self.path, 'w') as fp:
+            fp.write(json.dumps({"op": STORE, "name": "idea_a", "fields": {}, "rows": {}}) + '\n')
+            fp.write('{"op": "store", "na')
+        journal = Journal(self.path)
+        self.assertEqual(list(journal.load()["ideas"]), ["idea_a"])
+        journal.close()
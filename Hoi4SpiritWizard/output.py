@@ -0,0 +1,513 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Output sinks: where the code of the output files goes. Every sink has
+open(target) for a text file and write(code, target), and is a context
+manager committing the files at its end:
+
+  - Transaction writes every file into a temp file in the directory of
+    the target and only replaces the targets with os.replace when all of
+    them are written, so a crash leaves either the old or the new files,
+    never a truncated one,
+  - DirectorySink is a Transaction for targets relative to a directory,
+  - MemorySink keeps the encoded files in a dict (tests, benchmarks),
+  - ZipSink writes the files as entries of a zip archive, e.g. the
+    release package of a mod, without files on disk.
+"""
+import unittest
+import io
+import os
+import zipfile
+import shutil
+import posixpath
+import tempfile
+import threading
+
+DEFAULT_ENCODING = "utf-8"
+# the game expects the localisation with a BOM
+ENCODINGS = {".yml": "utf-8-sig"}
+BUFFER_SIZE = 1 << 20
+TMP_SUFF = ".tmp"
+ABSOLUTE_ERROR_MSG = "Error: {} is not a path inside the archive!"
+DUPLICATE_ERROR_MSG = "Error: {} is already in the archive!"
+# entries written while another one is open are kept in memory up to this size
+SPOOL_SIZE = 1 << 20
+FILE_MODE = 0o666
+# the umask of the process, read once by get_umask
+UMASK = None
+UMASK_LOCK = threading.Lock()
+
+
+def get_encoding(target):
+    return ENCODINGS.get(os.path.splitext(target)[1], DEFAULT_ENCODING)
+
+
+def get_umask():
+    """
+    The umask of the process. Linux shows it in /proc, elsewhere it can
+    only be read by setting it, which is done once under a lock.
+    """
+    global UMASK
+    with UMASK_LOCK:
+        if UMASK is None:
+            try:
+                with open("/proc/self/status") as fp:
+                    UMASK = next(int(line.split()[1], 8) for line in fp if line.startswith("Umask:"))
+            except (OSError, StopIteration, ValueError, IndexError):
+                UMASK = os.umask(0o077)
+                os.umask(UMASK)
+        return UMASK
+
+
+def sync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Entry(io.StringIO):
+    """
+    A text buffer handing its text to store(text) when it is closed
+    """
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+
+    def close(self):
+        if not self.closed:
+            self.store(self.getvalue())
+        super().close()
+
+
+class ZipEntry(io.TextIOWrapper):
+    """
+    A text file writing into the binary file buffer, which is handed to
+    store(buffer) when the text file is closed (store closes it)
+    """
+    def __init__(self, buffer, encoding, store):
+        super().__init__(buffer, encoding=encoding, newline='')
+        self.store = store
+        self.stored = False
+
+    @property
+    def closed(self):
+        return self.stored or super().closed
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.stored = True
+            self.store(self.buffer)
+
+
+class Sink:
+    """
+    Base class of the output sinks. Used as context manager a sink
+    commits at the end and drops the written files on an error.
+    Files may be written from several threads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def open(self, target, encoding=None):
+        """
+        Returns a text file for target, stored when it is closed
+        """
+        raise NotImplementedError
+
+    def write(self, code, target):
+        """
+        Writes code to target and returns the file on disk holding
+        it (None if the sink keeps no file)
+        """
+        with self.open(target) as fp:
+            fp.write(code)
+        return None
+
+    def get_size(self, target):
+        """
+        The number of bytes written to target
+        """
+        raise NotImplementedError
+
+    def read(self, target):
+        """
+        The bytes written to target, before they are committed
+        """
+        raise NotImplementedError
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class Transaction(Sink):
+    """
+    Collects temp files and moves them onto their targets on commit
+    """
+    def __init__(self):
+        super().__init__()
+        self.staged = []
+
+    def get_path(self, target):
+        return target
+
+    def stage(self, target):
+        """
+        Returns a new temp file for target
+        """
+        folder, fname = os.path.split(os.path.abspath(self.get_path(target)))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix="." + fname + ".", suffix=TMP_SUFF)
+        os.close(fd)
+        # temp files are private, the targets get the usual mode
+        os.chmod(tmp, FILE_MODE & ~get_umask())
+        with self.lock:
+            self.staged += [(tmp, self.get_path(target))]
+        return tmp
+
+    def open(self, target, encoding=None):
+        """
+        Opens the temp file of target for writing text
+        """
+        return open(self.stage(target), 'w', encoding=encoding or get_encoding(target),
+                    buffering=BUFFER_SIZE)
+
+    def write(self, code, target):
+        """
+        Writes code into the temp file of target and returns the temp file
+        """
+        with self.open(target) as fp:
+            fp.write(code)
+            return fp.name
+
+    def get_staged(self, target):
+        """
+        The last temp file of target
+        """
+        path = self.get_path(target)
+        with self.lock:
+            return [tmp for tmp, staged in self.staged if staged == path][-1]
+
+    def get_size(self, target):
+        return os.path.getsize(self.get_staged(target))
+
+    def read(self, target):
+        with open(self.get_staged(target), 'rb') as fp:
+            return fp.read()
+
+    def commit(self):
+        with self.lock:
+            staged, self.staged = self.staged, []
+        for tmp, _ in staged:
+            sync(tmp)
+        for tmp, target in staged:
+            os.replace(tmp, target)
+
+    def rollback(self):
+        with self.lock:
+            staged, self.staged = self.staged, []
+        for tmp, _ in staged:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+class DirectorySink(Transaction):
+    """
+    A Transaction for targets relative to the directory root
+    """
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+
+    def get_path(self, target):
+        return os.path.join(self.root, target)
+
+
+class MemorySink(Sink):
+    """
+    Keeps the encoded files by target, committed files are in files
+    """
+    def __init__(self):
+        super().__init__()
+        self.files = {}
+        self.staged = {}
+
+    def open(self, target, encoding=None):
+        encoding = encoding or get_encoding(target)
+        def store(text):
+            with self.lock:
+                self.staged[target] = text.encode(encoding)
+        return Entry(store)
+
+    def get_size(self, target):
+        return len(self.read(target))
+
+    def read(self, target):
+        with self.lock:
+            return self.staged[target] if target in self.staged else self.files[target]
+
+    def get_text(self, target):
+        """
+        The decoded text of a committed file
+        """
+        return self.files[target].decode(get_encoding(target))
+
+    def commit(self):
+        with self.lock:
+            self.files.update(self.staged)
+            self.staged = {}
+
+    def rollback(self):
+        with self.lock:
+            self.staged = {}
+
+
+class ZipSink(Sink):
+    """
+    Writes the files as entries of the zip archive archive (a file name
+    or a binary file object), the targets are the paths in the archive.
+    An archive file replaces the old one on commit, like a Transaction.
+    A file is compressed into the archive while it is written. A zip
+    archive takes one entry at a time, files opened while another one
+    is open are spooled into temp files and added after it is closed.
+    """
+    def __init__(self, archive, compression=zipfile.ZIP_DEFLATED):
+        super().__init__()
+        self.archive = archive
+        self.transaction = None
+        if isinstance(archive, (str, os.PathLike)):
+            self.transaction = Transaction()
+            archive = self.transaction.stage(archive)
+        self.zip_file = zipfile.ZipFile(archive, 'w', compression=compression)
+        # the file written into the archive, the spooled files by name
+        self.current = None
+        self.spooled = {}
+        self.names = set()
+
+    @staticmethod
+    def get_name(target):
+        name = posixpath.normpath(target.replace(os.sep, '/'))
+        if os.path.isabs(target) or name == '..' or name.startswith('../'):
+            raise ValueError(ABSOLUTE_ERROR_MSG.format(target))
+        return name
+
+    def open(self, target, encoding=None):
+        name = self.get_name(target)
+        encoding = encoding or get_encoding(target)
+        with self.lock:
+            if name in self.names:
+                raise ValueError(DUPLICATE_ERROR_MSG.format(name))
+            self.names.add(name)
+            if self.current is None:
+                self.current = ZipEntry(self.zip_file.open(name, 'w'), encoding, self.close_current)
+                return self.current
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        return ZipEntry(spool, encoding, lambda buffer: self.close_spooled(name, buffer))
+
+    def close_current(self, buffer):
+        with self.lock:
+            buffer.close()
+            self.current = None
+            self.add_spooled()
+
+    def close_spooled(self, name, buffer):
+        with self.lock:
+            self.spooled[name] = buffer
+            if self.current is None:
+                self.add_spooled()
+
+    def add_spooled(self):
+        """
+        Copies the closed spooled files into the archive (under the lock)
+        """
+        for name, spool in self.spooled.items():
+            spool.seek(0)
+            with self.zip_file.open(name, 'w') as fp:
+                shutil.copyfileobj(spool, fp)
+            spool.close()
+        self.spooled = {}
+
+    def get_size(self, target):
+        name = self.get_name(target)
+        with self.lock:
+            if name in self.spooled:
+                return self.spooled[name].seek(0, os.SEEK_END)
+            return self.zip_file.getinfo(name).file_size
+
+    def read(self, target):
+        name = self.get_name(target)
+        with self.lock:
+            if name in self.spooled:
+                self.spooled[name].seek(0)
+                return self.spooled[name].read()
+            return self.zip_file.read(name)
+
+    def get_names(self):
+        with self.lock:
+            return self.zip_file.namelist()
+
+    def close(self):
+        """
+        Closes the archive, files still open are dropped
+        """
+        with self.lock:
+            current, self.current = self.current, None
+            if current is not None:
+                current.stored = True
+                current.buffer.close()
+            for spool in self.spooled.values():
+                spool.close()
+            self.spooled = {}
+        self.zip_file.close()
+
+    def commit(self):
+        with self.lock:
+            self.add_spooled()
+        self.close()
+        if self.transaction is not None:
+            self.transaction.commit()
+
+    def rollback(self):
+        self.close()
+        if self.transaction is not None:
+            self.transaction.rollback()
+
+
+def write_atomic(code, target):
+    with Transaction() as transaction:
+        transaction.write(code, target)
+
+########################
+# Tests                #
+########################
+
+class OutputTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_encoding(self):
+        write_atomic("l_english:\n a:0 \"Ä\"\n", os.path.join(self.path, "a.yml"))
+        write_atomic("a = \"Ä\"\n", os.path.join(self.path, "a.txt"))
+        with open(os.path.join(self.path, "a.yml"), 'rb') as fp:
+            self.assertTrue(fp.read().startswith(b'\xef\xbb\xbfl_english'))
+        with open(os.path.join(self.path, "a.txt"), 'rb') as fp:
+            self.assertEqual(fp.read(), "a = \"Ä\"\n".encode("utf-8"))
+
+    def test_umask(self):
+        umask = os.umask(0o027)
+        os.umask(umask)
+        self.assertEqual(get_umask(), umask)
+
+    @unittest.skipIf(os.name != "posix", "file modes are posix")
+    def test_mode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "a.txt")
+            write_atomic("a", target)
+            self.assertEqual(os.stat(target).st_mode & 0o777, FILE_MODE & ~get_umask())
+
+    def test_all_or_nothing(self):
+        targets = [os.path.join(self.path, fname) for fname in ["a.gfx", "a.txt"]]
+        for target in targets:
+            write_atomic("old", target)
+        with self.assertRaises(ValueError):
+            with Transaction() as transaction:
+                transaction.write("new", targets[0])
+                raise ValueError("render failed")
+        for target in targets:
+            with open(target) as fp:
+                self.assertEqual(fp.read(), "old")
+        self.assertEqual(sorted(os.listdir(self.path)), ["a.gfx", "a.txt"])
+        with Transaction() as transaction:
+            for target in targets:
+                transaction.write("new", target)
+            self.assertEqual(len(os.listdir(self.path)), 4)
+        for target in targets:
+            with open(target) as fp:
+                self.assertEqual(fp.read(), "new")
+
+    def test_directory_sink(self):
+        with DirectorySink(self.path) as sink:
+            sink.write("a = 1\n", os.path.join("common", "ideas", "a.txt"))
+            self.assertEqual(sink.get_size(os.path.join("common", "ideas", "a.txt")), 6)
+            self.assertEqual(sink.read(os.path.join("common", "ideas", "a.txt")), b"a = 1\n")
+            self.assertFalse(os.path.exists(os.path.join(self.path, "common", "ideas", "a.txt")))
+        with open(os.path.join(self.path, "common", "ideas", "a.txt")) as fp:
+            self.assertEqual(fp.read(), "a = 1\n")
+
+    def test_memory_sink(self):
+        sink = MemorySink()
+        with sink:
+            with sink.open("a.yml") as fp:
+                fp.write("l_english:\n")
+            sink.write("a = 1\n", "a.txt")
+        self.assertEqual(sink.files, {"a.yml": b"\xef\xbb\xbfl_english:\n", "a.txt": b"a = 1\n"})
+        self.assertEqual(sink.get_text("a.yml"), "l_english:\n")
+        self.assertEqual(sink.get_size("a.txt"), 6)
+        with self.assertRaises(ValueError):
+            with sink:
+                sink.write("b = 1\n", "b.txt")
+                raise ValueError("render failed")
+        self.assertEqual(sorted(sink.files), ["a.txt", "a.yml"])
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_zip_sink(self):
+        archive = os.path.join(self.path, "mod.zip")
+        with ZipSink(archive) as sink:
+            # several files may be open at once
+            with sink.open(os.path.join("common", "a.txt")) as fp, sink.open("a.yml") as loc_fp:
+                fp.write("a = 1\n")
+                loc_fp.write("l_english:\n")
+            self.assertEqual(sink.get_size("a.yml"), 14)
+            self.assertEqual(sink.read(os.path.join("common", "a.txt")), b"a = 1\n")
+            self.assertFalse(os.path.exists(archive))
+            self.assertRaises(ValueError, sink.write, "a", os.path.join("..", "a.txt"))
+        with zipfile.ZipFile(archive) as zip_file:
+            self.assertEqual(sorted(zip_file.namelist()), ["a.yml", "common/a.txt"])
+            self.assertEqual(zip_file.read("common/a.txt"), b"a = 1\n")
+        with self.assertRaises(ValueError):
+            with ZipSink(archive) as sink:
+                sink.write("b = 1\n", "b.txt")
+                raise ValueError("render failed")
+        with zipfile.ZipFile(archive) as zip_file:
+            self.assertEqual(sorted(zip_file.namelist()), ["a.yml", "common/a.txt"])
+        self.assertEqual(os.listdir(self.path), ["mod.zip"])
+
+    def test_zip_streaming(self):
+        archive = io.BytesIO()
+        with ZipSink(archive) as sink:
+            with sink.open("a.txt") as fp, sink.open("b.txt") as other_fp, sink.open("c.yml") as loc_fp:
+                # the first file goes straight into the archive, the others are spooled
+                self.assertIs(sink.current, fp)
+                for nr in range(1000):
+                    for out_fp in (fp, other_fp, loc_fp):
+                        out_fp.write(f"a = {nr}\n")
+                other_fp.close()
+                self.assertEqual(sink.get_size("b.txt"), len(sink.read("b.txt")))
+                self.assertRaises(ValueError, sink.open, "b.txt")
+            self.assertIsNone(sink.current)
+            self.assertEqual(sink.spooled, {})
+            self.assertRaises(ValueError, sink.write, "a = 1\n", "a.txt")
+        code = ''.join(f"a = {nr}\n" for nr in range(1000))
+        with zipfile.ZipFile(archive) as zip_file:
+            self.assertEqual(zip_file.namelist(), ["a.txt", "b.txt", "c.yml"])
+            self.assertEqual(zip_file.read("b.txt").decode(), code)
+            self.assertEqual(zip_file.read("c.yml").decode("utf-8-sig"), code)
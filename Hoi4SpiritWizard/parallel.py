@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Parallel rendering of large idea lists. The idea list is split into
+shards of consecutive ideas. The workers get the plain fields and rows
+of their shard (no Idea objects with their caches), render the shard
+with one list2paradox call and the shards are joined in the original
+order into the file frame.
+"""
+import unittest
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from Hoi4Converter.converter import list2paradox
+from .ideas import Idea, Modifier, Cancel
+from . import output
+
+GFX = "gfx"
+PARADOX = "paradox"
+# shards per worker, more shards balance the load better
+SHARDS_PER_WORKER = 4
+
+
+
+def get_kind(kind):
+    """
+    Returns wrap and frame function of a kind of file
+    """
+    if kind == GFX:
+        return Idea.wrap_gfx, Idea.gfx_frame
+    if kind == PARADOX:
+        return Idea.wrap_paradox, Idea.paradox_frame
+    raise ValueError(f"Error: unknown kind {kind}!")
+
+
+def get_item(kind, idea):
+    """
+    The plain fields (gfx) or rows (ideas) of idea sent to the workers
+    """
+    if kind == GFX:
+        return idea.get_gfx_fields()
+    return idea.name, list(idea.get_category_rows())
+
+
+def render_shard(kind, items):
+    """
+    Renders the code of the ideas of a shard from their items
+    (run inside the workers)
+    """
+    wrap, frame = get_kind(kind)
+    obj = []
+    for item in items:
+        obj += Idea.fields2gfx(*item) if kind == GFX else Idea.rows2paradox(*item)
+    return Idea.get_block(wrap, obj, frame())
+
+
+def get_shards(idea_list, nr_shards):
+    size = -(-len(idea_list) // nr_shards)
+    return [idea_list[i:i + size] for i in range(0, len(idea_list), size)]
+
+
+def get_workers(workers=None):
+    if workers is None:
+        return os.cpu_count() or 1
+    return workers
+
+
+def render_code(idea_list, kind, workers=None):
+    """
+    Renders the code of the gfx or ideas file of idea_list with a
+    pool of workers processes (default: number of cpus).
+    """
+    wrap, frame = get_kind(kind)
+    items = [get_item(kind, idea) for idea in idea_list]
+    if len(items) == 0:
+        return list2paradox(wrap([]))
+    workers = get_workers(workers)
+    shards = get_shards(items, workers*SHARDS_PER_WORKER)
+    head, tail = frame()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        blocks = executor.map(render_shard, [kind]*len(shards), shards)
+        return head + ''.join(blocks) + tail
+
+########################
+# Tests                #
+########################
+
+class ParallelTests(unittest.TestCase):
+    NR_IDEAS = 25
+    def setUp(self):
+        self.ideas = []
+        for i in range(self.NR_IDEAS):
+            idea = Idea(f'my_idea_{i}')
+            idea.set_dict({Idea.GFX_FNAME: f"gfx/interface/ideas/idea_{i}.dds"})
+            idea.set_category_objs(Modifier, [Modifier({"Key": "stability_factor", "Value": str(i)})])
+            idea.set_category_objs(Cancel, [Cancel({"Key": "has_war", "Relation": "=", "Value": "yes"})])
+            self.ideas += [idea]
+
+    def test_get_shards(self):
+        shards = get_shards(list(range(10)), 4)
+        self.assertEqual(sum(shards, []), list(range(10)))
+        self.assertEqual(len(shards), 4)
+
+    def test_render_shard(self):
+        for kind, write in [(GFX, Idea.write_gfx_file), (PARADOX, Idea.write_paradox_file)]:
+            items = [get_item(kind, idea) for idea in self.ideas[:3]]
+            # only plain data goes to the workers
+            self.assertNotIn("Idea object", repr(items))
+            obj = write(self.ideas[:3], "parallel_test", sink=output.MemorySink())
+            head, tail = get_kind(kind)[1]()
+            self.assertEqual(head + render_shard(kind, items) + tail, list2paradox(obj))
+
+    def test_render_gfx(self):
+        code = render_code(self.ideas, GFX, workers=2)
+        obj = Idea.write_gfx_file(self.ideas, "parallel_test.gfx", sink=output.MemorySink())
+        self.assertEqual(code, list2paradox(obj))
+
+    def test_render_paradox(self):
+        code = render_code(self.ideas, PARADOX, workers=2)
+        obj = Idea.write_paradox_file(self.ideas, "parallel_test.txt", sink=output.MemorySink())
+        self.assertEqual(code, list2paradox(obj))
+
+    def test_write_parallel(self):
+        fname = "parallel_test.txt"
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(Idea.write_paradox_file(self.ideas, fname, path=tmp, workers=2))
+            with open(os.path.join(tmp, fname), encoding=output.get_encoding(fname)) as fp:
+                self.assertEqual(fp.read(), render_code(self.ideas, PARADOX, workers=1))
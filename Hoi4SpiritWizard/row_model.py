@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The rows of entries of a category in the GUI, kept apart from the
+widgets (see rows_view) so they can be used and tested without tkinter.
+"""
+import unittest
+import os
+import sys
+import subprocess
+
+
+class RowModel:
+    """
+    The rows of a category as dicts of the field texts
+    """
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def append(self, row=None):
+        new_row = {key: '' for key in self.fields}
+        if row is not None:
+            new_row.update({key: row[key] for key in self.fields if key in row})
+        self.rows.append(new_row)
+        return len(self.rows) - 1
+
+    def pop(self):
+        return self.rows.pop()
+
+    def get(self, index, key):
+        return self.rows[index][key]
+
+    def set(self, index, key, val):
+        self.rows[index][key] = val
+
+    def get_rows(self):
+        return [dict(row) for row in self.rows]
+
+    def set_rows(self, rows):
+        self.rows = []
+        for row in rows:
+            self.append(row)
+
+########################
+# Tests                #
+########################
+
+class RowModelTests(unittest.TestCase):
+    def test_rows(self):
+        model = RowModel(["Key", "Relation", "Value"])
+        self.assertEqual(model.append(), 0)
+        self.assertEqual(model.append({"Key": "has_war", "Value": "yes", "Other": "x"}), 1)
+        model.set(0, "Key", "num_of_factories")
+        self.assertEqual(model.get_rows(), [{"Key": "num_of_factories", "Relation": '', "Value": ''},
+                                            {"Key": "has_war", "Relation": '', "Value": "yes"}])
+        self.assertEqual(model.pop()["Key"], "has_war")
+        self.assertEqual(len(model), 1)
+        model.set_rows([{"Key": "a"}, {"Key": "b"}])
+        self.assertEqual([row["Key"] for row in model.get_rows()], ["a", "b"])
+
+    def test_no_tkinter(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = f"import sys; import {__package__}.row_model; sys.exit('tkinter' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], cwd=root)
+        self.assertEqual(result.returncode, 0)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Virtualized, scrollable rows of entries for the categories of the GUI.
+The rows are kept in a RowModel (see row_model), only a fixed pool of
+entry widgets for the visible rows exists. Adding or removing a row
+changes the model and the scrollbar, the number of widgets stays the same.
+"""
+import tkinter as tk
+from .row_model import RowModel
+
+
+class CompletionPopup:
+    """
+    A list of completions below an entry: Up/Down select,
+    Return or a click takes the selected one, Escape closes it.
+    """
+    HEIGHT = 8
+    KEYS = ("Up", "Down", "Return", "Escape")
+
+    def __init__(self, master):
+        self.window = None
+        self.master = master
+        self.target = None
+
+    def show(self, entry, var, options):
+        if self.window is None:
+            self.window = tk.Toplevel(self.master)
+            self.window.overrideredirect(True)
+            self.listbox = tk.Listbox(self.window, height=self.HEIGHT, exportselection=False)
+            self.listbox.pack()
+            self.listbox.bind("<ButtonRelease-1>", lambda event: self.accept())
+        self.target = (entry, var)
+        self.listbox.delete(0, tk.END)
+        for option in options:
+            self.listbox.insert(tk.END, option)
+        self.listbox.config(height=min(len(options), self.HEIGHT))
+        self.listbox.selection_set(0)
+        self.window.geometry(f"+{entry.winfo_rootx()}+{entry.winfo_rooty() + entry.winfo_height()}")
+        self.window.deiconify()
+        self.window.lift()
+
+    def hide(self):
+        if self.window is not None:
+            self.window.withdraw()
+        self.target = None
+
+    def is_shown(self):
+        return self.target is not None
+
+    def move(self, step):
+        selection = self.listbox.curselection()
+        pos = min(max((selection[0] if selection else -1) + step, 0), self.listbox.size() - 1)
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(pos)
+        self.listbox.see(pos)
+
+    def accept(self):
+        selection = self.listbox.curselection()
+        if self.target is not None and selection:
+            entry, var = self.target
+            var.set(self.listbox.get(selection[0]))
+            entry.icursor(tk.END)
+        self.hide()
+
+    def on_key(self, event):
+        """
+        Handles the navigation keys, returns True if the key was one
+        """
+        if not self.is_shown() or event.keysym not in self.KEYS:
+            return False
+        if event.keysym in ("Up", "Down"):
+            self.move(-1 if event.keysym == "Up" else 1)
+        elif event.keysym == "Return":
+            self.accept()
+        else:
+            self.hide()
+        return True
+
+
+class RowsView(tk.Frame):
+    """
+    Shows the rows of a RowModel in a pool of visible_rows entry rows
+    with a scrollbar. completers map a field to a function returning
+    the completions of a prefix, e.g. Catalogue.complete.
+    """
+    VISIBLE_ROWS = 5
+    WIDTHS = {"Relation": 2}
+    WIDTH = 20
+
+    def __init__(self, master, fields, visible_rows=VISIBLE_ROWS, completers=None, **options):
+        super().__init__(master, **options)
+        self.model = RowModel(fields)
+        self.visible_rows = visible_rows
+        self.offset = 0
+        self.loading = False
+        # callbacks on edits: func(index, key, val)
+        self.listeners = []
+        self.completers = {} if completers is None else completers
+        self.popup = CompletionPopup(self)
+        self.pool = []
+        for col, key in enumerate(fields):
+            tk.Label(self, text=key, anchor="center").grid(row=0, column=col)
+        for pos in range(visible_rows):
+            entries = {}
+            for col, key in enumerate(fields):
+                var = tk.StringVar(self)
+                entry = tk.Entry(self, textvariable=var, width=self.WIDTHS.get(key, self.WIDTH))
+                entry.grid(row=pos + 1, column=col)
+                var.trace_add("write", lambda *_, pos=pos, key=key: self.on_edit(pos, key))
+                self.bind_wheel(entry)
+                if key in self.completers:
+                    entry.bind("<KeyRelease>", lambda event, pos=pos, key=key: self.complete(event, pos, key))
+                    entry.bind("<FocusOut>", lambda event: self.after(100, self.popup.hide))
+                entries[key] = (entry, var)
+            self.pool += [entries]
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.grid(row=1, column=len(fields), rowspan=visible_rows, sticky="ns")
+        self.bind_wheel(self)
+        self.refresh()
+
+    def bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        widget.bind("<Button-4>", lambda event: self.scroll(-1))
+        widget.bind("<Button-5>", lambda event: self.scroll(1))
+
+    def __len__(self):
+        return len(self.model)
+
+    def get_max_offset(self):
+        return max(len(self.model) - self.visible_rows, 0)
+
+    def scroll_to(self, offset):
+        offset = min(max(int(offset), 0), self.get_max_offset())
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+        else:
+            self.set_scrollbar()
+
+    def scroll(self, units):
+        self.scroll_to(self.offset + units)
+
+    def yview(self, *args):
+        """
+        Scrollbar command
+        """
+        if args[0] == tk.MOVETO:
+            self.scroll_to(round(float(args[1])*len(self.model)))
+        elif args[0] == tk.SCROLL:
+            step = self.visible_rows if args[2] == tk.PAGES else 1
+            self.scroll(int(args[1])*step)
+
+    def set_scrollbar(self):
+        nr_rows = len(self.model)
+        if nr_rows <= self.visible_rows:
+            self.scrollbar.set(0., 1.)
+        else:
+            self.scrollbar.set(self.offset/nr_rows, (self.offset + self.visible_rows)/nr_rows)
+
+    def refresh(self):
+        """
+        Shows the rows from offset on in the entry pool
+        """
+        self.loading = True
+        for pos, entries in enumerate(self.pool):
+            index = self.offset + pos
+            for key, (entry, var) in entries.items():
+                if index < len(self.model):
+                    var.set(self.model.get(index, key))
+                    entry.grid()
+                else:
+                    var.set('')
+                    entry.grid_remove()
+        self.loading = False
+        self.set_scrollbar()
+
+    def on_edit(self, pos, key):
+        if self.loading:
+            return
+        index = self.offset + pos
+        if index >= len(self.model):
+            return
+        val = self.pool[pos][key][1].get()
+        self.model.set(index, key, val)
+        for listener in self.listeners:
+            listener(index, key, val)
+
+    def complete(self, event, pos, key):
+        """
+        Shows the completions of the text of an entry as it is typed
+        """
+        if self.popup.on_key(event):
+            return "break"
+        entry, var = self.pool[pos][key]
+        prefix = var.get()
+        options = self.completers[key](prefix) if prefix else []
+        if len(options) == 0 or options == [prefix]:
+            self.popup.hide()
+        else:
+            self.popup.show(entry, var, options)
+
+    def add_row(self, row=None):
+        """
+        Appends a row and scrolls to it
+        """
+        index = self.model.append(row)
+        if index < self.offset + self.visible_rows:
+            self.refresh()
+        else:
+            self.scroll_to(self.get_max_offset())
+        return index
+
+    def remove_row(self):
+        if len(self.model) == 0:
+            return None
+        row = self.model.pop()
+        if self.offset > self.get_max_offset():
+            self.offset = self.get_max_offset()
+        self.refresh()
+        return row
+
+    def get_rows(self):
+        return self.model.get_rows()
+
+    def set_rows(self, rows):
+        self.model.set_rows(rows)
+        self.offset = 0
+        self.refresh()
+
+    def get_entries(self):
+        """
+        The entry widgets of the pool as dicts by field
+        """
+        return [{key: entry for key, (entry, _) in entries.items()} for entries in self.pool]
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Reading of idea definitions (specs) from JSON Lines or CSV files.
+
+A JSON Lines record holds one idea:
+  {"name": "my_idea", "GFXFileName": "...", "FullName": "...", "Description": "...",
+   "modifier": [{"Key": "stability_factor", "Value": "0.05"}],
+   "cancel": [{"Key": "has_war", "Relation": "=", "Value": "yes"}]}
+
+A CSV file has the columns name, the Idea.KEYS, category and the fields
+of the categories (Key, Relation, Value). Consecutive rows with the same
+name belong to the same idea, each row with a category adds one entry
+of that category.
+
+A JSON Lines record with params (and sweeps) is a template which is
+expanded into many ideas, see templates.IdeaTemplate.
+"""
+import unittest
+import os
+import io
+import csv
+import json
+import itertools
+from .ideas import Idea, Modifier, Cancel
+from . import flyweight
+
+JSONL = "jsonl"
+CSV = "csv"
+FORMATS = {".jsonl": JSONL, ".json": JSONL, ".csv": CSV}
+CATEGORY_KEY = "category"
+PARAMS_KEY = "params"
+
+FORMAT_ERROR_MSG = "Error: unknown spec format of {}!"
+NAME_ERROR_MSG = "Error: {} line {}: idea name missing!"
+CATEGORY_ERROR_MSG = "Error: {} line {}: unknown category {}!"
+FIELD_ERROR_MSG = "Error: idea {}: field {} of {} missing!"
+
+CATEGORY_MAP = {cat.get_name(): cat for cat in Idea.CATEGORIES}
+
+
+def get_format(path, fmt=None):
+    if fmt is not None:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(FORMAT_ERROR_MSG.format(path))
+    return FORMATS[ext]
+
+
+def to_text(val):
+    return val if isinstance(val, str) else json.dumps(val)
+
+
+def check_rows(record):
+    """
+    Raises a ValueError if a category row of the record lacks a field
+    """
+    for category_cls in Idea.CATEGORIES:
+        for row in record.get(category_cls.get_name(), []):
+            for key in category_cls.get_fields():
+                if key not in row:
+                    raise ValueError(FIELD_ERROR_MSG.format(record[Idea.NAME_KEY], key, category_cls.get_name()))
+
+
+def record2idea(record, interner=None):
+    """
+    Turns a spec record into an Idea with its category objects,
+    equal rows share a frozen object of interner (see flyweight)
+    """
+    check_rows(record)
+    idea = Idea(record[Idea.NAME_KEY])
+    idea.set_dict({key: to_text(record[key]) for key in Idea.KEYS
+                   if record.get(key) not in (None, '')})
+    for category_cls in Idea.CATEGORIES:
+        rows = ({key: to_text(val) for key, val in row.items()}
+                for row in record.get(category_cls.get_name(), []))
+        if interner is None:
+            cobjs = [category_cls(entries) for entries in rows]
+        else:
+            cobjs = [interner.intern_entries(category_cls, entries) for entries in rows]
+        idea.set_category_objs(category_cls, cobjs)
+    return idea
+
+
+def read_jsonl(fp, source='<jsonl>'):
+    for nr, line in enumerate(fp, 1):
+        if line.strip() == '':
+            continue
+        record = json.loads(line)
+        if not record.get(Idea.NAME_KEY):
+            raise ValueError(NAME_ERROR_MSG.format(source, nr))
+        yield record
+
+
+def read_csv(fp, source='<csv>'):
+    """
+    Groups consecutive rows with the same name into one record
+    """
+    reader = csv.DictReader(fp)
+    rows = ((reader.line_num, row) for row in reader)
+    for name, group in itertools.groupby(rows, key=lambda row: row[1].get(Idea.NAME_KEY)):
+        record = None
+        for nr, row in group:
+            if not name:
+                raise ValueError(NAME_ERROR_MSG.format(source, nr))
+            if record is None:
+                record = {Idea.NAME_KEY: name}
+            for key in Idea.KEYS:
+                if row.get(key) and key not in record:
+                    record[key] = row[key]
+            cat_name = row.get(CATEGORY_KEY)
+            if not cat_name:
+                continue
+            if cat_name not in CATEGORY_MAP:
+                raise ValueError(CATEGORY_ERROR_MSG.format(source, nr, cat_name))
+            fields = CATEGORY_MAP[cat_name].get_fields()
+            record.setdefault(cat_name, []).append({key: row.get(key) or '' for key in fields})
+        yield record
+
+
+READERS = {JSONL: read_jsonl, CSV: read_csv}
+
+
+def read_records(paths, fmt=None):
+    """
+    Yields the spec records of all files in paths, one at a time
+    """
+    for path in paths:
+        reader = READERS[get_format(path, fmt)]
+        with open(path, newline='') as fp:
+            yield from reader(fp, source=path)
+
+
+def record2ideas(record, interner=None):
+    """
+    Yields the Idea of a spec record, or the ideas of a template record
+    """
+    if PARAMS_KEY in record:
+        # numpy is only needed for templates
+        from .templates import IdeaTemplate
+        check_rows(record)
+        yield from IdeaTemplate.from_record(record).expand(interner=interner)
+    else:
+        yield record2idea(record, interner=interner)
+
+
+def load_ideas(paths, fmt=None):
+    """
+    Yields an Idea for each spec record of the files in paths
+    and the ideas of each template record. Equal rows of the
+    ideas share one frozen object (see flyweight).
+    """
+    with flyweight.scope() as interner:
+        for record in read_records(paths, fmt=fmt):
+            yield from record2ideas(record, interner=interner)
+
+########################
+# Tests                #
+########################
+
+class SpecTests(unittest.TestCase):
+    JSONL_CODE = (
+        '{"name": "my_idea_1", "GFXFileName": "gfx/interface/ideas/a.dds", '
+        '"FullName": "Idea 1", "Description": "Desc 1", '
+        '"modifier": [{"Key": "stability_factor", "Value": 0.05}], '
+        '"cancel": [{"Key": "has_war", "Relation": "=", "Value": "yes"}]}\n'
+        '\n'
+        '{"name": "my_idea_2", "GFXFileName": "gfx/interface/ideas/b.dds", '
+        '"FullName": "Idea 2", "Description": "Desc 2"}\n')
+    CSV_CODE = (
+        "name,GFXFileName,PictureName,FullName,Description,category,Key,Relation,Value\n"
+        "my_idea_1,gfx/interface/ideas/a.dds,,Idea 1,Desc 1,modifier,stability_factor,,0.05\n"
+        "my_idea_1,,,,,cancel,has_war,=,yes\n"
+        "my_idea_2,gfx/interface/ideas/b.dds,,Idea 2,Desc 2,,,,\n")
+
+    def check_records(self, records):
+        self.assertEqual([rec[Idea.NAME_KEY] for rec in records], ["my_idea_1", "my_idea_2"])
+        ideas = [record2idea(rec) for rec in records]
+        self.assertEqual(getattr(ideas[0], Idea.FULL_NAME), "Idea 1")
+        self.assertFalse(hasattr(ideas[0], Idea.PIC_NAME))
+        modifier, = ideas[0].category_objs[Modifier.get_name()]
+        self.assertEqual((modifier.Key, modifier.Value), ("stability_factor", "0.05"))
+        cancel, = ideas[0].category_objs[Cancel.get_name()]
+        self.assertEqual((cancel.Key, cancel.Relation, cancel.Value), ("has_war", "=", "yes"))
+        self.assertEqual(ideas[1].category_objs[Modifier.get_name()], [])
+
+    def test_read_jsonl(self):
+        self.check_records(list(read_jsonl(io.StringIO(self.JSONL_CODE))))
+
+    def test_read_csv(self):
+        self.check_records(list(read_csv(io.StringIO(self.CSV_CODE))))
+
+    def test_shared_rows(self):
+        records = list(read_jsonl(io.StringIO(self.JSONL_CODE.replace('"FullName": "Idea 2", "Description": "Desc 2"',
+            '"FullName": "Idea 2", "Description": "Desc 2", "modifier": [{"Key": "stability_factor", "Value": 0.05}]'))))
+        interner = flyweight.Interner()
+        first, second = [record2idea(rec, interner=interner).category_objs[Modifier.get_name()][0]
+                         for rec in records]
+        self.assertIs(first, second)
+        self.assertRaises(AttributeError, first.set_fields, Key="stability_factor", Value="0.1")
+        # a copy can be edited
+        edited = first.copy()
+        edited.set_fields(Key="stability_factor", Value="0.1")
+        self.assertEqual((edited.Value, second.Value), ("0.1", "0.05"))
+        # without an interner the rows are objects of their own
+        first, second = [record2idea(rec).category_objs[Modifier.get_name()][0] for rec in records]
+        self.assertIsNot(first, second)
+
+    def test_unknown_category(self):
+        code = "name,category,Key,Value\nmy_idea_1,no_category,a,b\n"
+        with self.assertRaises(ValueError):
+            list(read_csv(io.StringIO(code)))
+
+    def test_get_format(self):
+        self.assertEqual(get_format("ideas.jsonl"), JSONL)
+        self.assertEqual(get_format("ideas.CSV"), CSV)
+        self.assertEqual(get_format("ideas.txt", fmt=CSV), CSV)
+        with self.assertRaises(ValueError):
+            get_format("ideas.txt")
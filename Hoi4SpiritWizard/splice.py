@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Merging of ideas into an existing ideas file without rewriting it.
+A BlockIndex holds the byte offsets of the idea blocks and of the end
+of each group block of ideas = { group = { ... } }. The index is kept
+next to the file (in .hoi4sw_cache) as long as the file is unchanged,
+so merging an idea does not rescan the file.
+
+splice_ideas replaces the blocks of changed ideas and inserts new ideas
+at the end of their group. The file is rewritten from the first change
+on; a changed block of the same size is written in place. A crash while
+writing can leave the file partly changed; with atomic=True the whole
+file is copied into a temp file replacing it (see output.Transaction).
+"""
+import unittest
+import os
+import re
+import mmap
+import pickle
+import tempfile
+from .ideas import Idea, Modifier
+from . import output
+
+CACHE_DIR = ".hoi4sw_cache"
+INDEX_SUFF = ".blocks"
+VERSION = 1
+TOKEN_PATTERN = re.compile(rb'#[^\n]*|"[^"]*"|[{}]|=|[^\s{}=#"]+')
+ENCODING = "utf-8"
+GROUP_ERROR_MSG = "Error: no group {} in the ideas of {}!"
+
+
+def get_line_start(data, pos):
+    """
+    The start of the line of pos if only blanks precede pos on it
+    """
+    start = data.rfind(b"\n", 0, pos) + 1
+    return start if data[start:pos].strip() == b'' else pos
+
+
+def get_line_end(data, pos):
+    """
+    The position after the newline following pos if only blanks follow pos
+    """
+    end = data.find(b"\n", pos)
+    if end == -1:
+        end = len(data)
+        return end if data[pos:end].strip() == b'' else pos
+    return end + 1 if data[pos:end].strip() == b'' else pos
+
+
+class BlockIndex:
+    """
+    blocks: (start, end, group) by idea name, groups: position of the
+    line with the closing brace of each group
+    """
+    def __init__(self, blocks=None, groups=None, stamp=None):
+        self.blocks = {} if blocks is None else blocks
+        self.groups = {} if groups is None else groups
+        self.stamp = stamp
+
+    @staticmethod
+    def get_stamp(path):
+        stat = os.stat(path)
+        return VERSION, stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def get_index_file(path):
+        folder, fname = os.path.split(os.path.abspath(path))
+        return os.path.join(folder, CACHE_DIR, fname + INDEX_SUFF)
+
+    @classmethod
+    def scan(cls, data):
+        """
+        Builds the index of the code data (bytes or mmap)
+        """
+        index = cls()
+        depth = 0
+        in_ideas = False
+        prev = []
+        prev_start = 0
+        opened = []
+        for match in TOKEN_PATTERN.finditer(data):
+            token = match.group()
+            if token[:1] == b'#':
+                continue
+            if token == b'{':
+                name = None
+                if len(prev) == 2 and prev[1] == b'=':
+                    name = prev[0].decode(ENCODING)
+                    if depth == 0:
+                        in_ideas = name == Idea.IDEAS_KEY
+                    elif depth == 1 and in_ideas:
+                        group = name
+                opened += [(name, match.start(), prev_start)]
+                depth += 1
+            elif token == b'}' and depth > 0:
+                depth -= 1
+                name, _, name_start = opened.pop()
+                if in_ideas and depth == 2 and name is not None:
+                    index.blocks[name] = (get_line_start(data, name_start),
+                                          get_line_end(data, match.end()), group)
+                elif in_ideas and depth == 1 and name is not None:
+                    index.groups[name] = get_line_start(data, match.start())
+            if token != b'=':
+                prev_start = match.start()
+            prev = (prev + [token])[-2:]
+        return index
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns the index of the file path, from the cache if the file is unchanged
+        """
+        stamp = cls.get_stamp(path)
+        index_file = cls.get_index_file(path)
+        if os.path.isfile(index_file):
+            try:
+                with open(index_file, 'rb') as fp:
+                    index = pickle.load(fp)
+                if index.stamp == stamp:
+                    return index
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+                pass
+        with open(path, 'rb') as fp:
+            if stamp[1] == 0:
+                index = cls()
+            else:
+                with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    index = cls.scan(data)
+        index.save(path)
+        return index
+
+    def save(self, path):
+        self.stamp = self.get_stamp(path)
+        index_file = self.get_index_file(path)
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        with open(index_file + ".tmp", 'wb') as fp:
+            pickle.dump(self, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(index_file + ".tmp", index_file)
+
+    def shifted(self, changes, added):
+        """
+        The index after the changes (start, end, code) were made,
+        added are the (name, code) of the blocks inserted per group
+        """
+        def delta(pos):
+            # changes before pos, including insertions at pos
+            return sum(len(code) - (end - start) for start, end, code in changes if end <= pos)
+        changed = {start: len(code) for start, end, code in changes if start != end}
+        blocks = {}
+        for name, (start, end, group) in self.blocks.items():
+            new_start = start + delta(start)
+            new_end = new_start + changed[start] if start in changed else end + delta(start)
+            blocks[name] = (new_start, new_end, group)
+        groups = {group: pos + delta(pos) for group, pos in self.groups.items()}
+        for group, new_blocks in added.items():
+            pos = groups[group] - sum(len(code) for _, code in new_blocks)
+            for name, code in new_blocks:
+                blocks[name] = (pos, pos + len(code), group)
+                pos += len(code)
+        return BlockIndex(blocks, groups)
+
+
+def splice_ideas(idea_list, target, group=Idea.COUNTRY_KEY, atomic=False):
+    """
+    Merges the ideas into the ideas file target. Returns the names of
+    the replaced and of the added ideas; unchanged ideas are skipped.
+    Of ideas with the same name the last one is merged.
+    atomic: the merged file replaces target instead of its tail being rewritten
+    """
+    idea_list = {idea.name: idea for idea in idea_list}.values()
+    index = BlockIndex.load(target)
+    changes = []
+    updated = []
+    added = {}
+    with open(target, 'rb') as fp:
+        size = os.fstat(fp.fileno()).st_size
+        data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b''
+        try:
+            for idea in idea_list:
+                code = idea.get_paradox_block().encode(ENCODING)
+                if idea.name in index.blocks:
+                    start, end, _ = index.blocks[idea.name]
+                    if data[start:end] != code:
+                        changes += [(start, end, code)]
+                        updated += [idea.name]
+                else:
+                    if group not in index.groups:
+                        raise ValueError(GROUP_ERROR_MSG.format(group, target))
+                    added.setdefault(group, []).append((idea.name, code))
+            for add_group, blocks in added.items():
+                pos = index.groups[add_group]
+                changes += [(pos, pos, b''.join(code for _, code in blocks))]
+            changes.sort(key=lambda change: change[0])
+            if len(changes) == 0:
+                return updated, []
+            in_place = all(len(code) == end - start for start, end, code in changes)
+            if in_place:
+                pieces = [(start, code) for start, end, code in changes]
+            elif atomic:
+                pieces = []
+                with output.Transaction() as transaction:
+                    with open(transaction.stage(target), 'wb', buffering=output.BUFFER_SIZE) as tmp_fp:
+                        pos = 0
+                        for start, end, code in changes:
+                            tmp_fp.write(data[pos:start])
+                            tmp_fp.write(code)
+                            pos = end
+                        tmp_fp.write(data[pos:size])
+            else:
+                # everything from the first change on is written once
+                first = changes[0][0]
+                parts = []
+                pos = first
+                for start, end, code in changes:
+                    parts += [data[pos:start], code]
+                    pos = end
+                parts += [data[pos:size]]
+                pieces = [(first, b''.join(parts))]
+        finally:
+            if size > 0:
+                data.close()
+    if len(pieces) > 0:
+        with open(target, 'r+b') as fp:
+            for pos, code in pieces:
+                fp.seek(pos)
+                fp.write(code)
+            if not in_place:
+                fp.truncate()
+    index.shifted(changes, added).save(target)
+    return updated, [name for blocks in added.values() for name, _ in blocks]
+
+########################
+# Tests                #
+########################
+
+class SpliceTests(unittest.TestCase):
+    def make_idea(self, name, value="0.1"):
+        idea = Idea(name)
+        idea.set_category_objs(Modifier, [Modifier({"Key": "stability_factor", "Value": value})])
+        return idea
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.target = os.path.join(self.tmp_dir.name, "ideas.txt")
+        self.ideas = [self.make_idea(f"my_idea_{nr}") for nr in range(5)]
+        Idea.write_paradox_file(self.ideas, self.target)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def expected(self, ideas):
+        return Idea.join_blocks(None, [idea.get_paradox_block() for idea in ideas], Idea.paradox_frame)
+
+    def read(self):
+        with open(self.target, encoding=ENCODING) as fp:
+            return fp.read()
+
+    def test_scan(self):
+        with open(self.target, 'rb') as fp:
+            data = fp.read()
+        index = BlockIndex.scan(data)
+        self.assertEqual(list(index.blocks), [idea.name for idea in self.ideas])
+        for idea in self.ideas:
+            start, end, group = index.blocks[idea.name]
+            self.assertEqual(data[start:end].decode(ENCODING), idea.get_paradox_block())
+            self.assertEqual(group, Idea.COUNTRY_KEY)
+
+    def test_splice(self):
+        self.ideas[1] = self.make_idea("my_idea_1", "0.25")
+        self.ideas[3] = self.make_idea("my_idea_3", "0.3")
+        new_ideas = [self.make_idea("my_idea_5"), self.make_idea("my_idea_6")]
+        updated, added = splice_ideas([self.ideas[3], self.ideas[1], self.ideas[0]] + new_ideas,
+                                      self.target)
+        self.assertEqual(updated, ["my_idea_3", "my_idea_1"])
+        self.assertEqual(added, ["my_idea_5", "my_idea_6"])
+        self.ideas += new_ideas
+        self.assertEqual(self.read(), self.expected(self.ideas))
+        # the cached index was moved along with the blocks
+        with open(self.target, 'rb') as fp:
+            scanned = BlockIndex.scan(fp.read())
+        index = BlockIndex.load(self.target)
+        self.assertEqual(index.blocks, scanned.blocks)
+        self.assertEqual(index.groups, scanned.groups)
+        self.ideas[6] = self.make_idea("my_idea_6", "0.5")
+        self.assertEqual(splice_ideas([self.ideas[6]], self.target), (["my_idea_6"], []))
+        self.assertEqual(self.read(), self.expected(self.ideas))
+
+    def test_in_place(self):
+        self.ideas[2] = self.make_idea("my_idea_2", "0.9")
+        self.assertEqual(splice_ideas(self.ideas, self.target), (["my_idea_2"], []))
+        self.assertEqual(self.read(), self.expected(self.ideas))
+        self.assertEqual(splice_ideas(self.ideas, self.target), ([], []))
+
+    def test_duplicates(self):
+        ideas = [self.make_idea("my_idea_5"), self.make_idea("my_idea_1", "0.7"), self.make_idea("my_idea_5", "0.5")]
+        self.assertEqual(splice_ideas(ideas, self.target), (["my_idea_1"], ["my_idea_5"]))
+        self.ideas[1] = ideas[1]
+        self.assertEqual(self.read(), self.expected(self.ideas + ideas[2:]))
+
+    def test_tail(self):
+        with open(self.target, 'rb') as fp:
+            old_data = fp.read()
+        first = BlockIndex.load(self.target).blocks["my_idea_3"][0]
+        inode = os.stat(self.target).st_ino
+        self.ideas[3] = self.make_idea("my_idea_3", "0.35")
+        self.assertEqual(splice_ideas(self.ideas, self.target), (["my_idea_3"], []))
+        self.assertEqual(self.read(), self.expected(self.ideas))
+        # the same file, the bytes before the change are kept
+        self.assertEqual(os.stat(self.target).st_ino, inode)
+        with open(self.target, 'rb') as fp:
+            self.assertEqual(fp.read(first), old_data[:first])
+
+    def test_atomic(self):
+        inode = os.stat(self.target).st_ino
+        self.ideas[3] = self.make_idea("my_idea_3", "0.35")
+        self.assertEqual(splice_ideas(self.ideas, self.target, atomic=True), (["my_idea_3"], []))
+        self.assertEqual(self.read(), self.expected(self.ideas))
+        # the file was replaced, no temp file is left
+        self.assertNotEqual(os.stat(self.target).st_ino, inode)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), [CACHE_DIR, "ideas.txt"])
+
+    def test_unknown_group(self):
+        with self.assertRaises(ValueError):
+            splice_ideas([self.make_idea("my_idea_9")], self.target, group="no_group")
+
+    def test_merge_paradox_file(self):
+        path, outfile = os.path.split(self.target)
+        self.ideas[4] = self.make_idea("my_idea_4", "0.4")
+        self.assertEqual(Idea.merge_paradox_file(self.ideas[4:], outfile, path=path), (["my_idea_4"], []))
+        self.assertEqual(self.read(), self.expected(self.ideas))
+        self.assertEqual(Idea.merge_paradox_file(self.ideas[:2], "new.txt", path=path),
+                         ([], ["my_idea_0", "my_idea_1"]))
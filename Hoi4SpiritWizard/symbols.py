@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Symbol index of mod and game directories: idea names, spriteType names
+and localisation keys with the files defining them. Lookups are dict
+accesses, a refresh only rescans files whose mtime or size changed.
+The files are scanned by a small tokenizer, not the full parser.
+The index is kept as JSON in the cache of the user, one per set of
+directories, so nothing is written into the mod or the game.
+"""
+import unittest
+from unittest import mock
+import os
+import re
+import glob
+import json
+import hashlib
+import tempfile
+from .ideas import Idea
+from .importer import IDEAS_GLOB, GFX_GLOB, LOC_GLOB, ENCODING, LOC_PATTERN, CACHE_ENV, get_user_cache_dir
+
+INDEX_VERSION = 2
+COLLISION_ERROR_MSG = "Error: {} already defined in {}!"
+
+TOKEN_PATTERN = re.compile(r'#[^\n]*|"[^"]*"|[{}]|=|[^\s{}=#"]+')
+SPRITE_PATTERN = re.compile(r'\bname\s*=\s*"?([^\s"{}#]+)', re.IGNORECASE)
+
+
+def scan_ideas(code):
+    """
+    Returns the idea names: blocks at depth 2 of the ideas = { group = { ... } } blocks
+    """
+    names = []
+    depth = 0
+    in_ideas = False
+    prev = []
+    for match in TOKEN_PATTERN.finditer(code):
+        token = match.group()
+        if token[0] == '#':
+            continue
+        if token == '{':
+            if len(prev) == 2 and prev[1] == '=':
+                if depth == 0:
+                    in_ideas = prev[0] == Idea.IDEAS_KEY
+                elif depth == 2 and in_ideas:
+                    names += [prev[0]]
+            depth += 1
+        elif token == '}':
+            depth = max(depth - 1, 0)
+        prev = (prev + [token])[-2:]
+    return names
+
+
+def scan_sprites(code):
+    return SPRITE_PATTERN.findall(code)
+
+
+def scan_loc(code):
+    return [match.group(1) for match in LOC_PATTERN.finditer(code)]
+
+
+SCANNERS = [(IDEAS_GLOB, Idea.PDX, scan_ideas),
+            (GFX_GLOB, Idea.GFX, scan_sprites),
+            (LOC_GLOB, Idea.LOC, scan_loc)]
+
+
+class SymbolIndex:
+    """
+    Index of the symbols defined in the directories roots (e.g. mod and game).
+    The index is stored in index_file (default: in the cache of the user).
+    """
+    KINDS = [Idea.PDX, Idea.GFX, Idea.LOC]
+
+    def __init__(self, roots, index_file=None):
+        self.roots = list(roots)
+        if index_file is None:
+            index_file = self.get_index_file(self.roots)
+        self.index_file = index_file
+        # path -> (mtime_ns, size, kind, names)
+        self.files = {}
+        # kind -> name -> paths
+        self.symbols = {kind: {} for kind in self.KINDS}
+        self.load()
+
+    @staticmethod
+    def get_index_file(roots):
+        key = hashlib.sha1('\n'.join(os.path.abspath(root) for root in roots).encode('utf-8')).hexdigest()
+        return get_user_cache_dir("symbols", key + ".json")
+
+    def load(self):
+        if not os.path.isfile(self.index_file):
+            return
+        try:
+            with open(self.index_file, encoding='utf-8') as fp:
+                version, files = json.load(fp)
+        except (OSError, ValueError, TypeError):
+            return
+        if version != INDEX_VERSION:
+            return
+        for path, entry in files.items():
+            self.add_entry(path, tuple(entry))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_file) or '.', exist_ok=True)
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as fp:
+            json.dump([INDEX_VERSION, self.files], fp, separators=(',', ':'))
+        os.replace(tmp_file, self.index_file)
+
+    def add_entry(self, path, entry):
+        self.files[path] = entry
+        symbols = self.symbols[entry[2]]
+        for name in entry[3]:
+            symbols.setdefault(name, []).append(path)
+
+    def remove_entry(self, path):
+        _, _, kind, names = self.files.pop(path)
+        symbols = self.symbols[kind]
+        for name in names:
+            paths = symbols.get(name, [])
+            if path in paths:
+                paths.remove(path)
+            if len(paths) == 0:
+                symbols.pop(name, None)
+
+    def get_paths(self):
+        for root in self.roots:
+            for pattern, kind, scanner in SCANNERS:
+                for path in glob.glob(os.path.join(root, pattern), recursive=True):
+                    yield os.path.abspath(path), kind, scanner
+
+    def refresh(self, save=True):
+        """
+        Rescans new and changed files, drops deleted ones.
+        Returns the list of rescanned paths.
+        """
+        seen = set()
+        changed = []
+        for path, kind, scanner in self.get_paths():
+            seen.add(path)
+            stat = os.stat(path)
+            entry = self.files.get(path)
+            if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+                continue
+            if entry is not None:
+                self.remove_entry(path)
+            with open(path, encoding=ENCODING, errors='replace') as fp:
+                names = scanner(fp.read())
+            self.add_entry(path, (stat.st_mtime_ns, stat.st_size, kind, names))
+            changed += [path]
+        for path in [path for path in self.files if path not in seen]:
+            self.remove_entry(path)
+            changed += [path]
+        if save and changed:
+            self.save()
+        return changed
+
+    def lookup(self, kind, name):
+        """
+        Returns the files defining name as kind (Idea.PDX, Idea.GFX or Idea.LOC)
+        """
+        return self.symbols[kind].get(name, [])
+
+    def __contains__(self, kind_name):
+        return kind_name[1] in self.symbols[kind_name[0]]
+
+    def find_collisions(self, idea_list, kinds=KINDS, ignore=()):
+        """
+        Returns (kind, name, paths) of symbols of the ideas which are defined
+        elsewhere or twice in idea_list. Files in ignore (e.g. the files
+        about to be overwritten) do not count.
+        """
+        ignore = {os.path.abspath(path) for path in ignore}
+        collisions = []
+        for kind in kinds:
+            seen = set()
+            for idea in idea_list:
+                for name in idea.get_symbols(kind):
+                    paths = [path for path in self.lookup(kind, name) if path not in ignore]
+                    if name in seen:
+                        paths += ["<ideas>"]
+                    seen.add(name)
+                    if paths:
+                        collisions += [(kind, name, paths)]
+        return collisions
+
+    @staticmethod
+    def get_messages(collisions):
+        return [COLLISION_ERROR_MSG.format(name, ', '.join(paths)) for _, name, paths in collisions]
+
+########################
+# Tests                #
+########################
+
+class SymbolTests(unittest.TestCase):
+    IDEAS_CODE = """
+ideas = {
+    country = {
+        # commented = { }
+        existing_idea = {
+            modifier = { stability_factor = 0.1 }
+            allowed = { original_tag = GER }
+        }
+    }
+    hidden_ideas = { hidden_idea = { } }
+}
+"""
+    GFX_CODE = 'spriteTypes = {\n spriteType = { name = "GFX_idea_existing_idea" texturefile = "a.dds" }\n}\n'
+    LOC_CODE = 'l_english:\n existing_idea:0 "Existing"\n existing_idea_desc:0 "Desc"\n'
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "mod")
+        # the index goes into a cache of the test
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+        patcher = mock.patch.dict(os.environ, {CACHE_ENV: self.cache_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.write("common/ideas/existing.txt", self.IDEAS_CODE)
+        self.write("interface/existing.gfx", self.GFX_CODE)
+        self.write("localisation/english/existing_l_english.yml", self.LOC_CODE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, fname, code):
+        path = os.path.join(self.root, fname)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(code)
+        return path
+
+    def test_scan_ideas(self):
+        self.assertEqual(scan_ideas(self.IDEAS_CODE), ["existing_idea", "hidden_idea"])
+
+    def test_lookup(self):
+        index = SymbolIndex([self.root])
+        self.assertEqual(len(index.refresh()), 3)
+        self.assertIn((Idea.PDX, "existing_idea"), index)
+        self.assertIn((Idea.GFX, "GFX_idea_existing_idea"), index)
+        self.assertIn((Idea.LOC, "existing_idea_desc"), index)
+        self.assertNotIn((Idea.PDX, "modifier"), index)
+
+    def test_refresh(self):
+        index = SymbolIndex([self.root])
+        index.refresh()
+        index = SymbolIndex([self.root])
+        self.assertEqual(index.refresh(), [])
+        self.assertIn((Idea.PDX, "existing_idea"), index)
+        path = self.write("common/ideas/existing.txt", "ideas = { country = { renamed_idea = {} } }")
+        self.assertEqual(index.refresh(), [os.path.abspath(path)])
+        self.assertNotIn((Idea.PDX, "existing_idea"), index)
+        self.assertIn((Idea.PDX, "renamed_idea"), index)
+
+    def test_game_root(self):
+        game_dir = os.path.join(self.tmp.name, "game")
+        path = os.path.join(game_dir, "common/ideas/vanilla.txt")
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fp:
+            fp.write("ideas = { country = { vanilla_idea = {} } }")
+        index = SymbolIndex([self.root, game_dir])
+        self.assertEqual(len(index.refresh()), 4)
+        self.assertEqual(index.lookup(Idea.PDX, "vanilla_idea"), [os.path.abspath(path)])
+        # nothing is written into the mod or the game
+        self.assertEqual(sorted(os.listdir(self.root)), ["common", "interface", "localisation"])
+        self.assertEqual(sorted(os.listdir(game_dir)), ["common"])
+        self.assertTrue(index.index_file.startswith(self.cache_dir))
+        self.assertIn((Idea.PDX, "vanilla_idea"), SymbolIndex([self.root, game_dir]))
+        self.assertNotIn((Idea.PDX, "vanilla_idea"), SymbolIndex([self.root]))
+
+    def test_collisions(self):
+        index = SymbolIndex([self.root])
+        index.refresh()
+        idea = Idea("existing_idea")
+        idea.set_dict({Idea.GFX_FNAME: "b.dds"})
+        new_idea = Idea("new_idea")
+        new_idea.set_dict({Idea.GFX_FNAME: "c.dds"})
+        collisions = index.find_collisions([idea, new_idea])
+        self.assertEqual([(kind, name) for kind, name, _ in collisions],
+                         [(Idea.PDX, "existing_idea"), (Idea.GFX, "GFX_idea_existing_idea"),
+                          (Idea.LOC, "existing_idea"), (Idea.LOC, "existing_idea_desc")])
+        ignore = [os.path.join(self.root, "common/ideas/existing.txt")]
+        self.assertEqual(len(index.find_collisions([idea], kinds=[Idea.PDX], ignore=ignore)), 0)
+        self.assertEqual(len(index.find_collisions([new_idea, new_idea], kinds=[Idea.PDX])), 1)
+        with self.assertRaises(ValueError):
+            Idea.write_paradox_file([idea], "out.txt", path=self.root, symbols=index)
+
+    def test_localisation_files(self):
+        index = SymbolIndex([self.root])
+        index.refresh()
+        idea = Idea("existing_idea")
+        idea.set_dict({Idea.FULL_NAME: "Existing", Idea.DESC: "Desc"})
+        # the existing english file is overwritten, so it does not collide for any language
+        files = Idea.write_localisation_files([idea], "existing", path=self.root,
+                                              languages=["english", "german"], symbols=index)
+        self.assertEqual(sorted(files), ["english", "german"])
+        with self.assertRaises(ValueError):
+            Idea.write_localisation_files([idea], "other", path=self.root, symbols=index)
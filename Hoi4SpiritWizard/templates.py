@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Idea templates: an idea with placeholders in its name, fields and
+category rows, expanded for every combination of the parameter values,
+e.g. per tag and tier:
+
+    template = IdeaTemplate("{tag}_army_{tier}",
+                            fields={Idea.FULL_NAME: "Army Reform {tier}", ...},
+                            categories={"modifier": [{"Key": "stability_factor", "Value": "{stab}"}]},
+                            params={"tag": ["GER", "ENG"], "tier": [1, 2, 3, 4, 5]},
+                            sweeps={"stab": Sweep("tier", 0.05, 0.25)})
+    Idea.stream_idea_files(template.expand(), gfx_fp, loc_fp, pdx_fp)
+
+A sweep scales a value over the values of a parameter. The values of all
+sweeps are computed together with NumPy when the template is created,
+expand() is a generator which builds one Idea at a time.
+"""
+import unittest
+import re
+import itertools
+import numpy as np
+from .ideas import Idea, ModifierTable
+from . import specs
+
+LINEAR = "linear"
+GEOMETRIC = "geometric"
+SCALES = [LINEAR, GEOMETRIC]
+
+PARAMS_KEY = specs.PARAMS_KEY
+SWEEPS_KEY = "sweeps"
+PARAM_ERROR_MSG = "Error: sweep {} over unknown parameter {}!"
+SCALE_ERROR_MSG = "Error: unknown scale {} of sweep {}!"
+GEOMETRIC_ERROR_MSG = "Error: geometric sweep {} needs positive bounds!"
+DIGITS_ERROR_MSG = "Error: sweep {} rounds values other than 0 to 0 with {} digits!"
+# {param} or {sweep}, other braces are kept as they are
+PLACEHOLDER_PATTERN = re.compile(r"\{\w+\}")
+# values this much smaller than the largest of a sweep are rounding noise of 0
+ZERO_TOLERANCE = 1e-9
+
+
+class Sweep:
+    """
+    A value going from start (first value of param) to stop (last value
+    of param), linearly or geometrically, rounded to digits
+    """
+    DIGITS = 4
+
+    def __init__(self, param, start, stop, scale=LINEAR, digits=DIGITS):
+        self.param = param
+        self.start = float(start)
+        self.stop = float(stop)
+        self.scale = scale
+        self.digits = digits
+
+    @classmethod
+    def from_dict(cls, dic):
+        return cls(dic["param"], dic["start"], dic["stop"], scale=dic.get("scale", LINEAR),
+                   digits=dic.get("digits", cls.DIGITS))
+
+
+def compute_sweeps(sweeps, sizes):
+    """
+    Returns the texts of the values of all sweeps by name, sizes are the
+    numbers of values of the parameters. The sweeps over a parameter
+    are computed in one array operation.
+    """
+    texts = {}
+    by_param = {}
+    for name, sweep in sweeps.items():
+        if sweep.param not in sizes:
+            raise ValueError(PARAM_ERROR_MSG.format(name, sweep.param))
+        if sweep.scale not in SCALES:
+            raise ValueError(SCALE_ERROR_MSG.format(sweep.scale, name))
+        if sweep.scale == GEOMETRIC and (sweep.start <= 0 or sweep.stop <= 0):
+            raise ValueError(GEOMETRIC_ERROR_MSG.format(name))
+        by_param.setdefault(sweep.param, []).append(name)
+    for param, names in by_param.items():
+        group = [sweeps[name] for name in names]
+        geometric = np.array([sweep.scale == GEOMETRIC for sweep in group])
+        starts = np.array([sweep.start for sweep in group])
+        stops = np.array([sweep.stop for sweep in group])
+        # geometric sweeps are linear in the logarithms
+        starts = np.where(geometric, np.log(np.where(geometric, starts, 1.)), starts)
+        stops = np.where(geometric, np.log(np.where(geometric, stops, 1.)), stops)
+        steps = np.linspace(0., 1., sizes[param])
+        values = starts[:, None] + (stops - starts)[:, None]*steps[None, :]
+        values = np.where(geometric[:, None], np.exp(values), values)
+        for name, sweep, row in zip(names, group, values):
+            texts[name] = format_values(row, sweep.digits)
+            zeros = np.array(texts[name]) == "0"
+            if np.any(zeros & (np.abs(row) > ZERO_TOLERANCE*np.abs(row).max())):
+                raise ValueError(DIGITS_ERROR_MSG.format(name, sweep.digits))
+    return texts
+
+
+def format_values(values, digits):
+    """
+    Returns the values in fixed point, rounded to digits and
+    without trailing zeros (no exponents as of %g)
+    """
+    # adding 0. turns -0. into 0.
+    texts = np.char.mod(f"%.{digits}f", np.round(values, digits) + 0.)
+    if digits > 0:
+        texts = np.char.rstrip(np.char.rstrip(texts, "0"), ".")
+    return texts.tolist()
+
+
+def fill(text, context):
+    """
+    Fills the placeholders of text from context, other braces
+    (e.g. of a trigger block) are kept as they are
+    """
+    return PLACEHOLDER_PATTERN.sub(lambda match: context[match.group()[1:-1]], text)
+
+
+class IdeaTemplate:
+    """
+    An idea with placeholders ({param} or {sweep}) in name, fields
+    (dict by Idea.KEYS) and categories (row dicts by category name)
+    """
+    def __init__(self, name, fields=None, categories=None, params=None, sweeps=None):
+        self.name = name
+        self.fields = {} if fields is None else dict(fields)
+        self.categories = {} if categories is None else dict(categories)
+        self.params = {key: list(vals) for key, vals in (params or {}).items()}
+        self.sweeps = {} if sweeps is None else dict(sweeps)
+        self.param_texts = {key: [str(val) for val in vals] for key, vals in self.params.items()}
+        self.sweep_texts = compute_sweeps(self.sweeps, {key: len(vals) for key, vals in self.params.items()})
+        self.category_map = {cat.get_name(): cat for cat in Idea.CATEGORIES}
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        A template from a spec record with the keys params and sweeps
+        """
+        categories = {cat_name: record[cat_name] for cat_name in
+                      [cat.get_name() for cat in Idea.CATEGORIES] if cat_name in record}
+        sweeps = {name: Sweep.from_dict(dic) for name, dic in record.get(SWEEPS_KEY, {}).items()}
+        return cls(record[Idea.NAME_KEY],
+                   fields={key: record[key] for key in Idea.KEYS if record.get(key) not in (None, '')},
+                   categories=categories, params=record.get(PARAMS_KEY), sweeps=sweeps)
+
+    def __len__(self):
+        size = 1
+        for vals in self.params.values():
+            size *= len(vals)
+        return size
+
+    def get_context(self, indices):
+        context = {key: texts[index] for (key, texts), index in zip(self.param_texts.items(), indices)}
+        positions = dict(zip(self.params, indices))
+        for name, texts in self.sweep_texts.items():
+            context[name] = texts[positions[self.sweeps[name].param]]
+        return context
+
+    def make_idea(self, context, interner=None):
+        """
+        The idea of the parameter texts in context, its rows are kept in
+        a ModifierTable or are the shared objects of interner
+        """
+        idea = Idea(fill(self.name, context))
+        idea.set_dict({key: fill(text, context) for key, text in self.fields.items()})
+        for cat_name, rows in self.categories.items():
+            category_cls = self.category_map[cat_name]
+            filled = ({key: fill(specs.to_text(val), context) for key, val in row.items()} for row in rows)
+            if interner is None:
+                cobjs = ModifierTable(category_cls, filled)
+            else:
+                cobjs = [interner.intern_entries(category_cls, entries) for entries in filled]
+            idea.set_category_objs(category_cls, cobjs)
+        return idea
+
+    def expand(self, interner=None):
+        """
+        Yields the ideas of all combinations of the parameter values
+        """
+        for indices in itertools.product(*(range(len(vals)) for vals in self.params.values())):
+            yield self.make_idea(self.get_context(indices), interner=interner)
+
+########################
+# Tests                #
+########################
+
+class TemplateTests(unittest.TestCase):
+    def make_template(self, tags=("GER", "ENG"), tiers=5):
+        return IdeaTemplate("{tag}_army_{tier}",
+                            fields={Idea.GFX_FNAME: "gfx/interface/ideas/{tag}_army.dds",
+                                    Idea.FULL_NAME: "Army Reform {tier}",
+                                    Idea.DESC: "Tier {tier} of the army reform"},
+                            categories={"modifier": [{"Key": "stability_factor", "Value": "{stab}"},
+                                                     {"Key": "army_org_factor", "Value": "{org}"}],
+                                        "cancel": [{"Key": "has_war", "Relation": "=", "Value": "yes"}]},
+                            params={"tag": list(tags), "tier": range(1, tiers + 1)},
+                            sweeps={"stab": Sweep("tier", 0.05, 0.25),
+                                    "org": Sweep("tier", 0.01, 0.16, scale=GEOMETRIC, digits=3)})
+
+    def test_sweeps(self):
+        texts = compute_sweeps({"a": Sweep("x", 0.05, 0.25), "b": Sweep("x", 1, 16, scale=GEOMETRIC)},
+                               {"x": 5})
+        self.assertEqual(texts["a"], ["0.05", "0.1", "0.15", "0.2", "0.25"])
+        self.assertEqual(texts["b"], ["1", "2", "4", "8", "16"])
+        self.assertRaises(ValueError, compute_sweeps, {"a": Sweep("y", 0, 1)}, {"x": 5})
+
+    def test_format(self):
+        texts = compute_sweeps({"a": Sweep("x", 1e5, 1e6, scale=GEOMETRIC, digits=0),
+                                "b": Sweep("x", -0.1, 0.1, digits=2),
+                                "c": Sweep("x", 2e-5, 1e-4, digits=6)}, {"x": 3})
+        self.assertEqual(texts["a"], ["100000", "316228", "1000000"])
+        self.assertEqual(texts["b"], ["-0.1", "0", "0.1"])
+        self.assertEqual(texts["c"], ["0.00002", "0.00006", "0.0001"])
+        # small values do not vanish silently
+        self.assertRaises(ValueError, compute_sweeps, {"a": Sweep("x", 2.5e-5, 1e-4)}, {"x": 3})
+
+    def test_expand(self):
+        template = self.make_template()
+        ideas = template.expand()
+        self.assertFalse(isinstance(ideas, list))
+        ideas = list(ideas)
+        self.assertEqual(len(ideas), len(template))
+        self.assertEqual([idea.name for idea in ideas[:6]],
+                         [f"GER_army_{tier}" for tier in range(1, 6)] + ["ENG_army_1"])
+        idea = ideas[2]
+        self.assertEqual(getattr(idea, Idea.FULL_NAME), "Army Reform 3")
+        self.assertEqual(getattr(idea, Idea.GFX_FNAME), "gfx/interface/ideas/GER_army.dds")
+        self.assertEqual(idea.category_objs["modifier"].get_rows(),
+                         [("stability_factor", "0.15"), ("army_org_factor", "0.04")])
+        self.assertEqual(idea.category_objs["cancel"].get_rows(), [("has_war", "=", "yes")])
+
+    def test_interned(self):
+        from . import flyweight
+        template = self.make_template()
+        ideas = list(template.expand(interner=flyweight.Interner()))
+        self.assertEqual(ideas[2].write_idea_paradox(), list(template.expand())[2].write_idea_paradox())
+        # the rows equal in all ideas are shared
+        cancels = {id(cobj) for idea in ideas for cobj in idea.category_objs["cancel"]}
+        self.assertEqual(len(cancels), 1)
+        self.assertIs(ideas[0].category_objs["modifier"][0], ideas[5].category_objs["modifier"][0])
+
+    def test_from_record(self):
+        record = {"name": "{tag}_idea", Idea.FULL_NAME: "Idea of {tag}",
+                  "modifier": [{"Key": "stability_factor", "Value": "{stab}"}],
+                  PARAMS_KEY: {"tag": ["GER", "ENG", "SOV"]},
+                  SWEEPS_KEY: {"stab": {"param": "tag", "start": 0.1, "stop": 0.3}}}
+        ideas = list(IdeaTemplate.from_record(record).expand())
+        self.assertEqual([idea.name for idea in ideas], ["GER_idea", "ENG_idea", "SOV_idea"])
+        self.assertEqual(ideas[1].category_objs["modifier"].get_rows(), [("stability_factor", "0.2")])
+
+    def test_literal_braces(self):
+        record = {"name": "{tag}_idea", Idea.FULL_NAME: "Idea of {tag}",
+                  "cancel": [{"Key": "any_owned_state", "Relation": "=", "Value": "{ is_core_of = ROOT }"}],
+                  PARAMS_KEY: {"tag": ["GER"]}}
+        idea, = IdeaTemplate.from_record(record).expand()
+        self.assertEqual(idea.category_objs["cancel"].get_rows(), [("any_owned_state", "=", "{ is_core_of = ROOT }")])
+        # literal braces around a placeholder
+        record["cancel"] = [{"Key": "any_owned_state", "Relation": "=", "Value": "{ is_core_of = {tag} }"}]
+        idea, = IdeaTemplate.from_record(record).expand()
+        self.assertEqual(idea.category_objs["cancel"].get_rows(), [("any_owned_state", "=", "{ is_core_of = GER }")])
+        # an unknown placeholder is still an error
+        self.assertRaises(KeyError, list, IdeaTemplate.from_record(dict(record, name="{x}")).expand())
@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Fast validation of generated Paradox code (ideas and gfx files)
+without parsing it into lists:
+
+  - balanced braces,
+  - key/value structure (key = value, key = { ... }),
+  - known relation operators, relations other than = only in triggers
+    (cancel and the other trigger blocks),
+  - duplicate idea names (ideas files) and sprite names (gfx files).
+
+The encoded code is first checked with bytes methods only (is_valid),
+which accepts the usual generated files. Only when this check fails the
+Validator goes through the code token by token and reports the problems
+with line and column, computed when a problem is reported.
+
+    python -m Hoi4SpiritWizard validate out/my_spirits.txt out/my_spirits.gfx
+"""
+import unittest
+import os
+import re
+import io
+import codecs
+import random
+from itertools import accumulate
+from .ideas import Idea, Modifier, Cancel
+
+PDX = Idea.PDX
+GFX = Idea.GFX
+KINDS = {Idea.PDX_SUFF: PDX, Idea.GFX_SUFF: GFX}
+TOP_KEYS = {PDX: Idea.IDEAS_KEY, GFX: Idea.SPRITE_TYPES}
+
+TOKEN_PATTERN = re.compile(r'(?P<word>[^\s{}<>!="#]+)|(?P<op>[<>!=]+)|(?P<open>\{)|(?P<close>\})'
+                           r'|(?P<string>"(?:[^"\\\n]|\\.)*")|(?P<comment>#[^\n]*)|(?P<space>\s+)'
+                           r'|(?P<bad>"[^\n]*)', re.ASCII)
+OPERATORS = frozenset(["=", "<", ">", "<=", ">=", "!="])
+# blocks holding triggers, where relations other than = are allowed
+TRIGGER_BLOCKS = frozenset([Cancel.get_name(), "limit", "allowed", "available", "visible", "trigger",
+                            "allowed_civil_war", "NOT", "AND", "OR"])
+MAX_DIAGNOSTICS = 100
+
+# fast path: every token (the parts of the code split at whitespace) is
+# mapped to a class byte, w for words, n for name, < for a relation of one
+# and ! for one of two characters
+TOKEN_CLASSES = {b"{": b"{", b"}": b"}", b"=": b"=", b"<": b"<", b">": b"<", b"<=": b"!", b">=": b"!",
+                 b"!=": b"!", Idea.NAME_KEY.encode(): b"n"}
+TOKEN_CLASSES = {token: ord(cls) for token, cls in TOKEN_CLASSES.items()}
+WORD_CLASS = ord("w")
+EQUALS = ord("=")
+SPECIAL_CHARS = b"{}<>!="
+# the structure: words, = for all operators, { and }
+STRUCTURE_TABLE = bytes.maketrans(b"n<!", b"w==")
+# a word before = is a key, so =w= is a value with an operator
+INVALID_STRUCTURES = (b"{=", b"}=", b"==", b"=}", b"=w=")
+OPEN = ord("{")
+# the change of the depth by a class byte
+DEPTH_STEPS = [1 if char == OPEN else -1 if char == ord("}") else 0 for char in range(256)]
+# strings are only single tokens between whitespace, braces and operators,
+# strings glued to other words or strings ("a""b") are left to the Validator
+DELIMITED = rb'(?<![^\s{}<>!=])%s(?![^\s{}<>!=])'
+QUOTED_WORD_PATTERN = re.compile(DELIMITED % rb'"([^\s{}<>!="#]+)"')
+STRING_PATTERN = re.compile(DELIMITED % rb'"[^"\\\n]*"')
+TRIGGER_TOKENS = frozenset(key.encode() for key in TRIGGER_BLOCKS)
+
+UNBALANCED_MSG = "unmatched }"
+UNCLOSED_MSG = "{} = {{ is never closed"
+STRING_MSG = "unterminated string"
+OPERATOR_MSG = "unknown operator {}"
+RELATION_MSG = "relation {} outside of a trigger block"
+NO_KEY_MSG = "operator {} without a key"
+NO_VALUE_MSG = "{} {} without a value"
+NO_OPERATOR_MSG = "block after {} without ="
+TOP_KEY_MSG = "unexpected top level key {}, expected {}"
+DUPLICATE_MSG = "duplicate {} {} (first at line {})"
+
+
+class Diagnostic:
+    """
+    A problem at line and column (1-based) of the code of source
+    """
+    def __init__(self, source, line, column, message):
+        self.source = source
+        self.line = line
+        self.column = column
+        self.message = message
+
+    def __str__(self):
+        return f"{self.source}:{self.line}:{self.column}: {self.message}"
+
+    def __repr__(self):
+        return f"Diagnostic({self})"
+
+
+class Validator:
+    """
+    Checks the code of an ideas (PDX) or gfx (GFX) file, kind None
+    only checks the syntax
+    """
+    def __init__(self, code, kind=None, source='<code>', max_diagnostics=MAX_DIAGNOSTICS):
+        self.code = code
+        self.kind = kind
+        self.source = source
+        self.max_diagnostics = max_diagnostics
+        self.diagnostics = []
+
+    def get_position(self, pos):
+        line = self.code.count("\n", 0, pos) + 1
+        return line, pos - self.code.rfind("\n", 0, pos)
+
+    def report(self, pos, message):
+        if len(self.diagnostics) < self.max_diagnostics:
+            self.diagnostics += [Diagnostic(self.source, *self.get_position(pos), message)]
+
+    def check_duplicate(self, names, name, pos, what):
+        first = names.setdefault(name, pos)
+        if first != pos:
+            self.report(pos, DUPLICATE_MSG.format(what, name, self.get_position(first)[0]))
+
+    def run(self):
+        """
+        Validates the code and returns the diagnostics
+        """
+        # blocks: (key, position, in a trigger) of the open blocks
+        blocks = []
+        in_trigger = False
+        key = key_pos = op = None
+        names = {}
+        ideas_depth = 2 if self.kind == PDX else None
+        for match in TOKEN_PATTERN.finditer(self.code):
+            kind = match.lastgroup
+            if kind == "space" or kind == "comment":
+                continue
+            pos = match.start()
+            if kind == "word" or kind == "string":
+                if op is None:
+                    # a new key, or a bare value if the last word was one too
+                    key, key_pos = match.group(), pos
+                    continue
+                if key == Idea.NAME_KEY and self.kind == GFX and len(blocks) == 2:
+                    self.check_duplicate(names, match.group().strip('"'), pos, "sprite")
+                key = op = None
+            elif kind == "op":
+                token = match.group()
+                if token not in OPERATORS:
+                    self.report(pos, OPERATOR_MSG.format(token))
+                elif token != "=" and not in_trigger:
+                    self.report(pos, RELATION_MSG.format(token))
+                if key is None:
+                    self.report(pos, NO_KEY_MSG.format(token))
+                    key, key_pos = "?", pos
+                elif op is not None:
+                    self.report(pos, NO_VALUE_MSG.format(key, op))
+                op = token
+            elif kind == "open":
+                if key is not None and op is None:
+                    self.report(pos, NO_OPERATOR_MSG.format(key))
+                if len(blocks) == 0 and self.kind is not None and key != TOP_KEYS[self.kind]:
+                    self.report(key_pos if key is not None else pos,
+                                TOP_KEY_MSG.format(key, TOP_KEYS[self.kind]))
+                if len(blocks) == ideas_depth and key is not None:
+                    self.check_duplicate(names, key, key_pos, "idea")
+                blocks += [(key, pos, in_trigger)]
+                in_trigger = in_trigger or key in TRIGGER_BLOCKS
+                key = op = None
+            elif kind == "close":
+                if op is not None:
+                    self.report(pos, NO_VALUE_MSG.format(key, op))
+                key = op = None
+                if len(blocks) == 0:
+                    self.report(pos, UNBALANCED_MSG)
+                    continue
+                in_trigger = blocks.pop()[2]
+            else:
+                self.report(pos, STRING_MSG)
+                key = op = None
+        if op is not None:
+            self.report(len(self.code), NO_VALUE_MSG.format(key, op))
+        for block_key, pos, _ in blocks:
+            self.report(pos, UNCLOSED_MSG.format(block_key))
+        return self.diagnostics
+
+
+def find_all(classes, cls):
+    """
+    The indices of the class byte cls in classes
+    """
+    return [match.start() for match in re.finditer(re.escape(cls), classes)]
+
+
+def is_valid(data, kind=None):
+    """
+    Fast check of the encoded code data with bytes methods, False means
+    it may be invalid and needs the full pass of the Validator
+    """
+    if b'"' in data:
+        data = STRING_PATTERN.sub(b"\0", QUOTED_WORD_PATTERN.sub(rb"\1", data))
+    if b'"' in data or b'#' in data:
+        return False
+    tokens = data.split()
+    classes = bytes([TOKEN_CLASSES.get(token, WORD_CLASS) for token in tokens])
+    # operators and braces not separated by whitespace are in word tokens,
+    # so there are more special characters than the tokens hold
+    nr_specials = sum(classes.count(cls) for cls in b"{}=<") + 2*classes.count(b"!")
+    if nr_specials != len(data) - len(data.translate(None, SPECIAL_CHARS)):
+        return False
+    structure = classes.translate(STRUCTURE_TABLE)
+    if structure.startswith(b"=") or structure.endswith(b"="):
+        return False
+    if any(pair in structure for pair in INVALID_STRUCTURES) or structure.count(b"w{") != structure.count(b"=w{"):
+        return False
+    return check_blocks(tokens, classes, structure, kind)
+
+
+def get_depths(marks):
+    """
+    The depth after each byte of marks, { opens and } closes a block
+    """
+    return list(accumulate([DEPTH_STEPS[mark] for mark in marks]))
+
+
+def check_blocks(tokens, classes, structure, kind):
+    """
+    Brace balance, top level keys, relations and duplicate names from the
+    depths of the braces
+    """
+    braces = structure.translate(None, b"w=")
+    depths = get_depths(braces)
+    if depths and (min(depths) < 0 or depths[-1] != 0):
+        return False
+    # the token indices of the braces
+    positions = find_all(structure.replace(b"}", b"{"), b"{")
+
+    def get_keys(starts):
+        """
+        The keys of the blocks starting at the token indices starts, None without key
+        """
+        return [tokens[start - 2] if structure[start - 1] == EQUALS else None for start in starts]
+
+    def get_depth_keys(depth):
+        return get_keys([pos for pos, brace, brace_depth in zip(positions, braces, depths)
+                         if brace == OPEN and brace_depth == depth])
+
+    if kind is not None and any(key != TOP_KEYS[kind].encode() for key in get_depth_keys(1)):
+        return False
+    names = []
+    if kind == PDX:
+        names = [name for name in get_depth_keys(3) if name is not None]
+    elif kind == GFX:
+        # the name tokens with the braces around them
+        marks = classes.translate(None, b"w=<!")
+        name_depths = [depth for mark, depth in zip(marks, get_depths(marks)) if mark == ord("n")]
+        names = [tokens[nr + 2] for nr, depth in zip(find_all(classes, b"n"), name_depths)
+                 if depth == 2 and structure[nr + 1:nr + 3] == b"=w"]
+    if len(set(names)) != len(names):
+        return False
+    marks = classes.replace(b"!", b"<").translate(None, b"wn=")
+    if b"<" in marks:
+        # the block of a relation is the { before it, relations after
+        # inner blocks are left to the Validator
+        if marks.startswith(b"<") or b"}<" in marks:
+            return False
+        # the brace before the relation with index pos is the brace pos - nr - 1,
+        # after nr relations before it
+        blocks = {pos - nr - 1 for nr, pos in enumerate(find_all(marks, b"<"))}
+        if not TRIGGER_TOKENS.issuperset(get_keys([positions[block] for block in blocks])):
+            return False
+    return True
+
+
+def get_kind(path):
+    return KINDS.get(os.path.splitext(path)[1].lower())
+
+
+def validate(code, kind=None, source='<code>'):
+    """
+    Returns the diagnostics of the code of a file of kind (PDX, GFX or None)
+    """
+    if is_valid(code.encode("utf-8"), kind):
+        return []
+    return Validator(code, kind=kind, source=source).run()
+
+
+def validate_data(data, kind=None, source='<code>'):
+    """
+    Returns the diagnostics of the UTF-8 encoded code data
+    """
+    data = data[len(codecs.BOM_UTF8):] if data.startswith(codecs.BOM_UTF8) else data
+    if is_valid(data, kind):
+        return []
+    return Validator(data.decode("utf-8"), kind=kind, source=source).run()
+
+
+def validate_file(path, kind=None):
+    """
+    Returns the diagnostics of the file path, the kind is taken from its suffix
+    """
+    with open(path, 'rb') as fp:
+        return validate_data(fp.read(), kind=kind or get_kind(path), source=path)
+
+########################
+# Tests                #
+########################
+
+class ValidatorTests(unittest.TestCase):
+    def make_ideas(self, nr_ideas=3):
+        ideas = []
+        for nr in range(nr_ideas):
+            idea = Idea(f"my_idea_{nr}")
+            idea.set_dict({Idea.GFX_FNAME: "gfx/interface/ideas/a.dds", Idea.FULL_NAME: "Idea",
+                           Idea.DESC: "Description"})
+            idea.set_category_objs(Modifier, [Modifier({"Key": "stability_factor", "Value": "0.1"}),
+                                              Modifier({"Key": "political_power_gain", "Value": "0.2"})])
+            idea.set_category_objs(Cancel, [Cancel({"Key": "num_of_factories", "Relation": ">",
+                                                    "Value": "10"})])
+            ideas += [idea]
+        return ideas
+
+    def render(self, ideas):
+        fps = [io.StringIO() for _ in range(3)]
+        Idea.stream_idea_files(ideas, *fps)
+        return fps[0].getvalue(), fps[2].getvalue()
+
+    def messages(self, code, kind=PDX):
+        return [(diagnostic.line, diagnostic.message) for diagnostic in validate(code, kind=kind)]
+
+    def test_generated(self):
+        gfx_code, pdx_code = self.render(self.make_ideas())
+        self.assertEqual(validate(pdx_code, kind=PDX), [])
+        self.assertEqual(validate(gfx_code, kind=GFX), [])
+        self.assertEqual(validate(self.render([])[1], kind=PDX), [])
+
+    def test_duplicates(self):
+        ideas = self.make_ideas()
+        ideas[2].name = ideas[0].name
+        gfx_code, pdx_code = self.render(ideas)
+        diagnostic, = validate(pdx_code, kind=PDX, source="a.txt")
+        self.assertIn("duplicate idea my_idea_0", diagnostic.message)
+        self.assertTrue(str(diagnostic).startswith(f"a.txt:{diagnostic.line}:"))
+        self.assertEqual(pdx_code.splitlines()[diagnostic.line - 1].strip()[:9], "my_idea_0")
+        self.assertEqual(len(validate(gfx_code, kind=GFX)), 1)
+
+    def test_braces(self):
+        code = "ideas = {\n    country = {\n        a = {\n        }\n    }\n"
+        self.assertEqual(self.messages(code), [(1, UNCLOSED_MSG.format("ideas"))])
+        self.assertEqual(self.messages(code + "}\n}\n"), [(7, UNBALANCED_MSG)])
+
+    def test_structure(self):
+        code = ('ideas = {\n country = {\n  a = {\n   modifier = {\n    x = \n   }\n'
+                '   rule {\n   }\n   = y\n   cancel = {\n    b > 1\n    c => 2\n   }\n'
+                '   modifier = {\n    d < 1\n    e = "open\n   }\n  }\n }\n}\n')
+        self.assertEqual(self.messages(code),
+                         [(6, NO_VALUE_MSG.format("x", "=")), (7, NO_OPERATOR_MSG.format("rule")),
+                          (9, NO_KEY_MSG.format("=")), (12, OPERATOR_MSG.format("=>")),
+                          (15, RELATION_MSG.format("<")), (16, STRING_MSG)])
+        diagnostic = validate("ideas = {\n  a = b = c\n}\n")[0]
+        self.assertEqual((diagnostic.line, diagnostic.column), (2, 9))
+        self.assertEqual(self.messages("spriteTypes = {\n}\n"), [(1, TOP_KEY_MSG.format("spriteTypes", "ideas"))])
+
+    FUZZ_KEYS = ["a", "b", "name", "cancel", "OR", "limit", "x.y", "1"]
+    FUZZ_VALUES = ["1", "yes", '"q"', '"a b"', '""', '"x#"', '"{"', "-0.5", "name", '"q""q"', 'q"q"', '"q"q']
+    FUZZ_OPS = ["=", "=", "=", "<", ">", "<=", ">=", "!="]
+
+    def make_block(self, rng, depth):
+        tokens = []
+        for _ in range(rng.randint(0, 3)):
+            key = rng.choice(self.FUZZ_KEYS + self.FUZZ_VALUES[:3])
+            if depth < 4 and rng.random() < 0.4:
+                tokens += [key, "=", "{"] + self.make_block(rng, depth + 1) + ["}"]
+            else:
+                tokens += [key, rng.choice(self.FUZZ_OPS), rng.choice(self.FUZZ_VALUES)]
+        return tokens
+
+    def make_snippet(self, rng):
+        """
+        Random nested blocks with a dropped or an extra token and glued tokens
+        """
+        tokens = [rng.choice(["ideas", "spriteTypes", "a"]), "=", "{"] + self.make_block(rng, 1) + ["}"]
+        if rng.random() < 0.3:
+            del tokens[rng.randrange(len(tokens))]
+        if rng.random() < 0.3:
+            tokens.insert(rng.randrange(len(tokens)), rng.choice(self.FUZZ_VALUES + self.FUZZ_OPS + ["{", "}", "# c\n"]))
+        seps = [rng.choice([" ", "\n", ""]) if rng.random() < 0.2 else " " for _ in tokens]
+        return ''.join(token + sep for token, sep in zip(tokens, seps))
+
+    def test_fuzz(self):
+        # the fast path never accepts code the Validator reports problems in
+        rng = random.Random(0)
+        for _ in range(20000):
+            code = self.make_snippet(rng)
+            kind = rng.choice([None, PDX, GFX])
+            if is_valid(code.encode(), kind):
+                self.assertEqual(Validator(code, kind=kind).run(), [], (code, kind))
+
+    def test_fast_path(self):
+        gfx_code, pdx_code = self.render(self.make_ideas())
+        self.assertTrue(is_valid(pdx_code.encode(), PDX))
+        self.assertTrue(is_valid(gfx_code.encode(), GFX))
+        self.assertEqual(validate_data(codecs.BOM_UTF8 + pdx_code.encode(), kind=PDX), [])
+        # comments, glued tokens and relations after inner blocks are left to the Validator
+        for code in ['ideas = { # comment\n}\n', 'ideas = {\n country={\n }\n}\n',
+                     'ideas = { c = { a = { cancel = { OR = { b > 1 } c < 2 } } } }\n']:
+            self.assertFalse(is_valid(code.encode(), PDX))
+            self.assertEqual(validate(code, kind=PDX), [])
+        for code in ['a = "q""q" { }\n', 'a = q"q" { }\n', 'a = "q"q { }\n', 'a = "a b""q" { }\n']:
+            self.assertFalse(is_valid(code.encode()))
+            self.assertNotEqual(validate(code), [])
+        code = ('spriteTypes = {\n spriteType = { name = "GFX_a" texturefile = "gfx/a b.dds" }\n'
+                ' spriteType = { name = GFX_a }\n}\n')
+        self.assertFalse(is_valid(code.encode(), GFX))
+        self.assertEqual(self.messages(code, kind=GFX), [(3, DUPLICATE_MSG.format("sprite", "GFX_a", 2))])
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Watch mode: polls a directory of spec files and rebuilds the gfx,
+localisation and ideas files of each spec file (named after it) when
+it changes:
+
+    python -m Hoi4SpiritWizard watch specs/ -o out/
+
+The rendered blocks of each spec record are kept by the record's
+content, so after an edit only the changed records are rendered again,
+and only the output files whose content changed are rewritten. A burst
+of changes (e.g. an editor saving several files) is built once, after
+the files were quiet for the debounce time, or at the latest after the
+maximum wait, so a file rewritten all the time is still built. Spec
+files of the same name with different extensions (e.g. a.jsonl and
+a.csv) would write the same output files and are reported instead.
+"""
+import unittest
+import os
+import io
+import json
+import time
+import functools
+import tempfile
+import threading
+from .ideas import Idea
+from . import specs
+from . import output
+
+INTERVAL = 0.02
+DEBOUNCE = 0.05
+MAX_WAIT = 1.0
+STEM_ERROR_MSG = "Error: {} writes the same files as {}!"
+SUFFIXES = (Idea.GFX_SUFF, Idea.LOC_SUFF, Idea.PDX_SUFF)
+
+
+class WatchResult:
+    """
+    The outcome of rebuilding the outputs of a spec file
+    """
+    def __init__(self, path, rendered=0, written=None, removed=None, error=None):
+        self.path = path
+        self.rendered = rendered
+        self.written = [] if written is None else written
+        self.removed = [] if removed is None else removed
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __str__(self):
+        if self.error is not None:
+            return f"{self.path}: {self.error}"
+        if self.removed:
+            return f"{self.path}: removed {', '.join(self.removed)}"
+        written = ', '.join(self.written) if self.written else "no files changed"
+        return f"{self.path}: rendered {self.rendered} ideas, {written}"
+
+
+class Watcher:
+    """
+    Builds the spec files of spec_dir into out_dir and keeps them up to date
+    """
+    def __init__(self, spec_dir, out_dir='', lang='english', fmt=None, interval=INTERVAL,
+                 debounce=DEBOUNCE, max_wait=MAX_WAIT):
+        self.spec_dir = spec_dir
+        self.out_dir = out_dir
+        self.lang = lang
+        self.fmt = fmt
+        self.interval = interval
+        self.debounce = debounce
+        self.max_wait = max_wait
+        # stamps of the spec files, blocks by record content and written code by spec file
+        self.stamps = {}
+        self.blocks = {}
+        self.codes = {}
+        # the spec files sharing their output files with others, by path
+        self.collisions = {}
+
+    def scan(self):
+        """
+        Returns the (mtime, size) of the spec files by path
+        """
+        stamps = {}
+        with os.scandir(self.spec_dir) as entries:
+            for entry in entries:
+                ext = os.path.splitext(entry.name)[1].lower()
+                if (self.fmt is not None or ext in specs.FORMATS) and entry.is_file():
+                    stat = entry.stat()
+                    stamps[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    @staticmethod
+    def get_prefix(path):
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def get_file_names(self, path):
+        return [os.path.join(self.out_dir, self.get_prefix(path) + suff) for suff in SUFFIXES]
+
+    def get_collisions(self, stamps):
+        """
+        Returns the other spec files with the same output files
+        by spec file, for the spec files having any
+        """
+        paths = {}
+        for path in sorted(stamps):
+            paths.setdefault(self.get_prefix(path), []).append(path)
+        return {path: [other for other in same if other != path]
+                for same in paths.values() if len(same) > 1 for path in same}
+
+    def read_keyed(self, path):
+        """
+        Yields a key of the content of each record of the spec file path and
+        a function returning the record. The lines of a JSON Lines file are
+        their own keys, so unchanged lines are not even parsed.
+        """
+        if specs.get_format(path, self.fmt) != specs.JSONL:
+            for record in specs.read_records([path], fmt=self.fmt):
+                yield json.dumps(record, sort_keys=True), lambda record=record: record
+            return
+        with open(path, newline='') as fp:
+            for nr, line in enumerate(fp, 1):
+                line = line.strip()
+                if line:
+                    yield line, functools.partial(self.parse_line, line, path, nr)
+
+    @staticmethod
+    def parse_line(line, path, nr):
+        record = json.loads(line)
+        if not record.get(Idea.NAME_KEY):
+            raise ValueError(specs.NAME_ERROR_MSG.format(path, nr))
+        return record
+
+    @staticmethod
+    def render_record(record):
+        """
+        Returns the gfx, localisation and ideas blocks of the ideas of a record
+        """
+        return [(idea.get_gfx_block(), idea.write_localisation(), idea.get_paradox_block())
+                for idea in specs.record2ideas(record)]
+
+    def join_codes(self, blocks):
+        if len(blocks) == 0:
+            fps = [io.StringIO() for _ in SUFFIXES]
+            Idea.stream_idea_files([], *fps, lang=self.lang)
+            return [fp.getvalue() for fp in fps]
+        gfx_head, gfx_tail = Idea.gfx_frame()
+        pdx_head, pdx_tail = Idea.paradox_frame()
+        gfx_blocks, loc_blocks, pdx_blocks = zip(*blocks)
+        return [gfx_head + ''.join(gfx_blocks) + gfx_tail,
+                f"l_{self.lang}:\n" + ''.join(loc_blocks),
+                pdx_head + ''.join(pdx_blocks) + pdx_tail]
+
+    def rebuild(self, path):
+        """
+        Renders the changed records of the spec file path and
+        rewrites its output files whose content changed
+        """
+        # the blocks of the last two builds, so a file read while it was
+        # saved does not drop the blocks of the records missing in it
+        old_blocks, older_blocks = self.blocks.get(path, ({}, {}))
+        new_blocks = {}
+        keys = []
+        rendered = 0
+        for key, get_record in self.read_keyed(path):
+            keys += [key]
+            if key in new_blocks:
+                continue
+            if key in old_blocks:
+                new_blocks[key] = old_blocks[key]
+            elif key in older_blocks:
+                new_blocks[key] = older_blocks[key]
+            else:
+                new_blocks[key] = self.render_record(get_record())
+                rendered += len(new_blocks[key])
+        codes = self.join_codes([block for key in keys for block in new_blocks[key]])
+        old_codes = self.codes.get(path, [None]*len(SUFFIXES))
+        written = []
+        with output.Transaction() as transaction:
+            for fname, code, old_code in zip(self.get_file_names(path), codes, old_codes):
+                if code != old_code:
+                    transaction.write(code, fname)
+                    written += [fname]
+        self.blocks[path] = (new_blocks, old_blocks)
+        self.codes[path] = codes
+        return WatchResult(path, rendered=rendered, written=written)
+
+    def remove(self, path):
+        """
+        Removes the output files of the deleted spec file path
+        """
+        removed = []
+        for fname in self.get_file_names(path):
+            if os.path.isfile(fname):
+                os.remove(fname)
+                removed += [fname]
+        self.blocks.pop(path, None)
+        self.codes.pop(path, None)
+        return WatchResult(path, removed=removed)
+
+    def update(self, stamps=None):
+        """
+        Rebuilds the spec files changed since the last update and returns
+        a WatchResult for each. A broken spec file keeps its old outputs,
+        and so do spec files writing the same output files, which are
+        built again once only one of them is left.
+        """
+        stamps = self.scan() if stamps is None else stamps
+        collisions = self.get_collisions(stamps)
+        results = []
+        for path in sorted(set(self.stamps).union(stamps)):
+            if path in collisions:
+                if stamps[path] != self.stamps.get(path) or path not in self.collisions:
+                    error = ValueError(STEM_ERROR_MSG.format(path, ', '.join(collisions[path])))
+                    results += [WatchResult(path, error=error)]
+                continue
+            if stamps.get(path) == self.stamps.get(path) and path not in self.collisions:
+                continue
+            if path not in stamps:
+                if path in self.collisions:
+                    # the output files belong to the spec file left
+                    self.blocks.pop(path, None)
+                    self.codes.pop(path, None)
+                else:
+                    results += [self.remove(path)]
+                continue
+            try:
+                results += [self.rebuild(path)]
+            except (OSError, ValueError, KeyError) as exc:
+                results += [WatchResult(path, error=exc)]
+        self.stamps = stamps
+        self.collisions = collisions
+        return results
+
+    def run(self, stop=None, report=print):
+        """
+        Polls the spec directory until stop (a threading.Event) is set and
+        reports the results of each update. Changes are built once the specs
+        were unchanged for the debounce time, but at most max_wait after
+        the first change.
+        """
+        stop = threading.Event() if stop is None else stop
+        for result in self.update():
+            report(result)
+        last = self.stamps
+        first_at = changed_at = None
+        while not stop.wait(self.interval):
+            stamps = self.scan()
+            now = time.monotonic()
+            if stamps != last:
+                last = stamps
+                changed_at = now
+                first_at = now if first_at is None else first_at
+            if first_at is None:
+                continue
+            if now - changed_at >= self.debounce or now - first_at >= self.max_wait:
+                first_at = changed_at = None
+                for result in self.update(stamps):
+                    report(result)
+
+########################
+# Tests                #
+########################
+
+class WatchTests(unittest.TestCase):
+    RECORD = ('{{"name": "{name}", "GFXFileName": "gfx/interface/ideas/a.dds", "FullName": "{full}", '
+              '"Description": "Desc", "modifier": [{{"Key": "stability_factor", "Value": {value}}}]}}\n')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.spec_dir = os.path.join(self.tmp_dir.name, "specs")
+        self.out_dir = os.path.join(self.tmp_dir.name, "out")
+        os.makedirs(self.spec_dir)
+        os.makedirs(self.out_dir)
+        self.spec_file = os.path.join(self.spec_dir, "spirits.jsonl")
+        self.watcher = Watcher(self.spec_dir, self.out_dir)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_spec(self, values, full="Idea"):
+        with open(self.spec_file, 'w') as fp:
+            for nr, value in enumerate(values):
+                fp.write(self.RECORD.format(name=f"my_idea_{nr}", full=full, value=value))
+        # the stamp must change even on a coarse file system clock
+        stat = os.stat(self.spec_file)
+        os.utime(self.spec_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_update(self):
+        self.write_spec([0.1, 0.2, 0.3])
+        gfx_file, loc_file, pdx_file = self.watcher.get_file_names(self.spec_file)
+        result, = self.watcher.update()
+        self.assertEqual((result.rendered, result.written), (3, [gfx_file, loc_file, pdx_file]))
+        fps = [io.StringIO() for _ in SUFFIXES]
+        Idea.stream_idea_files(specs.load_ideas([self.spec_file]), *fps)
+        for fname, fp in zip(result.written, fps):
+            with open(fname, encoding=output.get_encoding(fname)) as out_fp:
+                self.assertEqual(out_fp.read(), fp.getvalue())
+        # the localisation has a line per entry
+        with open(loc_file, encoding=output.get_encoding(loc_file)) as fp:
+            self.assertEqual(len(fp.read().splitlines()), 1 + 2*3)
+        self.assertEqual(self.watcher.update(), [])
+        # a changed modifier renders one idea and only touches the ideas file
+        self.write_spec([0.1, 0.25, 0.3])
+        result, = self.watcher.update()
+        self.assertEqual((result.rendered, result.written), (1, [pdx_file]))
+        with open(pdx_file, encoding="utf-8") as fp:
+            self.assertIn("0.25", fp.read())
+        # a broken spec keeps the outputs
+        with open(self.spec_file, 'a') as fp:
+            fp.write("{no json\n")
+        result, = self.watcher.update()
+        self.assertFalse(result.ok)
+        self.assertTrue(os.path.isfile(pdx_file))
+        # so does a row without a field, of a record or of a template
+        for record in ['{"name": "my_idea_0", "modifier": [{"Key": "stability_factor"}]}\n',
+                       '{"name": "my_idea_{x}", "modifier": [{"Value": "{x}"}], "params": {"x": [1, 2]}}\n']:
+            with open(self.spec_file, 'w') as fp:
+                fp.write(record)
+            result, = self.watcher.update(stamps={self.spec_file: record})
+            self.assertIsInstance(result.error, ValueError)
+            self.assertTrue(os.path.isfile(pdx_file))
+        os.remove(self.spec_file)
+        result, = self.watcher.update()
+        self.assertEqual(result.removed, [gfx_file, loc_file, pdx_file])
+        self.assertEqual(os.listdir(self.out_dir), [])
+
+    def test_run(self):
+        self.write_spec([0.1, 0.2])
+        results = []
+        stop = threading.Event()
+        thread = threading.Thread(target=self.watcher.run, kwargs={"stop": stop, "report": results.append})
+        thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            while len(results) == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.write_spec([0.1, 0.2], full="Renamed")
+            while len(results) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual([result.rendered for result in results], [2, 2])
+        self.assertEqual(len(results[1].written), 1)
+        self.assertTrue(results[1].written[0].endswith(Idea.LOC_SUFF))
+
+    def test_run_max_wait(self):
+        # a spec rewritten faster than the debounce time is built after the maximum wait
+        self.write_spec([0.1])
+        self.watcher.update()
+        self.watcher.debounce, self.watcher.max_wait = 60, 0.2
+        results = []
+        stop = threading.Event()
+        thread = threading.Thread(target=self.watcher.run, kwargs={"stop": stop, "report": results.append})
+        thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            value = 0.1
+            while len(results) == 0 and time.monotonic() < deadline:
+                value += 0.01
+                self.write_spec([value])
+                time.sleep(self.watcher.interval)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual(len(results), 1)
+        self.assertTrue(results[0].ok)
+
+    def test_collisions(self):
+        self.write_spec([0.1])
+        self.watcher.update()
+        gfx_file, loc_file, pdx_file = self.watcher.get_file_names(self.spec_file)
+        with open(pdx_file, encoding="utf-8") as fp:
+            code = fp.read()
+        csv_file = os.path.join(self.spec_dir, "spirits.csv")
+        with open(csv_file, 'w') as fp:
+            fp.write("name,GFXFileName,PictureName,FullName,Description,category,Key,Relation,Value\n"
+                     "my_idea_0,gfx/interface/ideas/a.dds,,CSV Idea,Desc,modifier,stability_factor,,0.5\n")
+        # both spec files are reported and the outputs are kept
+        results = self.watcher.update()
+        self.assertEqual([result.path for result in results], [csv_file, self.spec_file])
+        for result, other in zip(results, [self.spec_file, csv_file]):
+            self.assertIsInstance(result.error, ValueError)
+            self.assertIn(other, str(result))
+        self.assertEqual(self.watcher.update(), [])
+        with open(pdx_file, encoding="utf-8") as fp:
+            self.assertEqual(fp.read(), code)
+        # the spec file left builds the outputs again
+        os.remove(self.spec_file)
+        result, = self.watcher.update()
+        self.assertEqual((result.path, result.written), (csv_file, [gfx_file, loc_file, pdx_file]))
+        with open(pdx_file, encoding="utf-8") as fp:
+            self.assertIn("0.5", fp.read())
@@ -4,14 +4,27 @@ import multiprocessing
 import sys
 import os
 from .ideas import Idea
+from .symbols import SymbolIndex
+from .rows_view import RowsView
+from .workspace import Workspace
+from .journal import Journal
+from .catalogue import Catalogue, CATEGORY_KINDS
+from . import jobs
+from . import output
 
 import tkinter as tk
 from tkinter import dialog as Dialog
 from tkinter import filedialog as tkFileDialog
 from tkinter import messagebox as tkMessageBox 
 from tkinter import simpledialog as tkSimpleDialog
+from tkinter import ttk
 
 class WizardGui(tk.Frame):
+    # ms between two looks at the messages of a running write
+    POLL_INTERVAL = 50
+    # ms between the first edit after an autosave and the next autosave
+    AUTOSAVE_DELAY = 500
+    SCRATCH_FILE = os.path.join(os.path.expanduser("~"), ".hoi4sw_scratch")
 
     def __init__(self,master=None,**options):
         """
@@ -29,40 +42,111 @@ class WizardGui(tk.Frame):
         self.spacers = []
         self.cat_add_buttons = {}
         self.cat_rem_buttons = {}
-        self.cat_start_row = {}
-        self.cat_end_row = {}
-        self.cat_row_dist = {}
-        self.cat_start_col = {}
-        self.cat_end_col = {}
-        self.cat_entries = {}
+        # scrollable rows of the categories
+        self.cat_views = {}
         self.category_map = {cat.get_name(): cat for cat in Idea.CATEGORIES}
+        # index of the symbols of a mod and the base game, to check for collisions
+        self.symbols = None
+        self.mod_dir = None
+        self.game_dir = None
+        # known keys, for the completion and the check of the category keys
+        self.catalogue = Catalogue.bundled()
+        # write or scan running in the background, job_done is called on the GUI thread after it
+        self.write_job = None
+        self.job_title = None
+        self.job_done_text = None
+        self.job_done = None
+        # the ideas, only the open one has an editor panel
+        self.workspace = Workspace()
+        self.panel = None
+        self.current = None
+        # autosave of the workspace
+        self.scratch_file = self.SCRATCH_FILE
+        self.journal = Journal(self.scratch_file)
+        self.autosave_id = None
         
         # Make x Button use inside method
         self.master.protocol("WM_DELETE_WINDOW", self.close_app)
         
         self.set_gui()
-        #self.getScratch(self.scratch_file)
+        self.get_scratch()
+
+    def get_scratch(self):
+        """
+        Offers the ideas autosaved by the last session
+        """
+        state = self.journal.load()
+        if len(state["ideas"]) == 0:
+            return
+        if not tkMessageBox.askyesno("Recover", f"Recover the {len(state['ideas'])} ideas "
+                                     "of the last session?"):
+            self.journal.clear()
+            return
+        self.workspace.file_prefix = state["file_prefix"]
+        for name, texts in state["ideas"].items():
+            self.workspace.add(name)
+            self.workspace.store(name, texts["fields"], texts["rows"])
+            self.idea_list.insert(tk.END, name)
+
+    def schedule_autosave(self, *args):
+        """
+        Autosaves the open idea AUTOSAVE_DELAY ms after the first edit
+        since the last autosave, so steady typing is saved regularly
+        """
+        if self.current is not None and self.autosave_id is None:
+            self.autosave_id = self.after(self.AUTOSAVE_DELAY, self.autosave)
+
+    def autosave(self):
+        self.autosave_id = None
+        if self.current is not None:
+            # only the texts are taken here, the writer thread does the rest
+            self.journal.store(self.current, *self.get_panel_texts())
 
     def set_gui(self):
         self.master.title("HOI4 Idea Wizard")
         self.setup_menu()
+        self.set_idea_list(0, 0)
+
+    def set_idea_list(self, row, col):
+        """
+        The ideas of the workspace on the left
+        """
+        self.list_frame = tk.Frame(self.master)
+        self.list_frame.grid(row=row, column=col, sticky="ns")
+        self.set_label(0, 0, "Ideas:", master=self.list_frame, columnspan=2)
+        self.idea_list = tk.Listbox(self.list_frame, exportselection=False, height=20)
+        self.idea_list.grid(row=1, column=0, columnspan=2, sticky="ns")
+        scrollbar = tk.Scrollbar(self.list_frame, orient=tk.VERTICAL, command=self.idea_list.yview)
+        scrollbar.grid(row=1, column=2, sticky="ns")
+        self.idea_list.config(yscrollcommand=scrollbar.set)
+        self.idea_list.bind("<<ListboxSelect>>", self.on_select)
+        self.set_button(2, 0, " + ", self.start_new_idea, master=self.list_frame,
+                        fg='#00FF00', bg='#000000')
+        self.set_button(2, 1, " - ", self.remove_idea, master=self.list_frame,
+                        fg='#FF0000', bg='#000000')
+        self.set_write_button(3, 0)
+
+    def build_panel(self):
+        """
+        Builds the editor widgets, once. They are reused for every
+        idea opened, so their number does not grow with the workspace.
+        """
+        self.panel = tk.Frame(self.master)
         self.set_basic_params(1,1)
-        self.write_button_col = 0
         row, col  = self.set_idea_fields(2,1)
-        self.spacer = self.set_label(row, col,"")
+        self.spacer = self.set_label(row, col,"", master=self.panel)
         row += 1;
         for cat in Idea.CATEGORIES:
             row, col = self.init_category(cat, row, col)
-        
-        self.set_write_button(row+1,self.write_button_col)
-        self.write_button_row = row+1
-        
-
+        for entry in self.entries.values():
+            entry.bind("<KeyRelease>", self.schedule_autosave)
+        for view in self.cat_views.values():
+            view.listeners.append(self.schedule_autosave)
 
     def set_basic_params(self, row, col):
-        self.labels[Idea.NAME_KEY] = tk.Label(self.master,text='Idea Name: ')
+        self.labels[Idea.NAME_KEY] = tk.Label(self.panel,text='Idea Name: ')
         self.labels[Idea.NAME_KEY].grid(row=row, column=col,columnspan=1, rowspan=1)
-        self.entries[Idea.NAME_KEY] = self.set_entry(row, col +1 )
+        self.entries[Idea.NAME_KEY] = self.set_entry(row, col +1, master=self.panel)
 
     def set_idea_fields(self, row, col):
         for key in Idea.KEYS:
@@ -71,123 +155,118 @@ class WizardGui(tk.Frame):
         return row, col
 
     def set_idea_row(self, row, col, key):
-        self.labels[key] = self.set_label(row, col, key)
-        self.entries[key] = self.set_entry(row, col + 1)
+        self.labels[key] = self.set_label(row, col, key, master=self.panel)
+        self.entries[key] = self.set_entry(row, col + 1, master=self.panel)
 
     def init_category(self, category_cls, row, col):
+        """
+        Sets up the label, the scrollable rows and the +/- buttons of
+        a category. The category keeps its grid rows however many
+        rows it holds.
+        """
         cat_name = category_cls.get_name()
         orig_col = col
-        self.cat_start_row[cat_name] = row
-        self.cat_start_col[cat_name] = col
-        self.labels[cat_name] = self.set_label(row, col, cat_name + ': ')
-        self.cat_entries[cat_name] = []
-        
+        self.labels[cat_name] = self.set_label(row, col, cat_name + ': ', master=self.panel)
         row += 1; col += 1
-        for i, key in enumerate(category_cls.get_fields()):
-            self.labels[cat_name+key] = self.set_label(row, col+i, key, anchor="center", columnspan=1)
-        row +=1; col += 1
-        self.cat_end_row[cat_name] = row
-        self.cat_end_col[cat_name] = col
+        fields = category_cls.get_fields()
+        kind = CATEGORY_KINDS[cat_name]
+        completers = {"Key": lambda prefix: self.catalogue.complete(prefix, kind)}
+        self.cat_views[cat_name] = RowsView(self.panel, fields, completers=completers)
+        self.cat_views[cat_name].grid(row=row, column=col, columnspan=len(fields), sticky="w")
+        col += len(fields)
         def add_category_line(): self.add_category_line(category_cls)
         self.cat_add_buttons[cat_name] = self.set_button(row,col,' + ', add_category_line,
+                                                         master=self.panel,
                                                          fg='#00FF00', bg='#000000')
  
         def rem_category_line(): self.rem_category_line(category_cls)
         self.cat_rem_buttons[cat_name] = self.set_button(row,col+1,' - ', rem_category_line,
+                                                         master=self.panel,
                                                          fg='#FF0000', bg='#000000')
-        
-        self.cat_row_dist[cat_name] = self.cat_end_row[cat_name] - self.cat_start_row[cat_name]
-        
         return row + 1, orig_col
 
-    def get_categories_below(self, category_cls):
-        cat_name = category_cls.get_name()
-        ind = self.cat_end_row[cat_name]
-        below = [cat for cat in Idea.CATEGORIES if self.cat_start_row[cat.get_name()] >= ind]
-        return below
-
-    def shift_write_button(self, shift):
-        self.write_button_row += shift
-        self.writeButton.grid(row=self.write_button_row,
-                              column=self.write_button_col) 
-    
-    def shift_category(self, category_cls, shift=-1):
-        cat_name = category_cls.get_name()
-        cat_srow = self.cat_start_row[cat_name]
-        
-        cat_col = self.cat_start_col[cat_name]
-        # shift labels
-        self.labels[cat_name].grid(row=cat_srow + shift, column=cat_col)
-        for i, key in enumerate(category_cls.get_fields()):
-            self.labels[cat_name+key].grid(row=cat_srow + shift + 1, column=cat_col+1+i)
-        # shift entries
-        entries = self.cat_entries[cat_name]
-        for k,entry in enumerate(entries):
-            for i, key in enumerate(category_cls.get_fields()):
-                entry[key].grid(row=cat_srow+k+shift + 2, column=cat_col+i+1)
-
-        self.cat_add_buttons[cat_name].grid(row=cat_srow+shift+3+len(entries),
-                                            column=cat_col+len(category_cls.get_fields())+1)
-        self.cat_rem_buttons[cat_name].grid(row=cat_srow+shift+3+len(entries),
-                                            column=cat_col+len(category_cls.get_fields())+2)
-        
-        self.cat_start_row[cat_name] += shift
-        self.cat_end_row[cat_name] += shift
-        self.shift_write_button(shift)
-        
-    
     def add_category_line(self, category_cls):
-        cat_name = category_cls.get_name()
-        fields = {}
-        col = self.cat_start_col[cat_name] + 1
-        self.cat_end_row[cat_name] += 1
-        row = self.cat_end_row[cat_name]
-        
-        for i, key in enumerate(category_cls.get_fields()):
-            col += i
-            if key == "Relation":
-                width=2
+        self.cat_views[category_cls.get_name()].add_row()
+        self.schedule_autosave()
+    
+    def rem_category_line(self, category_cls):
+        self.cat_views[category_cls.get_name()].remove_row()
+        self.schedule_autosave()
+
+    def open_idea(self, name):
+        """
+        Stores the texts of the open idea and shows the idea name in the panel
+        """
+        if self.panel is None:
+            self.build_panel()
+        else:
+            self.store_idea()
+        fields, rows = self.workspace.get_texts(self.workspace.get(name))
+        self.set_entry_text(self.entries[Idea.NAME_KEY], name)
+        for key, text in fields.items():
+            self.set_entry_text(self.entries[key], text)
+        for cat_name, view in self.cat_views.items():
+            view.set_rows(rows[cat_name])
+        self.current = name
+        self.panel.grid(row=0, column=1, sticky="nw")
+
+    def store_idea(self):
+        """
+        Stores the texts of the panel in the open idea, a new name renames it
+        """
+        if self.current is None:
+            return
+        name = self.entries[Idea.NAME_KEY].get()
+        if name not in ('', self.current):
+            try:
+                self.workspace.rename(self.current, name)
+            except ValueError as error:
+                tkMessageBox.showwarning("Name Taken", str(error))
             else:
-                width=20
-            fields[key] = self.set_entry(row, col, width=width,columnspan=1)
-        col +=1
-        
-        self.cat_entries[cat_name] += [fields]
-        self.cat_add_buttons[cat_name].grid(row=row,column=col+1)
-        self.cat_rem_buttons[cat_name].grid(row=row,column=col+2)
-        self.writeButton.grid(row=self.cat_end_row[cat_name]+1,
-                              column=self.write_button_col)
+                index = self.workspace.get_names().index(name)
+                self.idea_list.delete(index)
+                self.idea_list.insert(index, name)
+                self.idea_list.selection_set(index)
+                self.journal.rename(self.current, name)
+                self.current = name
+        fields, rows = self.get_panel_texts()
+        self.workspace.store(self.current, fields, rows)
+        self.journal.store(self.current, fields, rows)
 
-        below = self.get_categories_below(category_cls)
-        for bcat in below:
-            self.shift_category(bcat,shift=1)
+    def get_panel_texts(self):
+        fields = {key: self.entries[key].get() for key in Idea.KEYS}
+        rows = {cat_name: view.get_rows() for cat_name, view in self.cat_views.items()}
+        return fields, rows
 
-        self.shift_write_button(1)
-    
-    def rem_category_line(self, category_cls):
-        cat_name = category_cls.get_name()
-        if self.cat_end_row[cat_name] - self.cat_start_row[cat_name] <= self.cat_row_dist[cat_name]:
+    def close_idea(self):
+        self.store_idea()
+        self.current = None
+        if self.panel is not None:
+            self.panel.grid_remove()
+        self.idea_list.selection_clear(0, tk.END)
+
+    def on_select(self, event):
+        selection = self.idea_list.curselection()
+        if len(selection) == 0:
             return
-        
-        entries = self.cat_entries[cat_name].pop()
-        for entry in entries.values():
-            self.remove(entry)
-        self.cat_end_row[cat_name] -= 1
-        row = self.cat_end_row[cat_name]
-        col = self.cat_end_col[cat_name]
-        self.cat_add_buttons[cat_name].grid(row=row,column=col+1)
-        self.cat_rem_buttons[cat_name].grid(row=row,column=col+2)
-        self.shift_write_button(-1)
-
-    def write_category(self, category_cls):
-        cat_name = category_cls.get_name()
-        entry_rows = self.cat_entries[cat_name]
-        cobjs = []
-        for entry_row in entry_rows:
-            cobjs += [category_cls({key:val.get() for key,val in entry_row.items()})]
-        self.idea.set_category_objs(category_cls, cobjs)
-        
-        
+        name = self.idea_list.get(selection[0])
+        if name != self.current:
+            self.open_idea(name)
+
+    def remove_idea(self):
+        selection = self.idea_list.curselection()
+        if len(selection) == 0:
+            return
+        name = self.idea_list.get(selection[0])
+        if not tkMessageBox.askyesno("Remove Idea", f"Remove {name}?"):
+            return
+        if name == self.current:
+            self.current = None
+            self.panel.grid_remove()
+        self.workspace.remove(name)
+        self.journal.remove(name)
+        self.idea_list.delete(selection[0])
+
     def set_entry(self,row,col, master = None, columnspan=2, **kwargs):
         master = self.master if master is None else master
         entry = tk.Entry(master,**kwargs)
@@ -211,40 +290,177 @@ class WizardGui(tk.Frame):
         widget.destroy()
     
     def set_write_button(self,row,col):
-        self.writeButton = tk.Button(self.master, text="Write", command=self.write_idea)
-        self.writeButton.grid(row=row,column=col)
-
-    def fields2idea(self):
-        for key, entry in self.entries.items():
-            content = entry.get()
-            if content == '':
-                if tkMessageBox.showwarning("Entry Missing", Idea.MISSING_ERROR_MSG.format(key)):
-                    pass
-                return
-            else:
-                setattr(self.idea, key, content)
+        self.writeButton = tk.Button(self.list_frame, text="Write All", command=self.write_all)
+        self.writeButton.grid(row=row,column=col,columnspan=2)
+
+    def check_missing(self):
+        """
+        Warns about the first missing field of the workspace
+        """
+        missing = self.workspace.get_missing()
+        if len(missing) == 0:
+            return True
+        name, key = missing[0]
+        if tkMessageBox.showwarning("Entry Missing", name + ": " + Idea.MISSING_ERROR_MSG.format(key)):
+            pass
+        return False
 
-        for category_cls in Idea.CATEGORIES:
-            self.write_category(category_cls)
-                
     def get_file_names(self):
-        gfx_file = self.file_prefix + Idea.GFX_SUFF
-        loc_file = self.file_prefix + Idea.LOC_SUFF
-        pdx_file = self.file_prefix + Idea.PDX_SUFF
-        return gfx_file, loc_file, pdx_file
+        return self.workspace.get_file_names()
                 
-    def write_idea(self):
-        self.fields2idea()
-        idea_list = [self.idea]
+    def check_symbols(self, idea_list):
+        """
+        Asks whether to write anyway if symbols are already defined in the mod,
+        the symbol index is refreshed by a job before (see write_all)
+        """
+        if self.symbols is None:
+            return True
+        collisions = self.symbols.find_collisions(idea_list, ignore=self.get_file_names())
+        if len(collisions) == 0:
+            return True
+        text = '\n'.join(self.symbols.get_messages(collisions))
+        return tkMessageBox.askyesno("Already Defined", text + "\n\nWrite anyway?")
+
+    def check_keys(self, idea_list):
+        """
+        Asks whether to write anyway if keys are not in the catalogue
+        """
+        unknown = self.catalogue.find_unknown(idea_list)
+        if len(unknown) == 0:
+            return True
+        text = '\n'.join(self.catalogue.get_messages(unknown))
+        return tkMessageBox.askyesno("Unknown Keys", text + "\n\nWrite anyway?")
+
+    def set_game_dir(self):
+        """
+        Loads the keys of the game documentation, the symbols of the
+        base game are checked along with the ones of the mod
+        """
+        if self.write_job is not None:
+            return
+        game_dir = tkFileDialog.askdirectory(title="Game Directory")
+        if not game_dir:
+            return
+        self.game_dir = game_dir
+        found = self.catalogue.load_documentation(game_dir)
+        tkMessageBox.showinfo("Key Catalogue", f"{found} keys found in the game documentation.")
+        self.scan_symbols()
+
+    def set_mod_dir(self):
+        if self.write_job is not None:
+            return
+        mod_dir = tkFileDialog.askdirectory(title="Mod Directory")
+        if not mod_dir:
+            return
+        self.mod_dir = mod_dir
+        self.scan_symbols()
+
+    def scan_symbols(self):
+        """
+        Indexes the symbols of the mod and the base game in a job
+        """
+        if self.mod_dir is None:
+            return
+        roots = [self.mod_dir] + ([] if self.game_dir is None else [self.game_dir])
+        self.symbols = SymbolIndex(roots)
+        self.start_job(jobs.Job([(", ".join(roots), self.symbols.refresh)]), "Scanning", done_text="Scanned")
+
+    def write_all(self):
+        """
+        Takes the entry values on the GUI thread and writes the shared
+        files of all ideas on a worker thread
+        """
+        if self.write_job is not None or len(self.workspace) == 0:
+            return
+        self.store_idea()
+        if not self.check_missing():
+            return
+        # the worker thread writes copies, the editor may change the ideas meanwhile
+        idea_list = self.workspace.get_snapshot()
+        if not self.check_keys(idea_list):
+            return
+        if self.symbols is None:
+            self.write_ideas(idea_list)
+            return
+        # the mod files are scanned off the GUI thread as well
+        self.start_job(jobs.Job([("mod files", self.symbols.refresh)]), "Scanning", done_text="Scanned",
+                       on_done=lambda: self.write_ideas(idea_list))
+
+    def write_ideas(self, idea_list):
+        """
+        Checks the symbols and starts the job writing the files
+        """
+        if not self.check_symbols(idea_list):
+            return
         gfx_file, loc_file, pdx_file = self.get_file_names()
-        Idea.write_gfx_file(idea_list, gfx_file)
-        Idea.write_localisation_file(idea_list, loc_file)
-        Idea.write_paradox_file(idea_list, pdx_file)
+        # the three files replace the old ones together after the last step
+        transaction = output.Transaction()
+        steps = [(gfx_file, lambda: Idea.write_gfx_file(idea_list, gfx_file, sink=transaction)),
+                 (loc_file, lambda: Idea.write_localisation_file(idea_list, loc_file, sink=transaction)),
+                 (pdx_file, lambda: Idea.write_paradox_file(idea_list, pdx_file, sink=transaction))]
+        self.start_job(jobs.Job(steps, sink=transaction), "Writing")
+
+    def start_job(self, job, title, done_text="Written", on_done=None):
+        """
+        Runs job with a progress window, on_done is called on the GUI
+        thread once the job is done
+        """
+        self.write_job = job
+        self.job_title = title
+        self.job_done_text = done_text
+        self.job_done = on_done
+        self.writeButton.config(state=tk.DISABLED)
+        self.show_progress(title, len(job))
+        job.start()
+        self.after(self.POLL_INTERVAL, self.poll_job)
+
+    def show_progress(self, title, nr_steps):
+        self.progress_window = tk.Toplevel(self.master)
+        self.progress_window.wm_title(title)
+        self.progress_label = self.set_label(0, 0, title + " ...", master=self.progress_window,
+                                             columnspan=2)
+        self.progress_bar = ttk.Progressbar(self.progress_window, maximum=nr_steps, length=200)
+        self.progress_bar.grid(row=1, column=0)
+        self.set_button(1, 1, "Cancel", self.cancel_job, master=self.progress_window)
+        self.progress_window.protocol("WM_DELETE_WINDOW", self.cancel_job)
+
+    def cancel_job(self):
+        if self.write_job is not None:
+            self.write_job.cancel()
+            self.progress_label.config(text="Cancelling ...")
+
+    def poll_job(self):
+        """
+        Handles the messages of the running job on the GUI thread
+        """
+        for kind, nr, info in self.write_job.get_messages():
+            if kind == jobs.PROGRESS:
+                self.progress_bar.config(value=nr)
+                self.progress_label.config(text=f"{self.job_done_text} {info}")
+                continue
+            title, on_done = self.job_title, self.job_done
+            self.finish_job()
+            if kind == jobs.ERROR:
+                tkMessageBox.showerror(f"{title} Failed", str(info))
+            elif kind == jobs.CANCELLED:
+                tkMessageBox.showinfo(f"{title} Cancelled", f"Cancelled before {info}.")
+            elif on_done is not None:
+                on_done()
+            return
+        self.after(self.POLL_INTERVAL, self.poll_job)
+
+    def finish_job(self):
+        self.write_job = None
+        self.job_done = None
+        self.progress_window.destroy()
+        self.writeButton.config(state=tk.NORMAL)
         
     def close_app(self):
         """
         Clean shutdown
         """
+        self.store_idea()
+        self.journal.close()
         self.master.quit()
 
     def start_new_idea(self):
@@ -258,6 +474,8 @@ class WizardGui(tk.Frame):
         row += 1
         self.new_file_label = self.set_label(row, col, "File Prefix: ", master=self.top_window)
         self.new_file_entry = self.set_entry(row, col + 1, master=self.top_window)
+        if self.workspace.file_prefix is not None:
+            self.set_entry_text(self.new_file_entry, self.workspace.file_prefix)
 
         self.top_window.set_button = tk.Button(self.top_window,text='Start Idea',
                                                command=self.init_idea)
@@ -275,10 +493,22 @@ class WizardGui(tk.Frame):
                 pass
             return
         
-        self.idea = Idea(name)
+        try:
+            self.workspace.add(name)
+        except ValueError as error:
+            tkMessageBox.showwarning("Name Taken", str(error))
+            return
         file_prefix = self.new_file_entry.get()
-        self.file_prefix = name if file_prefix == '' else file_prefix
-        self.set_entry_text(self.entries[Idea.NAME_KEY], name)
+        if file_prefix != '':
+            # the files are shared by all ideas of the workspace
+            self.workspace.file_prefix = file_prefix
+        self.journal.set_prefix(self.workspace.file_prefix)
+        self.journal.store(name, *self.workspace.get_texts(self.workspace.get(name)))
+        self.idea_list.insert(tk.END, name)
+        self.idea_list.selection_clear(0, tk.END)
+        self.idea_list.selection_set(tk.END)
+        self.idea_list.see(tk.END)
+        self.open_idea(name)
         self.top_window.destroy()
 
     def setup_menu(self):
@@ -287,6 +517,9 @@ class WizardGui(tk.Frame):
         mainmenu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="File", menu=mainmenu)
         mainmenu.add_command(label="New Idea", command=self.start_new_idea)
+        mainmenu.add_command(label="Close Idea", command=self.close_idea)
+        mainmenu.add_command(label="Set Mod Directory", command=self.set_mod_dir)
+        mainmenu.add_command(label="Set Game Directory", command=self.set_game_dir)
         mainmenu.add_command(label="Quit", command=self.close_app)
         
         self.master.config(menu=menubar)
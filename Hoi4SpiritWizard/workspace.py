@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A workspace of ideas written to shared gfx, localisation and ideas files.
+The workspace only holds Idea objects, the GUI builds the entry widgets
+for the idea which is open and stores their texts back with store().
+"""
+import unittest
+from .ideas import Idea, Modifier, Cancel
+
+
+class Workspace:
+    """
+    The ideas of a workspace by name, in the order they were added
+    """
+    DUPLICATE_ERROR_MSG = "Error: Idea {} already exists!"
+    UNKNOWN_ERROR_MSG = "Error: Idea {} not in the workspace!"
+
+    def __init__(self, file_prefix=None):
+        self.ideas = {}
+        self.file_prefix = file_prefix
+
+    def __len__(self):
+        return len(self.ideas)
+
+    def __contains__(self, name):
+        return name in self.ideas
+
+    def get_names(self):
+        return list(self.ideas)
+
+    def get(self, name):
+        if name not in self.ideas:
+            raise KeyError(self.UNKNOWN_ERROR_MSG.format(name))
+        return self.ideas[name]
+
+    def add(self, idea):
+        """
+        Adds an Idea or a new idea of the name idea
+        """
+        if isinstance(idea, str):
+            idea = Idea(idea)
+        if idea.name in self.ideas:
+            raise ValueError(self.DUPLICATE_ERROR_MSG.format(idea.name))
+        self.ideas[idea.name] = idea
+        if self.file_prefix is None:
+            self.file_prefix = idea.name
+        return idea
+
+    def remove(self, name):
+        return self.ideas.pop(self.get(name).name)
+
+    def rename(self, name, new_name):
+        idea = self.get(name)
+        if new_name == name:
+            return idea
+        if new_name in self.ideas:
+            raise ValueError(self.DUPLICATE_ERROR_MSG.format(new_name))
+        self.ideas = {new_name if key == name else key: val for key, val in self.ideas.items()}
+        idea.name = new_name
+        # every rendering contains the name
+        idea.clear_cache()
+        return idea
+
+    def get_idea_list(self):
+        return list(self.ideas.values())
+
+    def get_snapshot(self):
+        """
+        Returns new ideas rebuilt from the texts of the ideas, which can
+        be written on another thread while the editor changes the ideas
+        """
+        workspace = Workspace(self.file_prefix)
+        for name, idea in self.ideas.items():
+            workspace.add(name)
+            workspace.store(name, *self.get_texts(idea))
+        return workspace.get_idea_list()
+
+    def get_file_names(self):
+        return [self.file_prefix + suff for suff in (Idea.GFX_SUFF, Idea.LOC_SUFF, Idea.PDX_SUFF)]
+
+    def get_missing(self):
+        """
+        Returns the (idea name, field) of all fields not filled in yet
+        """
+        return [(name, key) for name, idea in self.ideas.items()
+                for key in Idea.KEYS if getattr(idea, key, '') == '']
+
+    @staticmethod
+    def get_texts(idea):
+        """
+        Returns the field texts and the rows of the categories of idea
+        as they are shown in the editor
+        """
+        fields = {key: getattr(idea, key, '') for key in Idea.KEYS}
+        rows = {cat.get_name(): [] for cat in Idea.CATEGORIES}
+        for cat, values_list in idea.get_category_rows():
+            rows[cat.get_name()] = [dict(zip(cat.get_fields(), values)) for values in values_list]
+        return fields, rows
+
+    def store(self, name, fields, rows):
+        """
+        Stores the texts of the editor in the idea name. Empty fields
+        are removed from the idea, a drafted idea may stay incomplete.
+        """
+        idea = self.get(name)
+        idea.set_dict({key: val for key, val in fields.items() if val != ''})
+        for key in [key for key, val in fields.items() if val == '' and hasattr(idea, key)]:
+            delattr(idea, key)
+            idea.clear_cache(Idea.FIELD_CACHES.get(key))
+        for cat in Idea.CATEGORIES:
+            if cat.get_name() in rows:
+                idea.set_category_objs(cat, [cat(row) for row in rows[cat.get_name()]])
+        return idea
+
+########################
+# Tests                #
+########################
+
+class WorkspaceTests(unittest.TestCase):
+    FIELDS = {Idea.GFX_FNAME: "a.dds", Idea.PIC_NAME: "pic", Idea.FULL_NAME: "A", Idea.DESC: "B"}
+
+    def setUp(self):
+        self.workspace = Workspace()
+        for name in ["idea_a", "idea_b", "idea_c"]:
+            self.workspace.add(name)
+
+    def test_add_remove(self):
+        self.assertEqual(self.workspace.file_prefix, "idea_a")
+        self.assertEqual(self.workspace.get_file_names(), ["idea_a.gfx", "idea_a.yml", "idea_a.txt"])
+        self.assertRaises(ValueError, self.workspace.add, "idea_b")
+        self.workspace.remove("idea_b")
+        self.assertEqual(self.workspace.get_names(), ["idea_a", "idea_c"])
+        self.assertRaises(KeyError, self.workspace.remove, "idea_b")
+
+    def test_rename(self):
+        idea = self.workspace.rename("idea_b", "idea_d")
+        self.assertEqual(idea.name, "idea_d")
+        self.assertEqual(self.workspace.get_names(), ["idea_a", "idea_d", "idea_c"])
+        self.assertRaises(ValueError, self.workspace.rename, "idea_a", "idea_c")
+
+    def test_store(self):
+        rows = {Modifier.get_name(): [{"Key": "stability_factor", "Value": "0.1"}],
+                Cancel.get_name(): [{"Key": "has_war", "Relation": "=", "Value": "yes"}]}
+        self.workspace.store("idea_a", dict(self.FIELDS, **{Idea.DESC: ''}), rows)
+        self.assertEqual(self.workspace.get_missing(),
+                         [("idea_a", Idea.DESC)] + [(name, key) for name in ["idea_b", "idea_c"]
+                                                     for key in Idea.KEYS])
+        fields, new_rows = Workspace.get_texts(self.workspace.get("idea_a"))
+        self.assertEqual(fields, dict(self.FIELDS, **{Idea.DESC: ''}))
+        self.assertEqual(new_rows[Modifier.get_name()], rows[Modifier.get_name()])
+        self.assertEqual(new_rows[Cancel.get_name()], rows[Cancel.get_name()])
+        self.assertEqual(new_rows["rule"], [])
+
+    def test_snapshot(self):
+        rows = {Modifier.get_name(): [{"Key": "stability_factor", "Value": "0.1"}]}
+        self.workspace.store("idea_a", self.FIELDS, rows)
+        snapshot = self.workspace.get_snapshot()
+        self.assertEqual([idea.name for idea in snapshot], self.workspace.get_names())
+        idea = self.workspace.get("idea_a")
+        self.assertIsNot(snapshot[0], idea)
+        self.assertEqual(snapshot[0].get_paradox_block(), idea.get_paradox_block())
+        # later edits do not reach the snapshot
+        self.workspace.store("idea_a", self.FIELDS, {Modifier.get_name(): [{"Key": "stability_factor", "Value": "0.2"}]})
+        self.assertEqual(Workspace.get_texts(snapshot[0])[1][Modifier.get_name()], rows[Modifier.get_name()])
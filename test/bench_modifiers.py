@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memory benchmark of the modifier representations:
+measures with tracemalloc the memory of n rows stored as
+  - dict based objects (the former Modifier layout with keys/entries dicts),
+  - slotted Modifier objects,
+  - a columnar ModifierTable,
+  - interned (shared) Modifier objects, which only pay off if rows repeat.
+
+  python test/bench_modifiers.py [--rows 10000 100000] [--distinct 1000]
+"""
+import os
+import sys
+sys.path.append(os.path.split(os.getcwd())[0])
+sys.path.append(os.getcwd())
+
+import gc
+import argparse
+import tracemalloc
+from Hoi4SpiritWizard.ideas import Modifier, ModifierTable
+from Hoi4SpiritWizard.flyweight import Interner
+
+
+class DictModifier:
+    """
+    Reference layout: per instance keys and entries dicts and a __dict__
+    """
+    FIELDS = Modifier.FIELDS
+    def __init__(self, entries):
+        self.keys = {}
+        self.entries = entries
+        for key in self.FIELDS:
+            setattr(self, key, entries[key])
+
+
+def make_rows(nr_rows, distinct=None):
+    # distinct values by default, like generated modifiers
+    distinct = distinct or nr_rows
+    return [{"Key": f"modifier_{i % 500}", "Value": str(i % distinct)} for i in range(nr_rows)]
+
+
+def measure(build, rows):
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    obj = build(rows)
+    size = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(start, 'filename'))
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def intern_rows(rows):
+    interner = Interner()
+    return interner, [interner.intern_entries(Modifier, row) for row in rows]
+
+
+LAYOUTS = {
+    "dict objects": lambda rows: [DictModifier(row) for row in rows],
+    "slotted objects": lambda rows: [Modifier(row) for row in rows],
+    "ModifierTable": lambda rows: ModifierTable(Modifier, rows),
+    "interned objects": lambda rows: intern_rows(rows),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--distinct", type=int, help="number of distinct values (default: all)")
+    args = parser.parse_args()
+
+    print(f"{'layout':>16} {'rows':>8} {'memory [KiB]':>13} {'bytes/row':>10}")
+    for nr_rows in args.rows:
+        rows = make_rows(nr_rows, args.distinct)
+        for name, build in LAYOUTS.items():
+            size = measure(build, rows)
+            print(f"{name:>16} {nr_rows:>8} {size/1024:>13.1f} {size/nr_rows:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
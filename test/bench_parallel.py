@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scaling benchmark of the parallel rendering:
+renders the gfx and ideas code of 10k and 100k ideas with 1..N workers
+and prints the time and speedup against the serial list2paradox path.
+
+  python test/bench_parallel.py [--sizes 10000 100000] [--max-workers N]
+"""
+import os
+import sys
+sys.path.append(os.path.split(os.getcwd())[0])
+sys.path.append(os.getcwd())
+
+import time
+import argparse
+from Hoi4Converter.converter import list2paradox
+from Hoi4SpiritWizard.ideas import Idea
+from Hoi4SpiritWizard import parallel
+from benchmarks import make_ideas
+
+
+def serial_code(ideas, kind):
+    obj = []
+    if kind == parallel.GFX:
+        for idea in ideas:
+            obj += idea.write_gfx_obj()
+        return list2paradox(Idea.wrap_gfx(obj))
+    for idea in ideas:
+        obj += idea.write_idea_paradox()
+    return list2paradox(Idea.wrap_paradox(obj))
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'kind':>8} {'ideas':>8} {'workers':>8} {'time [s]':>10} {'speedup':>8}")
+    for size in args.sizes:
+        ideas = make_ideas(size)
+        for kind in (parallel.GFX, parallel.PARADOX):
+            serial, expected = timed(serial_code, ideas, kind)
+            print(f"{kind:>8} {size:>8} {'serial':>8} {serial:>10.3f} {1:>8.2f}")
+            for workers in range(1, args.max_workers + 1):
+                elapsed, code = timed(parallel.render_code, ideas, kind, workers=workers)
+                assert code == expected, "parallel output differs from serial output"
+                print(f"{kind:>8} {size:>8} {workers:>8} {elapsed:>10.3f} {serial/elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the template expansion: expands tiered templates into
+many variants, streams them into the three files and prints the time
+and peak memory of the expansion alone and of the whole build.
+
+  python test/bench_templates.py [--tags 500] [--tiers 100]
+"""
+import os
+import sys
+sys.path.append(os.path.split(os.getcwd())[0])
+sys.path.append(os.getcwd())
+
+import io
+import time
+import argparse
+import tracemalloc
+from Hoi4SpiritWizard.ideas import Idea
+from Hoi4SpiritWizard.templates import IdeaTemplate, Sweep, GEOMETRIC
+
+
+def make_template(nr_tags, nr_tiers):
+    return IdeaTemplate("{tag}_reform_{tier}",
+                        fields={Idea.GFX_FNAME: "gfx/interface/ideas/{tag}_reform.dds",
+                                Idea.FULL_NAME: "Reform {tier}", Idea.DESC: "Tier {tier} of the reform"},
+                        categories={"modifier": [{"Key": "stability_factor", "Value": "{stab}"},
+                                                 {"Key": "political_power_factor", "Value": "{pp}"}]},
+                        params={"tag": [f"T{nr:03}" for nr in range(nr_tags)],
+                                "tier": range(1, nr_tiers + 1)},
+                        sweeps={"stab": Sweep("tier", 0.05, 0.25),
+                                "pp": Sweep("tier", 0.01, 0.5, scale=GEOMETRIC)})
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tags", type=int, default=500)
+    parser.add_argument("--tiers", type=int, default=100)
+    args = parser.parse_args()
+
+    template = make_template(args.tags, args.tiers)
+    elapsed, peak, count = measure(lambda: sum(1 for _ in template.expand()))
+    print(f"expand {count} variants: {elapsed:.3f} s, peak {peak/2**20:.2f} MiB")
+    fps = [io.StringIO() for _ in range(3)]
+    elapsed, peak, _ = measure(lambda: Idea.stream_idea_files(template.expand(), *fps))
+    print(f"stream {count} variants: {elapsed:.3f} s, peak {peak/2**20:.2f} MiB "
+          f"(output {sum(len(fp.getvalue()) for fp in fps)/2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
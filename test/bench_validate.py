@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the validator: writes the ideas and gfx files of many
+ideas and prints the time to read them and to validate them, next to
+a bare regex scan over the tokens and the token by token pass.
+
+  python test/bench_validate.py [--ideas 50000] [--repeat 3]
+"""
+import os
+import sys
+sys.path.append(os.path.split(os.getcwd())[0])
+sys.path.append(os.getcwd())
+
+import time
+import argparse
+import tempfile
+from Hoi4SpiritWizard.ideas import Idea, Modifier, Cancel
+from Hoi4SpiritWizard import validate
+
+
+def make_ideas(nr_ideas):
+    for nr in range(nr_ideas):
+        idea = Idea(f"idea_{nr}")
+        idea.set_dict({Idea.GFX_FNAME: "gfx/interface/ideas/a.dds", Idea.FULL_NAME: "Idea",
+                       Idea.DESC: "Desc"})
+        idea.set_category_objs(Modifier, [Modifier({"Key": "stability_factor", "Value": f"0.{nr % 10}"}),
+                                          Modifier({"Key": "political_power_factor", "Value": "0.1"})])
+        idea.set_category_objs(Cancel, [Cancel({"Key": "num_of_factories", "Relation": ">",
+                                                "Value": str(nr % 50)})])
+        yield idea
+
+
+def best(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times += [time.perf_counter() - start]
+    return min(times)
+
+
+def read(fname):
+    with open(fname, encoding='utf-8-sig') as fp:
+        return fp.read()
+
+
+def scan(code):
+    for _ in validate.TOKEN_PATTERN.finditer(code):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ideas", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gfx_file, loc_file, pdx_file = [os.path.join(tmp, "spirits" + suff)
+                                        for suff in (Idea.GFX_SUFF, Idea.LOC_SUFF, Idea.PDX_SUFF)]
+        with open(gfx_file, 'w') as gfx_fp, open(loc_file, 'w') as loc_fp, open(pdx_file, 'w') as pdx_fp:
+            Idea.stream_idea_files(make_ideas(args.ideas), gfx_fp, loc_fp, pdx_fp)
+        for fname in (pdx_file, gfx_file):
+            code = read(fname)
+            size = len(code.encode('utf-8'))/1e6
+            assert validate.validate_file(fname) == []
+            timings = {"read": best(lambda: read(fname), args.repeat),
+                       "token scan": best(lambda: scan(code), args.repeat),
+                       "token pass": best(lambda: validate.Validator(code, kind=validate.get_kind(fname)).run(),
+                                          args.repeat),
+                       "validate_file": best(lambda: validate.validate_file(fname), args.repeat)}
+            print(f"{os.path.basename(fname)}: {size:.1f} MB, {args.ideas} ideas")
+            for name, seconds in timings.items():
+                print(f"  {name:<14} {seconds*1000:8.1f} ms  {size/seconds:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
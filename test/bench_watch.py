@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the watch mode: builds a spec file with many ideas, then
+edits one record at a time and prints the time from saving the edit
+until the ideas file holds the new value.
+
+  python test/bench_watch.py [--ideas 5000] [--edits 20]
+"""
+import os
+import sys
+sys.path.append(os.path.split(os.getcwd())[0])
+sys.path.append(os.getcwd())
+
+import time
+import json
+import argparse
+import tempfile
+import threading
+import statistics
+from Hoi4SpiritWizard.watch import Watcher
+
+RECORD = {"GFXFileName": "gfx/interface/ideas/a.dds", "FullName": "Idea", "Description": "Desc"}
+
+
+def write_spec(fname, nr_ideas, edited=None, value=0.0):
+    with open(fname, 'w') as fp:
+        for nr in range(nr_ideas):
+            stab = value if nr == edited else 0.05
+            record = dict(RECORD, name=f"idea_{nr}",
+                          modifier=[{"Key": "stability_factor", "Value": f"{stab:.4f}"},
+                                    {"Key": "political_power_factor", "Value": "0.1"}])
+            fp.write(json.dumps(record) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ideas", type=int, default=5000)
+    parser.add_argument("--edits", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spec_file = os.path.join(tmp, "spirits.jsonl")
+        write_spec(spec_file, args.ideas)
+        watcher = Watcher(tmp, tmp)
+        pdx_file = watcher.get_file_names(spec_file)[2]
+        start = time.perf_counter()
+        watcher.update()
+        print(f"initial build of {args.ideas} ideas: {time.perf_counter() - start:.3f} s")
+        stop = threading.Event()
+        thread = threading.Thread(target=watcher.run, kwargs={"stop": stop, "report": lambda result: None})
+        thread.start()
+        time.sleep(0.1)
+        latencies = []
+        try:
+            for edit in range(args.edits):
+                value = f"{0.5 + edit/1000:.4f}"
+                write_spec(spec_file, args.ideas, edited=edit, value=float(value))
+                start = time.perf_counter()
+                while True:
+                    with open(pdx_file, encoding="utf-8") as fp:
+                        if value in fp.read():
+                            break
+                    time.sleep(0.002)
+                latencies += [time.perf_counter() - start]
+        finally:
+            stop.set()
+            thread.join()
+    print(f"edit to output over {args.edits} edits: median {statistics.median(latencies)*1000:.1f} ms, "
+          f"max {max(latencies)*1000:.1f} ms (interval {watcher.interval*1000:.0f} ms, "
+          f"debounce {watcher.debounce*1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
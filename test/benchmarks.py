@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the idea generation pipeline.
+
+Generates synthetic idea sets with varying numbers of rows per category
+(Cancel rows included), times write_gfx_file, write_localisation_file and
+write_paradox_file separately and records their peak memory with tracemalloc.
+
+  python test/benchmarks.py run [--sizes 10 1000 10000 100000] [--out results.json] [--memory]
+  python test/benchmarks.py compare baseline.json [--threshold 0.1]
+
+compare runs the benchmarks again and flags every stage whose time or
+peak memory grew by more than the threshold against the baseline.
+With --memory the files go into an output.MemorySink, without disk I/O.
+"""
+import os
+import sys
+sys.path.append(os.path.split(os.getcwd())[0])
+sys.path.append(os.getcwd())
+
+import gc
+import json
+import time
+import argparse
+import platform
+import datetime
+import tempfile
+import tracemalloc
+from Hoi4SpiritWizard.ideas import Idea, Modifier, OnAdd, OnRemove, ResearchBonus, Rule, Cancel
+from Hoi4SpiritWizard import output
+
+SIZES = [10, 1000, 10000, 100000]
+THRESHOLD = 0.1
+RELATIONS = ["=", ">", "<"]
+
+
+def make_idea(i):
+    """
+    Synthetic idea i, the number of rows per category varies with i
+    """
+    idea = Idea(f'bench_idea_{i}')
+    idea.set_dict({Idea.GFX_FNAME: f"gfx/interface/ideas/bench_{i}.dds",
+                   Idea.FULL_NAME: f"Benchmark Idea {i}",
+                   Idea.DESC: f"Description of the benchmark idea {i}"})
+    if i % 7 == 0:
+        idea.set_dict({Idea.PIC_NAME: f"bench_picture_{i % 13}"})
+    rows = {Modifier: i % 6, OnAdd: i % 3, OnRemove: i % 2, ResearchBonus: i % 4 // 3,
+            Rule: i % 5 // 4, Cancel: i % 3}
+    for category_cls, nr_rows in rows.items():
+        cobjs = []
+        for k in range(nr_rows):
+            if category_cls is Cancel:
+                entries = {"Key": "num_of_factories", "Relation": RELATIONS[(i + k) % 3],
+                           "Value": str(10 + k)}
+            else:
+                entries = {"Key": f"{category_cls.get_name()}_key_{k}", "Value": f"{(i*k) % 100 / 100}"}
+            cobjs += [category_cls(entries)]
+        idea.set_category_objs(category_cls, cobjs)
+    return idea
+
+
+def make_ideas(nr_ideas):
+    return [make_idea(i) for i in range(nr_ideas)]
+
+
+STAGES = {
+    "gfx": lambda ideas, path, sink: Idea.write_gfx_file(ideas, "bench.gfx", path=path, sink=sink),
+    "localisation": lambda ideas, path, sink: Idea.write_localisation_file(ideas, "bench.yml", path=path,
+                                                                           sink=sink),
+    "paradox": lambda ideas, path, sink: Idea.write_paradox_file(ideas, "bench.txt", path=path, sink=sink),
+}
+
+
+def fresh_ideas(nr_ideas):
+    # new objects for every measurement, so no run profits from the render cache
+    gc.collect()
+    return make_ideas(nr_ideas)
+
+
+def measure(stage, nr_ideas, path, repeat=1, memory=False):
+    """
+    Returns the best time out of repeat runs and the peak memory of a run
+    """
+    times = []
+    for _ in range(repeat):
+        ideas = fresh_ideas(nr_ideas)
+        sink = output.MemorySink() if memory else None
+        start = time.perf_counter()
+        STAGES[stage](ideas, path, sink)
+        times += [time.perf_counter() - start]
+    ideas = fresh_ideas(nr_ideas)
+    sink = output.MemorySink() if memory else None
+    tracemalloc.start()
+    STAGES[stage](ideas, path, sink)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"time": min(times), "peak": peak}
+
+
+def run(sizes, repeat=1, verbose=True, memory=False):
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        for nr_ideas in sizes:
+            for stage in STAGES:
+                key = f"{stage}/{nr_ideas}"
+                results[key] = measure(stage, nr_ideas, path, repeat=repeat, memory=memory)
+                if verbose:
+                    print(f"{key:>22} {results[key]['time']:>10.4f} s "
+                          f"{results[key]['peak']/2**20:>10.2f} MiB")
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "date": datetime.datetime.now().isoformat(timespec="seconds")},
+            "results": results}
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """
+    Returns the (key, measure, base, new) of all regressions beyond threshold
+    """
+    regressions = []
+    for key, new in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        for measure_key in ["time", "peak"]:
+            if new[measure_key] > base[measure_key]*(1 + threshold):
+                regressions += [(key, measure_key, base[measure_key], new[measure_key])]
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    compare_parser = commands.add_parser("compare", help="compare against a baseline")
+    compare_parser.add_argument("baseline", help="JSON results of a former run")
+    compare_parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                                help="allowed relative growth (default: %(default)s)")
+    for sub_parser in [run_parser, compare_parser]:
+        sub_parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+        sub_parser.add_argument("--repeat", type=int, default=3)
+        sub_parser.add_argument("--out", help="write the results as JSON to this file")
+        sub_parser.add_argument("--memory", action="store_true", help="write into memory instead of files")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+    current = run(args.sizes, repeat=args.repeat, memory=args.memory)
+    if args.out:
+        with open(args.out, 'w') as fp:
+            json.dump(current, fp, indent=1)
+    if args.command == "run":
+        return 0
+
+    regressions = compare(baseline, current, threshold=args.threshold)
+    for key, measure_key, base, new in regressions:
+        print(f"REGRESSION {key} {measure_key}: {base:.4g} -> {new:.4g} ({new/base - 1:+.1%})")
+    if not regressions:
+        print("No regressions.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,9 +8,9 @@ sys.path.append(os.getcwd())
 
 import unittest
 import Hoi4SpiritWizard
-from Hoi4SpiritWizard import ideas
+from Hoi4SpiritWizard import ideas, specs, cli, parallel, incremental, emitter, importer, symbols, instrument, row_model, jobs, workspace, journal, output, catalogue, batch, templates, splice, watch, flyweight, validate
 
-MODULES = [ideas]
+MODULES = [ideas, specs, cli, parallel, incremental, emitter, importer, symbols, instrument, row_model, jobs, workspace, journal, output, catalogue, batch, templates, splice, watch, flyweight, validate]
 
 if __name__ == "__main__":
     loader = unittest.TestLoader()